@@ -11,6 +11,8 @@ import random
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
+import revenue_simulator
+
 class AIIncomeGenerator:
     def __init__(self):
         self.content_topics = [
@@ -30,6 +32,12 @@ class AIIncomeGenerator:
         self.revenue_streams = []
         self.automation_schedule = {}
         
+        # Subtitles that turn one content idea into several distinct pieces
+        self.editions = [
+            "", "The Beginner's Edition", "The Busy Professional's Edition",
+            "The Small Business Edition", "The Budget Edition"
+        ]
+        
     def generate_content_ideas(self, topic: str, count: int = 10) -> List[str]:
         """Generate content ideas using AI prompts"""
         ideas = [
@@ -130,6 +138,24 @@ class AIIncomeGenerator:
             """
         }
     
+    def generate_content_calendar(self, topics: List[str] = None, items_per_topic: int = 8) -> Dict[str, Any]:
+        """
+        Blog post and YouTube templates for several topics at once, in the same
+        shape as a strategy's content_calendar. Each topic gets items_per_topic
+        distinct titles: every idea as a blog post and a video, then again per edition.
+        """
+        calendar = {"blog_posts": [], "youtube_videos": []}
+        for topic in topics or self.content_topics:
+            ideas = self.generate_content_ideas(topic, 10)
+            titles = [f"{idea}: {edition}" if edition else idea for edition in self.editions for idea in ideas]
+            for i in range(min(items_per_topic, len(titles) * 2)):
+                title = titles[i // 2]
+                if i % 2 == 0:
+                    calendar["blog_posts"].append(self.create_blog_post_template(title, topic))
+                else:
+                    calendar["youtube_videos"].append(self.create_youtube_script_template(title, topic))
+        return calendar
+    
     def generate_social_media_posts(self, topic: str, count: int = 7) -> List[Dict[str, Any]]:
         """Generate social media post templates"""
         post_types = [
@@ -238,13 +264,26 @@ class AIIncomeGenerator:
         
         total_low = sum(stream["low"] for stream in income_projections.values())
         total_high = sum(stream["high"] for stream in income_projections.values())
+        monthly_potential = {
+            "conservative": total_low,
+            "optimistic": total_high,
+            "realistic": int((total_low + total_high) / 2)
+        }
+        
+        # Month-12 percentile band (10/50/90) from the Monte Carlo simulator when NumPy is available
+        try:
+            simulated = revenue_simulator.simulate(paths=100_000)["total"]
+            monthly_potential = {
+                "conservative": int(simulated["p10"][-1]),
+                "optimistic": int(simulated["p90"][-1]),
+                "realistic": int(simulated["p50"][-1]),
+                "simulated": True
+            }
+        except RuntimeError as e:
+            print(f"Using static income potential: {e}")
         
         return {
-            "monthly_potential": {
-                "conservative": total_low,
-                "optimistic": total_high,
-                "realistic": int((total_low + total_high) / 2)
-            },
+            "monthly_potential": monthly_potential,
             "breakdown": income_projections,
             "timeline": {
                 "month_1": "Setup and initial content creation",
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+ANIPE Fulfillment Service
+Receives Stripe checkout webhooks and emails buyers a signed download link for their report
+"""
+
+import os
+import json
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+from flask import Flask, request, jsonify
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.auth.transport import requests as google_auth_requests
+from google.cloud import storage
+from google.oauth2 import service_account
+import stripe
+
+import anipe_admission
+import anipe_cassette
+import anipe_json
+from anipe_fulfillment import (FULFILLMENT_BUCKET, PENDING_PREFIX, load_payment_link, order_blob_name,
+                               pending_blob_name, split_gcs_path)
+from anipe_resilience import breaker_states, get_breaker
+
+stripe_breaker = get_breaker("stripe")
+
+app = Flask(__name__)
+anipe_json.init_app(app)
+# Per-endpoint concurrency and queue limits; bulk callers send X-ANIPE-Priority: bulk
+admission = anipe_admission.init_app(app, {
+    "stripe_webhook": {"concurrency": 8, "queue": 6, "queue_timeout": 5.0},
+    "sweep_orders": {"concurrency": 1, "queue": 0, "default_priority": "bulk"},
+})
+# Record or replay outbound calls per ANIPE_CASSETTE_MODE
+anipe_cassette.init_app(app, "anip-fulfillment-service")
+
+@app.route('/favicon.ico')
+def favicon():
+    # Return 204 No Content - standard way to handle missing favicons
+    return '', 204
+
+# Initialize Stripe (the secret key is only needed to look up payment links)
+stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+if not STRIPE_WEBHOOK_SECRET:
+    print("Warning: STRIPE_WEBHOOK_SECRET not found - webhooks will be rejected")
+
+# Initialize GCP clients
+try:
+    storage_client = storage.Client()
+except Exception as e:
+    storage_client = None
+    print(f"Error initializing GCP clients: {e}")
+
+# Email settings
+SMTP_HOST = os.environ.get("SMTP_HOST")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+SMTP_USER = os.environ.get("SMTP_USER")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+FROM_EMAIL = os.environ.get("FULFILLMENT_FROM_EMAIL", SMTP_USER or "reports@example.com")
+
+# Download links are valid for a week (the V4 maximum) and reused while they
+# still have at least SIGNED_URL_MIN_VALIDITY left, so each buyer gets days to download
+SIGNED_URL_TTL = timedelta(days=7)
+SIGNED_URL_MIN_VALIDITY = timedelta(hours=int(os.environ.get("SIGNED_URL_MIN_VALIDITY_HOURS", 72)))
+SIGNED_URL_CACHE_SIZE = 1024
+
+# Accepted orders wait here for a worker; when it's full, webhooks get a 503 and Stripe retries later
+QUEUE_SIZE = int(os.environ.get("FULFILLMENT_QUEUE_SIZE", 2000))
+WORKERS = int(os.environ.get("FULFILLMENT_WORKERS", 4))
+EMAIL_ATTEMPTS = 3
+
+# A redelivered event takes over a failed order, or a queued one whose owner
+# hasn't finished it within this window (e.g. the instance was recycled)
+ORDER_STALE_AFTER = timedelta(minutes=int(os.environ.get("FULFILLMENT_STALE_MINUTES", 15)))
+
+# Stripe doesn't redeliver an event it got a 2xx for, so orders lost with an
+# instance or failed in a worker are re-driven by POST /sweep (Cloud Scheduler),
+# up to this many attempts per order, at most SWEEP_BATCH orders per call
+MAX_ORDER_ATTEMPTS = int(os.environ.get("FULFILLMENT_MAX_ATTEMPTS", 5))
+SWEEP_BATCH = 25
+
+# Sessions already accepted by this instance, checked before touching GCS
+RECENT_SESSIONS_SIZE = 10000
+LINK_RECORDS_SIZE = 4096
+
+FULFILLED_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+order_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_recent_sessions = OrderedDict()
+_recent_lock = threading.Lock()
+_signed_urls = OrderedDict()  # gcs path -> (url, expires_at)
+_signed_urls_lock = threading.Lock()
+_link_records = OrderedDict()  # payment link ID -> mapping record
+_link_records_lock = threading.Lock()
+stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "delivered": 0, "failed": 0,
+         "swept": 0, "abandoned": 0, "signed_url_hits": 0, "signed_url_misses": 0}
+
+
+def _remember_session(session_id: str) -> bool:
+    """Record a session as seen by this instance; False if it already was"""
+    with _recent_lock:
+        if session_id in _recent_sessions:
+            return False
+        _recent_sessions[session_id] = True
+        if len(_recent_sessions) > RECENT_SESSIONS_SIZE:
+            _recent_sessions.popitem(last=False)
+        return True
+
+
+def _forget_session(session_id: str):
+    with _recent_lock:
+        _recent_sessions.pop(session_id, None)
+
+
+def _write_order(order: dict, if_generation_match: int = None):
+    blob = storage_client.bucket(FULFILLMENT_BUCKET).blob(order_blob_name(order["session_id"]))
+    kwargs = {}
+    if if_generation_match is not None:
+        kwargs["if_generation_match"] = if_generation_match
+    anipe_json.upload_json(blob, order, **kwargs)
+    return blob
+
+
+def _read_order(session_id: str):
+    """Stored order and its generation, or (None, 0) if there isn't one"""
+    blob = storage_client.bucket(FULFILLMENT_BUCKET).blob(order_blob_name(session_id))
+    try:
+        order = anipe_json.read_json(blob)
+    except NotFound:
+        return None, 0
+    return order, int(blob.generation or 0)
+
+
+def _clear_pending(session_id: str):
+    try:
+        get_breaker("gcs").call(storage_client.bucket(FULFILLMENT_BUCKET).blob(pending_blob_name(session_id)).delete)
+    except NotFound:
+        pass
+    except Exception as e:
+        # The next sweep finds the order finished and clears it
+        print(f"Clearing pending marker {session_id} failed: {e}")
+
+
+def _takeover_due(existing: dict) -> bool:
+    if existing.get("status") == "failed":
+        return True
+    if existing.get("status") != "queued":
+        return False
+    try:
+        received_at = datetime.fromisoformat(existing["received_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.now() - received_at > ORDER_STALE_AFTER
+
+
+def _claim_order(order: dict) -> bool:
+    """
+    Write the order unless another delivery already owns it; False for a duplicate.
+    if_generation_match=0 makes the first instance to write the order its owner,
+    and a failed or stale queued order is taken over at the generation we read,
+    so only one redelivery can win it. The pending marker goes first, so an
+    accepted order is always visible to the sweeper.
+    """
+    anipe_json.upload_gzip(storage_client.bucket(FULFILLMENT_BUCKET).blob(pending_blob_name(order["session_id"])),
+                           b"", "application/octet-stream")
+    try:
+        _write_order(order, if_generation_match=0)
+        return True
+    except PreconditionFailed:
+        pass
+
+    existing, generation = _read_order(order["session_id"])
+    if existing is not None and not _takeover_due(existing):
+        return False
+    return _take_over(order, existing, generation)
+
+
+def _take_over(order: dict, existing: dict, generation: int) -> bool:
+    """Rewrite an order at the generation it was read at; False if someone else got there first"""
+    if existing is not None:
+        order["attempt"] = existing.get("attempt", 1) + 1
+        print(f"Taking over {existing.get('status')} order {order['session_id']} (attempt {order['attempt']})")
+    try:
+        _write_order(order, if_generation_match=generation)
+    except PreconditionFailed:
+        return False
+    return True
+
+
+def _signing_kwargs() -> dict:
+    """
+    Keyless signing for Cloud Run: service account key files sign locally,
+    metadata-server credentials sign through the IAM API with an access token.
+    """
+    credentials = storage_client._credentials
+    if isinstance(credentials, service_account.Credentials):
+        return {}
+    if not credentials.valid:
+        credentials.refresh(google_auth_requests.Request())
+    return {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+
+def _sign_download_url(blob) -> str:
+    return blob.generate_signed_url(
+        version="v4",
+        expiration=SIGNED_URL_TTL,
+        method="GET",
+        response_disposition=f'attachment; filename="{os.path.basename(blob.name)}"',
+        **_signing_kwargs()
+    )
+
+
+def get_download_url(product_gcs_path: str) -> str:
+    """Signed GET URL for a product PDF, cached until it gets close to expiry"""
+    now = datetime.utcnow()
+    with _signed_urls_lock:
+        cached = _signed_urls.get(product_gcs_path)
+        if cached and cached[1] - now > SIGNED_URL_MIN_VALIDITY:
+            _signed_urls.move_to_end(product_gcs_path)
+            stats["signed_url_hits"] += 1
+            return cached[0]
+
+    bucket_name, blob_name = split_gcs_path(product_gcs_path)
+    url = anipe_cassette.call("gcs", _sign_download_url, storage_client.bucket(bucket_name).blob(blob_name))
+
+    with _signed_urls_lock:
+        _signed_urls[product_gcs_path] = (url, now + SIGNED_URL_TTL)
+        if len(_signed_urls) > SIGNED_URL_CACHE_SIZE:
+            _signed_urls.popitem(last=False)
+        stats["signed_url_misses"] += 1
+    return url
+
+
+def resolve_payment_link(payment_link_id: str):
+    """Map a Stripe payment link ID to the product record written by the sales page generator"""
+    with _link_records_lock:
+        record = _link_records.get(payment_link_id)
+        if record is not None:
+            _link_records.move_to_end(payment_link_id)
+            return record
+    payment_link = stripe_breaker.call(stripe.PaymentLink.retrieve, payment_link_id)
+    record = load_payment_link(storage_client, payment_link["url"])
+    if record is not None:
+        with _link_records_lock:
+            _link_records[payment_link_id] = record
+            if len(_link_records) > LINK_RECORDS_SIZE:
+                _link_records.popitem(last=False)
+    return record
+
+
+def send_download_email(to_email: str, niche_topic: str, download_url: str):
+    """Email the buyer their download link"""
+    if not SMTP_HOST:
+        print(f"SMTP not configured - download link for {to_email}: {download_url}")
+        return
+
+    message = EmailMessage()
+    message["Subject"] = f"Your report: {niche_topic}"
+    message["From"] = FROM_EMAIL
+    message["To"] = to_email
+    message.set_content(
+        f"Thank you for your purchase!\n\n"
+        f"Download your \"{niche_topic}\" PDF report here:\n{download_url}\n\n"
+        f"The link is valid for at least {SIGNED_URL_MIN_VALIDITY.days} days.\n"
+    )
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        smtp.send_message(message)
+
+
+def fulfill_order(order: dict):
+    """Resolve the product, sign its URL and email the buyer, recording the outcome"""
+    try:
+        record = resolve_payment_link(order["payment_link"]) if order.get("payment_link") else None
+        if record is None:
+            raise LookupError(f"No product recorded for payment link {order.get('payment_link')}")
+        download_url = get_download_url(record["product_gcs_path"])
+
+        for attempt in range(1, EMAIL_ATTEMPTS + 1):
+            try:
+                anipe_cassette.call("smtp", send_download_email, order["email"], record["niche_topic"], download_url)
+                break
+            except Exception as e:
+                if attempt == EMAIL_ATTEMPTS:
+                    raise
+                print(f"Email to {order['email']} failed (attempt {attempt}/{EMAIL_ATTEMPTS}): {e}")
+                time.sleep(2 ** attempt)
+
+        order.update(status="delivered", product_gcs_path=record["product_gcs_path"],
+                     delivered_at=datetime.now().isoformat())
+        stats["delivered"] += 1
+        print(f"Fulfilled order {order['session_id']}: {record['niche_topic']}")
+    except Exception as e:
+        order.update(status="failed", error=f"{type(e).__name__}: {e}")
+        stats["failed"] += 1
+        # Let a redelivery of this session through to take the order over
+        _forget_session(order["session_id"])
+        print(f"Fulfillment failed for {order['session_id']}: {e}")
+
+    try:
+        _write_order(order)
+    except Exception as e:
+        print(f"Saving order {order['session_id']} failed: {e}")
+        return
+    if order["status"] == "delivered":
+        _clear_pending(order["session_id"])
+
+
+def _worker():
+    while True:
+        order = order_queue.get()
+        task = {"name": "fulfill_order", "args": [json.loads(json.dumps(order, default=str))]}
+        try:
+            with anipe_cassette.session(order["session_id"], "anip-fulfillment-service", "fulfill_order", task=task):
+                fulfill_order(order)
+        finally:
+            order_queue.task_done()
+
+
+for _ in range(WORKERS):
+    threading.Thread(target=_worker, name="fulfillment-worker", daemon=True).start()
+
+
+@app.route('/webhook', methods=['POST'])
+def stripe_webhook():
+    """
+    Verify a Stripe webhook and queue paid checkout sessions for fulfillment.
+    Only verification and an idempotent order claim happen here, so the
+    endpoint stays fast under bursts; the slow work runs on worker threads.
+    """
+    if not STRIPE_WEBHOOK_SECRET:
+        return jsonify({"error": "Webhook secret not configured", "status": "failed"}), 500
+
+    payload = request.get_data()
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload.decode('utf-8'), request.headers.get('Stripe-Signature', ''), STRIPE_WEBHOOK_SECRET)
+        # Plain dicts are all this needs and are cheaper than StripeObjects
+        event = json.loads(payload)
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        stats["rejected"] += 1
+        print(f"Rejected webhook: {e}")
+        return jsonify({"error": "Invalid signature", "status": "failed"}), 400
+
+    if event["type"] not in FULFILLED_EVENTS:
+        return jsonify({"status": "ignored", "type": event["type"]})
+
+    session = event["data"]["object"]
+    if session.get("payment_status") not in ("paid", "no_payment_required"):
+        # Delayed payment methods are fulfilled on async_payment_succeeded
+        return jsonify({"status": "ignored", "reason": "awaiting payment"})
+
+    session_id = session["id"]
+    customer_details = session.get("customer_details") or {}
+    order = {
+        "session_id": session_id,
+        "event_id": event["id"],
+        "payment_link": session.get("payment_link"),
+        "email": customer_details.get("email") or session.get("customer_email"),
+        "amount_total": session.get("amount_total"),
+        "status": "queued",
+        "received_at": datetime.now().isoformat()
+    }
+    if not order["email"]:
+        return jsonify({"status": "ignored", "reason": "no customer email"})
+
+    # Stripe redelivers events and sends both completed and async_payment_succeeded
+    # for some sessions, so fulfillment is keyed on the session
+    if not _remember_session(session_id):
+        stats["duplicates"] += 1
+        return jsonify({"status": "duplicate", "session_id": session_id})
+    if order_queue.full():
+        _forget_session(session_id)
+        return jsonify({"error": "Fulfillment queue full", "status": "retry"}), 503
+
+    try:
+        claimed = _claim_order(order)
+    except Exception as e:
+        _forget_session(session_id)
+        print(f"Order claim failed for {session_id}: {e}")
+        return jsonify({"error": str(e), "status": "retry"}), 503
+    if not claimed:
+        stats["duplicates"] += 1
+        return jsonify({"status": "duplicate", "session_id": session_id})
+
+    try:
+        order_queue.put_nowait(order)
+    except queue.Full:
+        # Release the claim so Stripe's retry can take it
+        _forget_session(session_id)
+        try:
+            get_breaker("gcs").call(storage_client.bucket(FULFILLMENT_BUCKET).blob(order_blob_name(session_id)).delete)
+        except Exception as e:
+            print(f"Releasing order claim {session_id} failed: {e}")
+        return jsonify({"error": "Fulfillment queue full", "status": "retry"}), 503
+
+    stats["accepted"] += 1
+    return jsonify({"status": "accepted", "session_id": session_id})
+
+
+def _list_pending() -> list:
+    """(session ID, marker creation time) of every order not yet delivered, oldest first"""
+    markers = storage_client.list_blobs(storage_client.bucket(FULFILLMENT_BUCKET), prefix=f"{PENDING_PREFIX}/")
+    pending = [(marker.name.rsplit("/", 1)[-1], (marker.time_created or datetime.now(timezone.utc)).isoformat())
+               for marker in markers]
+    return sorted(pending, key=lambda item: item[1])
+
+
+@app.route('/sweep', methods=['POST'])
+def sweep_orders():
+    """
+    Re-drive orders that were accepted but never delivered: queued on an
+    instance that went away, or failed in a worker. Each is taken over at the
+    generation read, so a concurrent sweep or redelivery can't double it, and
+    fulfilled inside this request, where Cloud Run guarantees CPU.
+    Run from Cloud Scheduler every few minutes.
+    """
+    if storage_client is None:
+        return jsonify({"error": "Storage not configured", "status": "failed"}), 503
+
+    counts = {"checked": 0, "fulfilled": 0, "cleared": 0, "abandoned": 0}
+    for session_id, created in anipe_cassette.call("gcs", _list_pending):
+        if counts["fulfilled"] >= SWEEP_BATCH:
+            break
+        counts["checked"] += 1
+        existing, generation = _read_order(session_id)
+        if existing is None or existing.get("status") == "delivered":
+            # No order means the claim was released (or is being written right now)
+            marker_age = datetime.now(timezone.utc) - datetime.fromisoformat(created)
+            if existing is not None or marker_age > ORDER_STALE_AFTER:
+                _clear_pending(session_id)
+                counts["cleared"] += 1
+            continue
+        if not _takeover_due(existing):
+            continue
+        if existing.get("attempt", 1) >= MAX_ORDER_ATTEMPTS:
+            print(f"ORDER ABANDONED after {existing.get('attempt', 1)} attempts, needs manual delivery: "
+                  f"{session_id} ({existing.get('error')})")
+            _clear_pending(session_id)
+            stats["abandoned"] += 1
+            counts["abandoned"] += 1
+            continue
+
+        order = {key: value for key, value in existing.items() if key != "error"}
+        order.update(status="queued", received_at=datetime.now().isoformat())
+        if not _take_over(order, existing, generation):
+            continue
+        fulfill_order(order)
+        stats["swept"] += 1
+        counts["fulfilled"] += 1
+
+    print(f"Order sweep: {counts}")
+    return jsonify({"status": "success", **counts})
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        "status": "healthy",
+        "service": "anip-fulfillment-service",
+        "queue_depth": order_queue.qsize(),
+        "stats": stats,
+        "breakers": breaker_states(),
+        "admission": admission.snapshot()
+    })
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 8080))
+    app.run(host='0.0.0.0', port=port, debug=True)
@@ -6,9 +6,28 @@ from datetime import datetime
 from flask import Flask, request, jsonify
 from google.cloud import storage
 import google.generativeai as genai
+import anipe_admission
+import anipe_cassette
+import anipe_json
+from anipe_archive import ARCHIVE_KINDS, compact_prefix
+from anipe_context_cache import context_cache
+from anipe_keys import artifact_key, clean_run_id
+from anipe_llm import expect_json, router
+from anipe_models import Opportunity
+from anipe_prompts import compile_prompt, get_step_budget, log_response, select_items
+from anipe_resilience import breaker_states
 
 # Initialize Flask app
 app = Flask(__name__)
+anipe_json.init_app(app)
+# Per-endpoint concurrency and queue limits; bulk callers send X-ANIPE-Priority: bulk
+admission = anipe_admission.init_app(app, {
+    "identify_opportunity": {"concurrency": 4, "queue": 6, "queue_timeout": 30.0},
+    "store_results": {"concurrency": 4, "queue": 4, "queue_timeout": 10.0},
+    "compact_artifacts": {"concurrency": 1, "queue": 0, "default_priority": "bulk"},
+})
+# Record or replay outbound calls per ANIPE_CASSETTE_MODE
+anipe_cassette.init_app(app, "anip-opportunity-identifier")
 
 # Add favicon route to prevent 404 errors
 @app.route('/favicon.ico')
@@ -73,21 +92,14 @@ def perform_web_search(query: str, num_results: int = 5) -> list:
     print(f"Selected broad topic: {broad_topic}")
     return simulated_results.get(broad_topic, [])
 
-# --- Helper Function: Use AI for Niche Identification ---
-def identify_niche_opportunity(search_results: list) -> dict:
-    """
-    Uses Gemini AI to analyze search results and identify a specific, actionable niche opportunity.
-    Falls back to simulated responses if AI is unavailable.
-    """
-    if not search_results:
-        return {"status": "no_opportunity", "message": "No relevant search results found."}
-
-    prompt = f"""
+# Static instructions of the identify prompt, cached as context across calls;
+# only the search results are sent per request
+IDENTIFY_PREAMBLE = """
     CRITICAL INSTRUCTIONS: You are an expert niche market researcher tasked with finding HIGHLY SPECIFIC, UNIQUE micro-opportunities that are NOT obvious or generic.
 
     FORBIDDEN TOPICS (DO NOT suggest anything related to):
     - Generic "communication" or "productivity"
-    - Basic "time management" or "organization"  
+    - Basic "time management" or "organization"
     - Broad "marketing" or "social media"
     - Generic "wellness" or "fitness"
     - Common "leadership" or "team building"
@@ -101,22 +113,17 @@ def identify_niche_opportunity(search_results: list) -> dict:
     5. Must be based on emerging trends or underserved segments
     6. Must be actionable and not theoretical
 
-    Search Results to Analyze:
-    {json.dumps(search_results, indent=2)}
-
     EXAMPLES of the specificity level required:
     GOOD: "AI-powered inventory optimization for artisanal food producers selling at farmers markets"
     GOOD: "Automated compliance reporting system for cryptocurrency tax accountants"
     GOOD: "Voice-to-text transcription service specialized for medical professionals treating ADHD patients"
-    
+
     BAD: "Communication tools"
     BAD: "Productivity software"
     BAD: "AI-powered insights"
 
-    Based on the search results, identify ONE unique micro-niche that meets ALL requirements above.
-
     Respond ONLY in valid JSON format:
-    {{
+    {
         "niche_topic": "Ultra-specific 8-12 word description targeting exact audience and use case",
         "problem_statement": "Specific pain point that costs this audience time/money/stress",
         "target_audience": "Precise demographic with purchasing power (job title, industry, situation)",
@@ -125,8 +132,27 @@ def identify_niche_opportunity(search_results: list) -> dict:
         "revenue_potential": "Realistic monthly revenue estimate with reasoning",
         "market_validation": "Why this audience would actually pay for this solution",
         "confidence_score": 0.85
-    }}
+    }
+    """
+
+# --- Helper Function: Use AI for Niche Identification ---
+def identify_niche_opportunity(search_results: list) -> dict:
     """
+    Uses Gemini AI to analyze search results and identify a specific, actionable niche opportunity.
+    Falls back to simulated responses if AI is unavailable.
+    """
+    if not search_results:
+        return {"status": "no_opportunity", "message": "No relevant search results found."}
+
+    # Keep only as many search results as fit the step's token budget
+    search_context = select_items(search_results, get_step_budget("identify"))
+
+    prompt = compile_prompt("identify", """
+    Search Results to Analyze:
+    {search_results}
+
+    Based on the search results, identify ONE unique micro-niche that meets ALL requirements above.
+    """, search_results=search_context)
     
     # Start with complete default data to guarantee all required keys
     # Use timestamp to ensure uniqueness even in fallback mode
@@ -148,8 +174,8 @@ def identify_niche_opportunity(search_results: list) -> dict:
     # Try to use Gemini AI and merge with defaults
     try:
         if os.environ.get("GEMINI_API_KEY"):
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
+            response = router.generate("identify", prompt, prefix=IDENTIFY_PREAMBLE, validate=expect_json)
+            log_response("identify", IDENTIFY_PREAMBLE + prompt, response)
             response_text = response.text.strip()
             
             # Extract JSON from response text
@@ -186,6 +212,7 @@ def identify_opportunity():
         # Get request data (optional parameters)
         data = request.get_json(silent=True) or {}
         query = data.get('query', None)
+        run_id = clean_run_id(data.get('run_id'))
         
         # Define broad search queries if not provided
         if not query:
@@ -207,19 +234,20 @@ def identify_opportunity():
         if opportunity["status"] == "success":
             print(f"Identified Niche Opportunity: {opportunity['niche_topic']}")
             
-            # Store the identified opportunity in GCS
+            # Store the identified opportunity in GCS (unique, hash-spread key)
             bucket = storage_client.bucket(GCS_BUCKET_NAME)
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            blob_name = f"opportunities/opportunity_{timestamp}.json"
+            blob_name = artifact_key("opportunities", "opportunity", "json")
             blob = bucket.blob(blob_name)
-            blob.upload_from_string(json.dumps(opportunity, indent=2), content_type="application/json")
+            blob.metadata = {"run_id": run_id}
+            anipe_json.upload_json(blob, Opportunity.from_dict(opportunity).to_dict())
             
             # Return success response
             response = {
                 "status": "success", 
                 "message": "Opportunity identified and saved.", 
                 "opportunity": opportunity, 
-                "gcs_path": f"gs://{GCS_BUCKET_NAME}/{blob_name}"
+                "gcs_path": f"gs://{GCS_BUCKET_NAME}/{blob_name}",
+                "run_id": run_id
             }
             return jsonify(response), 200
         else:
@@ -233,7 +261,9 @@ def identify_opportunity():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Cloud Run."""
-    return jsonify({"status": "healthy", "service": "anip-opportunity-identifier"}), 200
+    return jsonify({"status": "healthy", "service": "anip-opportunity-identifier",
+                    "context_cache": context_cache.stats, "llm": router.snapshot(),
+                    "breakers": breaker_states(), "admission": admission.snapshot()}), 200
 
 # Store results endpoint - accepts final workflow results and stores in GCS
 @app.route('/store', methods=['POST'])
@@ -248,9 +278,12 @@ def store_results():
         # Store the complete results in GCS
         bucket = storage_client.bucket(GCS_BUCKET_NAME)
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        blob_name = f"results/anipe_complete_{timestamp}.json"
+        blob_name = artifact_key("results", "anipe_complete", "json")
         blob = bucket.blob(blob_name)
-        blob.upload_from_string(json.dumps(data, indent=2), content_type="application/json")
+        run_id = data.get('run_id') or (data.get('opportunity') or {}).get('run_id')
+        if run_id:
+            blob.metadata = {"run_id": clean_run_id(run_id)}
+        anipe_json.upload_json(blob, data)
         
         print(f"Successfully stored results in GCS: {blob_name}")
         
@@ -267,6 +300,26 @@ def store_results():
         print(f"Error in store_results: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Compaction endpoint - rolls small JSON artifacts into daily archives (run from Cloud Scheduler)
+@app.route('/compact', methods=['POST'])
+def compact_artifacts():
+    """API endpoint to compact opportunities/results/promotions into daily JSONL archives."""
+    try:
+        data = request.get_json(silent=True) or {}
+        kinds = data.get('kinds') or list(ARCHIVE_KINDS)
+        unknown = [kind for kind in kinds if kind not in ARCHIVE_KINDS]
+        if unknown:
+            return jsonify({"status": "error", "message": f"Unknown kinds: {unknown}"}), 400
+        
+        bucket = storage_client.bucket(GCS_BUCKET_NAME)
+        summary = {kind: compact_prefix(bucket, kind, data.get('before'), delete=not data.get('keep', False))
+                   for kind in kinds}
+        return jsonify({"status": "success", "compacted": summary}), 200
+        
+    except Exception as e:
+        print(f"Error in compact_artifacts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 # Main entry point
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
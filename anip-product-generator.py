@@ -5,22 +5,38 @@ Converts opportunities into professional digital products with PDF output
 """
 
 import os
-import json
 import base64
 from datetime import datetime
 from flask import Flask, request, jsonify
 from google.cloud import storage
 import google.generativeai as genai
+import anipe_admission
+import anipe_cassette
+import anipe_json
+from anipe_context_cache import context_cache
+from anipe_keys import artifact_key, clean_run_id, new_id
+from anipe_llm import router
+from anipe_markdown import blocks_to_flowables, parse_markdown_cached, render_inline
+from anipe_models import Opportunity, ProductDocument
+from anipe_prompts import compile_prompt, get_step_budget, log_response, truncate_to_tokens
+from anipe_resilience import breaker_states
+from anipe_storage import spooled_file, upload_stream
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
-from io import BytesIO
 
 # Initialize Flask app
 app = Flask(__name__)
+anipe_json.init_app(app)
+# Per-endpoint concurrency and queue limits; bulk callers send X-ANIPE-Priority: bulk
+admission = anipe_admission.init_app(app, {
+    "generate_product": {"concurrency": 2, "queue": 4, "queue_timeout": 60.0},
+})
+# Record or replay outbound calls per ANIPE_CASSETTE_MODE
+anipe_cassette.init_app(app, "anip-product-generator")
 
 # Favicon route to prevent 404 errors
 @app.route('/favicon.ico')
@@ -43,12 +59,14 @@ except Exception as e:
 # Get environment variables
 GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "windsurf-anipe-data")
 
-def create_pdf_report(opportunity: dict, content: str) -> bytes:
+def create_pdf_report(opportunity: Opportunity, document: ProductDocument):
     """
-    Create a professional PDF report from the opportunity and content
+    Create a professional PDF report from the opportunity and content.
+    Renders into a spooled temp file (spills to disk for large reports) and
+    returns it rewound to the start; the caller closes it.
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, 
+    output = spooled_file()
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72, 
                            topMargin=72, bottomMargin=18)
     
     # Define styles
@@ -81,11 +99,27 @@ def create_pdf_report(opportunity: dict, content: str) -> bytes:
         rightIndent=0
     )
     
+    subheading_style = ParagraphStyle(
+        'CustomSubheading',
+        parent=styles['Heading3'],
+        fontSize=13,
+        spaceAfter=8,
+        spaceBefore=10,
+        textColor=colors.HexColor('#34495e')
+    )
+    
+    code_style = ParagraphStyle(
+        'CustomCode',
+        parent=styles['Code'],
+        fontSize=9,
+        leftIndent=12
+    )
+    
     # Build the document
     story = []
     
-    # Title Page
-    title = opportunity.get('niche_topic', 'Business Intelligence Report')
+    # Title Page (model output is escaped so a stray < or & can't break the build)
+    title = render_inline(opportunity.niche_topic)
     story.append(Paragraph(title, title_style))
     story.append(Spacer(1, 20))
     
@@ -96,11 +130,11 @@ def create_pdf_report(opportunity: dict, content: str) -> bytes:
     
     # Executive Summary Table
     summary_data = [
-        ['Target Market', opportunity.get('target_audience', 'Professional audience')],
-        ['Problem Statement', opportunity.get('problem_statement', 'Market challenge')],
-        ['Opportunity Score', f"{opportunity.get('opportunity_score', 85)}/100"],
+        ['Target Market', opportunity.target_audience],
+        ['Problem Statement', opportunity.problem_statement],
+        ['Opportunity Score', f"{opportunity.extra.get('opportunity_score', 85)}/100"],
         ['Generated', datetime.now().strftime('%B %d, %Y')],
-        ['Report Length', f"{len(content.split())} words"]
+        ['Report Length', f"{document.word_count} words"]
     ]
     
     summary_table = Table(summary_data, colWidths=[2.5*inch, 4*inch])
@@ -117,15 +151,15 @@ def create_pdf_report(opportunity: dict, content: str) -> bytes:
     story.append(summary_table)
     story.append(PageBreak())
     
-    # Content sections
-    story.append(Paragraph("Executive Summary", heading_style))
-    
-    # Split content into paragraphs and add to story
-    paragraphs = content.split('\n\n')
-    for para in paragraphs:
-        if para.strip():
-            story.append(Paragraph(para.strip(), body_style))
-            story.append(Spacer(1, 6))
+    # Content sections: headings, lists, tables and inline emphasis from the Markdown
+    blocks = parse_markdown_cached(document.content, document.content_hash)
+    story.extend(blocks_to_flowables(blocks, {
+        "h1": heading_style,
+        "h2": subheading_style,
+        "h3": styles['Heading4'],
+        "body": body_style,
+        "code": code_style
+    }, doc.width))
     
     # Footer
     story.append(Spacer(1, 30))
@@ -133,28 +167,20 @@ def create_pdf_report(opportunity: dict, content: str) -> bytes:
                           styles['Normal']))
     
     # Build PDF
-    doc.build(story)
-    
-    # Get the PDF data
-    pdf_data = buffer.getvalue()
-    buffer.close()
+    try:
+        doc.build(story)
+    except Exception:
+        output.close()
+        raise
     
-    return pdf_data
+    output.seek(0)
+    return output
 
-# --- Helper Function: Generate Product Content with AI ---
-def generate_product_content(opportunity: dict) -> str:
-    """
-    Uses Gemini AI to generate content for the digital product based on the identified opportunity.
-    Falls back to simulated responses if AI is unavailable.
-    """
-    niche_topic = opportunity.get("niche_topic", "an unspecified niche")
-    product_idea = opportunity.get("product_idea", "a detailed report")
-    problem_statement = opportunity.get("problem_statement", "a general problem")
-    target_audience = opportunity.get("target_audience", "general audience")
-    
-    prompt = f"""
+# Static report specification of the product prompt, cached as context across
+# calls; only the product brief is sent per request
+PRODUCT_PREAMBLE = """
     You are a senior industry consultant creating a premium digital product for paying customers.
-    
+
     CRITICAL REQUIREMENTS:
     - This product will be SOLD for $50-500, so it must be GENUINELY VALUABLE
     - Must be highly specific to the niche (not generic advice)
@@ -162,70 +188,92 @@ def generate_product_content(opportunity: dict) -> str:
     - Must demonstrate deep industry knowledge and expertise
     - Must provide specific data, examples, and case studies where possible
     - Must be professional-grade content that justifies the price point
-    
-    PRODUCT BRIEF:
-    Product Idea: {product_idea}
-    Niche Topic: {niche_topic}
-    Problem Addressed: {problem_statement}
-    Target Audience: {target_audience}
-    
+
     Create a comprehensive, premium-quality report with these sections:
-    
+
     1. EXECUTIVE SUMMARY (3-4 paragraphs)
        - Quantify the problem (costs, time, risks)
        - Present key findings and recommendations
        - Include specific ROI or value metrics
-    
+
     2. MARKET LANDSCAPE ANALYSIS
        - Current market size and trends (include specific numbers where possible)
        - Key players and competitive dynamics
        - Regulatory/technology factors affecting the space
        - Identified gaps and opportunities
-    
+
     3. DEEP-DIVE PROBLEM ANALYSIS
        - Root causes of the problem
        - Current typical solutions and their limitations
        - Cost analysis of status quo vs. proposed solution
        - Real-world examples and case studies
-    
+
     4. STRATEGIC SOLUTION FRAMEWORK
        - Detailed methodology/approach (step-by-step)
        - Specific tools, technologies, and resources required
        - Implementation timeline and milestones
        - Risk mitigation strategies
-    
+
     5. ACTIONABLE IMPLEMENTATION GUIDE
        - Detailed action items with priorities
        - Templates, checklists, or frameworks
        - Vendor recommendations and evaluation criteria
        - Budget considerations and ROI calculations
-    
+
     6. INDUSTRY-SPECIFIC INSIGHTS
        - Expert predictions for the next 12-24 months
        - Emerging technologies or trends to watch
        - Potential disruptions or opportunities
        - Strategic recommendations for staying ahead
-    
+
     7. CONCLUSION & NEXT STEPS
        - Key takeaways and action priorities
        - Success metrics and KPIs to track
        - Resources for continued learning
-    
+
     QUALITY STANDARDS:
     - Minimum 3000 words of substantive content
     - Include specific examples, case studies, or data points
     - Use professional business language
     - Provide frameworks, not just theories
     - Make it worth the asking price
-    
+
     Write as an authoritative industry expert with deep domain knowledge.
     """
+
+# --- Helper Function: Generate Product Content with AI ---
+def generate_product_content(opportunity: Opportunity) -> str:
+    """
+    Uses Gemini AI to generate content for the digital product based on the identified opportunity.
+    Falls back to simulated responses if AI is unavailable.
+    """
+    niche_topic = opportunity.niche_topic
+    product_idea = opportunity.product_idea
+    problem_statement = opportunity.problem_statement
+    target_audience = opportunity.target_audience
+    
+    # Split the step's input budget across the four brief fields
+    field_budget = get_step_budget("product") // 4
+    
+    prompt = compile_prompt("product", """
+    PRODUCT BRIEF:
+    Product Idea: {product_idea}
+    Niche Topic: {niche_topic}
+    Problem Addressed: {problem_statement}
+    Target Audience: {target_audience}
+
+    Write the report for this brief.
+    """,
+        product_idea=truncate_to_tokens(product_idea, field_budget),
+        niche_topic=truncate_to_tokens(niche_topic, field_budget),
+        problem_statement=truncate_to_tokens(problem_statement, field_budget),
+        target_audience=truncate_to_tokens(target_audience, field_budget))
     
     # Try to use Gemini AI
     try:
         if os.environ.get("GEMINI_API_KEY"):
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
+            response = router.generate("product", prompt, prefix=PRODUCT_PREAMBLE)
+            log_response("product", PRODUCT_PREAMBLE + prompt, response)
             print(f"AI product generation successful for: {niche_topic}")
             return f"# AI-Generated Product Report\n\n{response.text}\n\n---\n*Generated using Gemini AI*"
         else:
@@ -274,11 +322,12 @@ def generate_product():
         if not data or 'opportunity' not in data:
             return jsonify({"status": "error", "message": "No opportunity data provided"}), 400
         
-        opportunity = data['opportunity']
+        opportunity_data = data['opportunity']
+        run_id = clean_run_id(data.get('run_id') or (opportunity_data or {}).get('run_id'))
         
         # Optionally retrieve from GCS if only a path is provided
         gcs_path = data.get('gcs_path', None)
-        if not opportunity and gcs_path:
+        if not opportunity_data and gcs_path:
             try:
                 # Extract bucket and blob name from gs:// URL
                 path_parts = gcs_path.replace('gs://', '').split('/', 1)
@@ -286,41 +335,45 @@ def generate_product():
                     bucket_name, blob_name = path_parts
                     bucket = storage_client.bucket(bucket_name)
                     blob = bucket.blob(blob_name)
-                    opportunity_json = blob.download_as_text()
-                    opportunity = json.loads(opportunity_json)
+                    opportunity_data = Opportunity.from_dict(anipe_json.read_json(blob)).to_dict()
             except Exception as e:
                 print(f"Error retrieving opportunity from GCS: {e}")
                 return jsonify({"status": "error", "message": f"Failed to retrieve opportunity from GCS: {e}"}), 500
         
-        print(f"Generating product for niche: {opportunity.get('niche_topic', 'N/A')}")
+        opportunity = Opportunity.from_dict(opportunity_data)
+        print(f"Generating product for niche: {opportunity.niche_topic}")
         
         # Generate product content using AI
         product_content = generate_product_content(opportunity)
+        document = ProductDocument(product_content)
         
         # Create PDF report
-        pdf_data = create_pdf_report(opportunity, product_content)
+        pdf_file = create_pdf_report(opportunity, document)
         
-        # Save the generated PDF to GCS
-        # Sanitize niche_topic for filename (use fallback if missing)
-        niche_topic = opportunity.get('niche_topic', 'unknown_niche')
-        safe_niche_topic = niche_topic.replace(' ', '_').replace('/', '-').replace(':', '').replace(',', '')
-        product_blob_name = f"products/{safe_niche_topic}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-        product_blob = storage_client.bucket(GCS_BUCKET_NAME).blob(product_blob_name)
-        product_blob.upload_from_string(pdf_data, content_type="application/pdf")
+        # Stream the generated PDF to GCS (PDF and text share one artifact ID)
+        blob_stem = artifact_key("products", opportunity.slug, artifact_id=new_id())
+        product_blob_name = f"{blob_stem}.pdf"
+        with pdf_file:
+            upload_stream(storage_client.bucket(GCS_BUCKET_NAME), product_blob_name, pdf_file, "application/pdf",
+                          metadata={"run_id": run_id})
         
         # Also save text content for sales page generation
-        content_blob_name = f"products/{safe_niche_topic}_{datetime.now().strftime('%Y%m%d%H%M%S')}_content.txt"
+        content_blob_name = f"{blob_stem}_content.txt"
         content_blob = storage_client.bucket(GCS_BUCKET_NAME).blob(content_blob_name)
-        content_blob.upload_from_string(product_content, content_type="text/plain")
+        content_blob.metadata = {"run_id": run_id}
+        anipe_json.upload_gzip(content_blob, product_content, "text/plain; charset=utf-8")
         
         # Return success response
         response = {
             "status": "success", 
             "message": "Product PDF generated and saved.", 
             "content": product_content,  # Add the actual content for the workflow
+            "word_count": document.word_count,
+            "content_hash": document.content_hash,
             "product_gcs_path": f"gs://{GCS_BUCKET_NAME}/{product_blob_name}",
             "content_gcs_path": f"gs://{GCS_BUCKET_NAME}/{content_blob_name}",
-            "opportunity": opportunity
+            "run_id": run_id,
+            "opportunity": opportunity.to_dict()
         }
         return jsonify(response), 200
             
@@ -332,7 +385,9 @@ def generate_product():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Cloud Run."""
-    return jsonify({"status": "healthy", "service": "anip-product-generator"}), 200
+    return jsonify({"status": "healthy", "service": "anip-product-generator",
+                    "context_cache": context_cache.stats, "llm": router.snapshot(),
+                    "breakers": breaker_states(), "admission": admission.snapshot()}), 200
 
 # Main entry point
 if __name__ == "__main__":
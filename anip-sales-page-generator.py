@@ -5,15 +5,42 @@ Creates professional sales pages with Stripe payment integration
 """
 
 import os
+import re
 import json
+import uuid
 import base64
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from flask import Flask, request, jsonify, send_from_directory
 from google.cloud import storage
 import google.generativeai as genai
 import stripe
+import anipe_admission
+import anipe_cassette
+import anipe_json
+from anipe_prompts import compile_prompt, get_step_budget, log_response, select_sections
+from anipe_catalog import add_to_catalog
+from anipe_fulfillment import record_payment_link
+from anipe_keys import clean_run_id, unique_name
+from anipe_llm import expect_json, router
+from anipe_models import Opportunity, ProductDocument
+from anipe_resilience import CircuitOpenError, breaker_states, get_breaker
+from anipe_publish import publish_hashed_asset, upload_compressed
+from anipe_stripe import StripeCatalog, configure as configure_stripe, tier_for
 
 app = Flask(__name__)
+anipe_json.init_app(app)
+# Per-endpoint concurrency and queue limits; bulk callers send X-ANIPE-Priority: bulk
+admission = anipe_admission.init_app(app, {
+    "generate_sales_page": {"concurrency": 4, "queue": 6, "queue_timeout": 60.0},
+    "prepare_sales_page_early": {"concurrency": 2, "queue": 2, "queue_timeout": 10.0, "default_priority": "bulk"},
+    "create_payment_links": {"concurrency": 1, "queue": 2, "default_priority": "bulk"},
+})
+# Record or replay outbound calls per ANIPE_CASSETTE_MODE
+anipe_cassette.init_app(app, "anip-sales-page-generator")
 
 @app.route('/favicon.ico')
 def favicon():
@@ -24,15 +51,20 @@ def favicon():
 stripe_api_key = os.environ.get("STRIPE_SECRET_KEY")
 print(f"DEBUG: Environment variables loaded: {list(os.environ.keys())[:10]}...")
 print(f"DEBUG: STRIPE_SECRET_KEY found: {'Yes' if stripe_api_key else 'No'}")
+stripe_catalog = StripeCatalog()
 if stripe_api_key:
-    stripe.api_key = stripe_api_key
+    configure_stripe(stripe_api_key)
+    # Price tiers are created/verified off the request path and re-checked periodically
+    # (not when replaying offline, where Stripe is only what the cassette recorded)
+    if anipe_cassette.MODE != anipe_cassette.REPLAY:
+        stripe_catalog.start_reconciler()
     print("Stripe configured successfully")
 else:
     print("Warning: STRIPE_SECRET_KEY not found - payments will use placeholder links")
 
-def create_stripe_payment_link(product_data: dict, price: int = 2997) -> str:
+def create_stripe_payment_link(product_data: Opportunity, page_slug: str, price: int = 27) -> str:
     """
-    Create a Stripe payment link for the product
+    Create a Stripe payment link for one sales page (its unique slug) at a dollar price tier
     Returns the payment URL or a placeholder if Stripe isn't configured
     """
     try:
@@ -42,58 +74,23 @@ def create_stripe_payment_link(product_data: dict, price: int = 2997) -> str:
             print(f"INFO: Using fallback demo link: {fallback_url}")
             return fallback_url
         
-        print(f"INFO: Creating Stripe payment link with key ending in: ...{stripe_api_key[-4:]}")
-        
-        # Create a Stripe product
-        print("INFO: Creating Stripe product...")
-        product = stripe.Product.create(
-            name=f"{product_data.get('niche_topic', 'Digital Report')} - AI Generated Report",
-            description=f"Professional analysis and recommendations for {product_data.get('target_audience', 'business professionals')}. This comprehensive PDF report provides actionable insights and strategies.",
-            metadata={
-                "source": "ANIPE-AutoGenerated",
-                "niche": product_data.get('niche_topic', 'Unknown'),
-                "generated_at": datetime.now().isoformat()
-            }
-        )
-        print(f"INFO: Stripe product created successfully: {product.id}")
-        
-        # Create a price
-        print(f"INFO: Creating Stripe price for ${price/100:.2f}...")
-        price_obj = stripe.Price.create(
-            unit_amount=price,  # Price in cents
-            currency='usd',
-            product=product.id,
-        )
-        print(f"INFO: Stripe price created successfully: {price_obj.id}")
-        
-        # Create payment link with better customer experience
-        print("INFO: Creating Stripe payment link...")
-        payment_link = stripe.PaymentLink.create(
-            line_items=[{
-                'price': price_obj.id,
-                'quantity': 1,
-            }],
-            after_completion={
-                'type': 'hosted_confirmation',
-                'hosted_confirmation': {
-                    'custom_message': f'🎉 Thank you for your purchase! Your "{product_data.get("niche_topic", "Digital Report")}" PDF report will be delivered to your email within 5 minutes. Check your inbox (and spam folder) for download instructions.'
-                }
-            },
-            allow_promotion_codes=True,
-            billing_address_collection='auto',
-            shipping_address_collection={
-                'allowed_countries': ['US', 'CA', 'GB', 'AU', 'DE', 'FR']
-            }
-        )
-        print(f"INFO: Stripe payment link created successfully: {payment_link.url}")
+        # Product and price come from the cached tier catalog; only the link is created here
+        print(f"INFO: Creating Stripe payment link for ${price} tier...")
+        url = stripe_catalog.create_payment_link(product_data.niche_topic, page_slug, price)
+        print(f"INFO: Stripe payment link created successfully: {url}")
         
         # Defensive check to ensure URL is valid
-        if not payment_link.url or payment_link.url == "":
+        if not url:
             print("ERROR: Empty payment link URL returned from Stripe")
             return "https://buy.stripe.com/test_fallback_link"
             
-        return payment_link.url
+        return url
         
+    except CircuitOpenError as e:
+        # Stripe is known to be down: don't spend the request waiting on it
+        print(f"STRIPE UNAVAILABLE: {e}")
+        return "https://buy.stripe.com/test_unavailable_link"
+
     except stripe.error.AuthenticationError as e:
         error_msg = f"STRIPE AUTH ERROR: {str(e)} - Check if STRIPE_SECRET_KEY is valid and not a test key"
         print(error_msg)
@@ -114,14 +111,19 @@ def create_stripe_payment_link(product_data: dict, price: int = 2997) -> str:
         print(error_msg)
         return "https://buy.stripe.com/test_general_error_link"
 
-# Initialize GCP clients
+# Initialize GCP clients (created lazily on first publish)
+storage_client = None
 
-def generate_ai_sales_copy(product_data, product_content):
+def generate_ai_sales_copy(product_data: Opportunity, document: ProductDocument):
     """Generate AI-powered sales copy based on the product content"""
     
     # Default sales copy in case AI fails
     default_copy = {
-        "headline": f"Revolutionary {product_data.get('niche_topic', 'Digital Product')} Guide",
+        "headline": f"Revolutionary {product_data.niche_topic} Guide",
+        "alternate_headlines": [
+            f"The {product_data.niche_topic} Playbook",
+            f"Master {product_data.niche_topic} in One Report"
+        ],
         "subheadline": "Transform your approach with AI-generated insights",
         "benefits": [
             "Comprehensive analysis and recommendations",
@@ -144,23 +146,35 @@ def generate_ai_sales_copy(product_data, product_content):
             
         # Configure Gemini
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        
+        # Pick the most relevant sections of the product within the step's token budget
+        keywords = product_data.keywords
+        content_preview = select_sections(
+            document.content,
+            get_step_budget("sales_copy"),
+            keywords + [product_data.niche_topic],
+            sections=document.sections
+        )
         
         # Create enhanced prompt for sales copy generation
-        prompt = f"""
+        prompt = compile_prompt("sales_copy", """
 Generate compelling sales copy for a digital product based on this content:
 
-PRODUCT TOPIC: {product_data.get('niche_topic', 'Digital Product')}
-TARGET AUDIENCE: {product_data.get('target_audience', 'Professionals')}
-PROBLEM STATEMENT: {product_data.get('problem_statement', 'Industry challenges')}
-KEYWORDS: {', '.join(product_data.get('keywords', []))}
+PRODUCT TOPIC: {niche_topic}
+TARGET AUDIENCE: {target_audience}
+PROBLEM STATEMENT: {problem_statement}
+KEYWORDS: {keywords}
 
 PRODUCT CONTENT PREVIEW:
-{product_content[:1500]}...
+{content_preview}
 
 Generate sales copy in this JSON format:
 {{
     "headline": "Compelling headline that grabs attention (max 60 chars)",
+    "alternate_headlines": [
+        "Alternative headline with a different angle (max 60 chars)",
+        "Second alternative headline for A/B testing (max 60 chars)"
+    ],
     "subheadline": "Supporting subheadline that explains the value (max 120 chars)",
     "benefits": [
         "Specific benefit 1 based on actual content",
@@ -184,9 +198,16 @@ Template Guidelines:
 
 Choose template and colors that match the product's target audience and topic sophistication level.
 Make it sound professional but exciting. Focus on the specific value this content provides.
-"""
+""",
+            niche_topic=product_data.niche_topic,
+            target_audience=product_data.target_audience,
+            problem_statement=product_data.problem_statement,
+            keywords=', '.join(keywords),
+            # Speculative (prepare) calls run before the product content exists
+            content_preview=content_preview or f"(Product in production) Planned product: {product_data.product_idea}")
         
-        response = model.generate_content(prompt)
+        response = router.generate("sales_copy", prompt, validate=expect_json)
+        log_response("sales_copy", prompt, response)
         response_text = response.text.strip()
         
         # Clean up response if needed
@@ -204,6 +225,8 @@ Make it sound professional but exciting. Focus on the specific value this conten
             if field not in ai_copy:
                 raise ValueError(f"Missing required field: {field}")
                 
+        ai_copy.setdefault('alternate_headlines', [])
+        
         print(f"AI sales copy generated successfully for: {ai_copy['headline']} (Template: {ai_copy['template']}, Colors: {ai_copy['color_scheme']})")
         return ai_copy
         
@@ -211,8 +234,180 @@ Make it sound professional but exciting. Focus on the specific value this conten
         print(f"AI sales copy generation failed: {e}, using default copy")
         return default_copy
 
+# Shared base styles for every sales page. Published once as a content-hashed
+# stylesheet and referenced by each page; only template styles are inlined.
+BASE_CSS = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    line-height: 1.6;
+    color: #333;
+    min-height: 100vh;
+}
+
+.container {
+    max-width: 800px;
+    margin: 0 auto;
+    padding: 20px;
+    margin-top: 20px;
+    margin-bottom: 20px;
+}
+
+.header {
+    text-align: center;
+    padding: 40px 0;
+    border-bottom: 2px solid #f0f0f0;
+    margin-bottom: 30px;
+}
+
+.header h1 {
+    font-size: 2.5rem;
+    margin-bottom: 10px;
+    font-weight: 700;
+}
+
+.header .subtitle {
+    font-size: 1.2rem;
+    color: #7f8c8d;
+    margin-bottom: 20px;
+}
+
+.price {
+    font-size: 3rem;
+    font-weight: bold;
+    margin: 20px 0;
+}
+
+.buy-button {
+    display: inline-block;
+    color: white;
+    padding: 20px 40px;
+    text-decoration: none;
+    border-radius: 50px;
+    font-size: 1.3rem;
+    font-weight: bold;
+    margin: 20px 0;
+    transition: transform 0.3s ease;
+}
+
+.buy-button:hover {
+    transform: translateY(-2px);
+}
+
+.features {
+    margin: 40px 0;
+}
+
+.features h2 {
+    margin-bottom: 20px;
+    font-size: 1.8rem;
+}
+
+.features ul {
+    list-style: none;
+    padding-left: 0;
+}
+
+.features li {
+    padding: 10px 0;
+    border-bottom: 1px solid #ecf0f1;
+    position: relative;
+    padding-left: 30px;
+}
+
+.features li:before {
+    content: "✓";
+    position: absolute;
+    left: 0;
+    color: #27ae60;
+    font-weight: bold;
+    font-size: 1.2rem;
+}
+
+.guarantee {
+    background: #f8f9fa;
+    padding: 30px;
+    border-radius: 10px;
+    text-align: center;
+    margin: 30px 0;
+    border-left: 5px solid #27ae60;
+}
+
+.preview {
+    background: #f8f9fa;
+    padding: 20px;
+    border-radius: 10px;
+    margin: 20px 0;
+    border-left: 5px solid #3498db;
+}
+
+.preview h3 {
+    margin-bottom: 15px;
+}
+
+.ai-badge {
+    display: inline-block;
+    background: linear-gradient(45deg, #9b59b6, #8e44ad);
+    color: white;
+    padding: 5px 15px;
+    border-radius: 20px;
+    font-size: 0.9rem;
+    margin: 10px 0;
+}
+
+.urgency {
+    background: #fff3cd;
+    padding: 20px;
+    border-radius: 10px;
+    text-align: center;
+    margin: 20px 0;
+    border-left: 5px solid #ffc107;
+    font-weight: bold;
+    color: #856404;
+}
+
+.testimonial {
+    background: #f8f9fa;
+    padding: 25px;
+    border-radius: 10px;
+    margin: 25px 0;
+    font-style: italic;
+    border-left: 5px solid #17a2b8;
+}
+
+.stats {
+    display: flex;
+    justify-content: space-around;
+    margin: 30px 0;
+    text-align: center;
+}
+
+.stat {
+    flex: 1;
+    padding: 20px;
+}
+
+.stat-number {
+    font-size: 2.5rem;
+    font-weight: bold;
+    color: #e74c3c;
+}
+
+@media (max-width: 768px) {
+    .container { margin: 10px; padding: 15px; }
+    .header h1 { font-size: 2rem; }
+    .price { font-size: 2.5rem; }
+    .buy-button { padding: 15px 30px; font-size: 1.1rem; }
+    .stats { flex-direction: column; }
+}
+"""
+
+TEMPLATES = ["modern", "executive", "minimal", "bold", "elegant"]
+COLOR_SCHEMES = ["blue", "green", "purple", "orange", "red", "teal"]
+
+@lru_cache(maxsize=None)
 def get_template_styles(template, color_scheme):
-    """Generate CSS styles based on template and color scheme"""
+    """Generate CSS styles based on template and color scheme (cached per combination)"""
     
     # Color palettes
     colors = {
@@ -471,225 +666,102 @@ def get_template_styles(template, color_scheme):
         }}
         """
 
-def generate_sales_page_html(product_data, product_content):
-    """Generate a professional sales page HTML from product data"""
-    
-    # Generate AI-powered sales copy based on the product content
-    sales_copy = generate_ai_sales_copy(product_data, product_content)
+def calculate_price(content_length, keywords):
+    """Price in dollars based on content length and topic complexity, snapped to a Stripe price tier"""
+    return tier_for(min(97, max(27, (content_length // 100) + len(keywords) * 3)))
+
+def prepare_sales_page(product_data: Opportunity, document: ProductDocument, stylesheet_href=None, prepared=None):
+    """
+    Compute everything a sales page needs that doesn't depend on its layout:
+    AI sales copy, price, Stripe link, word count and the shared HTML fragments.
+    Computed once and shared by every variant of the page.
+    When `prepared` comes from /prepare its draft copy and Stripe link are reused.
+    """
     
     # Extract key information
-    niche_topic = product_data.get('niche_topic', 'Digital Product')
-    problem_statement = product_data.get('problem_statement', 'Solving important problems')
-    target_audience = product_data.get('target_audience', 'Professional audience')
-    keywords = product_data.get('keywords', [])
-    
-    # Create a clean title and filename
-    clean_title = niche_topic.replace(' ', '_').replace('/', '_')[:50]
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    niche_topic = product_data.niche_topic
+    keywords = product_data.keywords
     
     # Generate a price based on content length and topic complexity
-    content_length = len(product_content)
-    base_price = min(97, max(27, (content_length // 100) + len(keywords) * 3))
+    base_price = calculate_price(len(document), keywords)
+    
+    # Unique per page, so concurrent pages for one niche never overwrite each other
+    # or share a payment link; a prepared page keeps the slug its link was made for
+    slug = (prepared or {}).get('slug') or unique_name(product_data.slug)
+    
+    if prepared:
+        sales_copy = prepared['sales_copy']
+        if prepared['price'] == base_price:
+            payment_link = prepared['payment_link']
+        else:
+            # The speculative price didn't match the real content, so this page needs its own link
+            print(f"Prepared price ${prepared['price']} != ${base_price}, creating a new payment link")
+            payment_link = create_stripe_payment_link(product_data, slug, base_price)
+    else:
+        # Generate AI-powered sales copy based on the product content
+        sales_copy = generate_ai_sales_copy(product_data, document)
+        payment_link = create_stripe_payment_link(product_data, slug, base_price)
     
-    # Get template styles
-    template_styles = get_template_styles(sales_copy['template'], sales_copy['color_scheme'])
+    if stylesheet_href:
+        base_stylesheet = f'<link rel="stylesheet" href="{stylesheet_href}">'
+    else:
+        base_stylesheet = f"<style>{BASE_CSS}</style>"
     
-    # Create the HTML template with AI-generated sales copy
-    html_content = f"""<!DOCTYPE html>
+    return {
+        "sales_copy": sales_copy,
+        "niche_topic": niche_topic,
+        "slug": slug,
+        "price": base_price,
+        # One Stripe link shared by both buy buttons and all variants
+        "payment_link": payment_link,
+        "word_count": document.word_count,
+        "base_stylesheet": base_stylesheet,
+        "meta_description": sales_copy['description'][:160],
+        "keywords_meta": ', '.join(keywords),
+        "focus_areas": ', '.join(keywords[:5]),
+        "subheadline": sales_copy['subheadline'],
+        "description": sales_copy['description'],
+        "urgency": sales_copy['urgency'],
+        "target_audience": product_data.target_audience,
+        "benefit_count": len(sales_copy['benefits']),
+        "benefits_html": ''.join([f'<li>{benefit}</li>' for benefit in sales_copy['benefits']]),
+        "generated_month": datetime.now().strftime('%B %Y')
+    }
+
+def render_sales_page(context, template, color_scheme, headline):
+    """Render one sales page layout from a prepared context"""
+    return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{sales_copy['headline']} - AI-Generated Business Intelligence Report</title>
-    <meta name="description" content="{sales_copy['description'][:160]}">
-    <meta name="keywords" content="{', '.join(keywords)}">
+    <title>{headline} - AI-Generated Business Intelligence Report</title>
+    <meta name="description" content="{context['meta_description']}">
+    <meta name="keywords" content="{context['keywords_meta']}">
     
+    {context['base_stylesheet']}
     <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            min-height: 100vh;
-        }}
-        
-        .container {{
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-            margin-top: 20px;
-            margin-bottom: 20px;
-        }}
-        
-        .header {{
-            text-align: center;
-            padding: 40px 0;
-            border-bottom: 2px solid #f0f0f0;
-            margin-bottom: 30px;
-        }}
-        
-        .header h1 {{
-            font-size: 2.5rem;
-            margin-bottom: 10px;
-            font-weight: 700;
-        }}
-        
-        .header .subtitle {{
-            font-size: 1.2rem;
-            color: #7f8c8d;
-            margin-bottom: 20px;
-        }}
-        
-        .price {{
-            font-size: 3rem;
-            font-weight: bold;
-            margin: 20px 0;
-        }}
-        
-        .buy-button {{
-            display: inline-block;
-            color: white;
-            padding: 20px 40px;
-            text-decoration: none;
-            border-radius: 50px;
-            font-size: 1.3rem;
-            font-weight: bold;
-            margin: 20px 0;
-            transition: transform 0.3s ease;
-        }}
-        
-        .buy-button:hover {{
-            transform: translateY(-2px);
-        }}
-        
-        .features {{
-            margin: 40px 0;
-        }}
-        
-        .features h2 {{
-            margin-bottom: 20px;
-            font-size: 1.8rem;
-        }}
-        
-        .features ul {{
-            list-style: none;
-            padding-left: 0;
-        }}
-        
-        .features li {{
-            padding: 10px 0;
-            border-bottom: 1px solid #ecf0f1;
-            position: relative;
-            padding-left: 30px;
-        }}
-        
-        .features li:before {{
-            content: "✓";
-            position: absolute;
-            left: 0;
-            color: #27ae60;
-            font-weight: bold;
-            font-size: 1.2rem;
-        }}
-        
-        .guarantee {{
-            background: #f8f9fa;
-            padding: 30px;
-            border-radius: 10px;
-            text-align: center;
-            margin: 30px 0;
-            border-left: 5px solid #27ae60;
-        }}
-        
-        .preview {{
-            background: #f8f9fa;
-            padding: 20px;
-            border-radius: 10px;
-            margin: 20px 0;
-            border-left: 5px solid #3498db;
-        }}
-        
-        .preview h3 {{
-            margin-bottom: 15px;
-        }}
-        
-        .ai-badge {{
-            display: inline-block;
-            background: linear-gradient(45deg, #9b59b6, #8e44ad);
-            color: white;
-            padding: 5px 15px;
-            border-radius: 20px;
-            font-size: 0.9rem;
-            margin: 10px 0;
-        }}
-        
-        .urgency {{
-            background: #fff3cd;
-            padding: 20px;
-            border-radius: 10px;
-            text-align: center;
-            margin: 20px 0;
-            border-left: 5px solid #ffc107;
-            font-weight: bold;
-            color: #856404;
-        }}
-        
-        .testimonial {{
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 10px;
-            margin: 25px 0;
-            font-style: italic;
-            border-left: 5px solid #17a2b8;
-        }}
-        
-        .stats {{
-            display: flex;
-            justify-content: space-around;
-            margin: 30px 0;
-            text-align: center;
-        }}
-        
-        .stat {{
-            flex: 1;
-            padding: 20px;
-        }}
-        
-        .stat-number {{
-            font-size: 2.5rem;
-            font-weight: bold;
-            color: #e74c3c;
-        }}
-        
-        @media (max-width: 768px) {{
-            .container {{ margin: 10px; padding: 15px; }}
-            .header h1 {{ font-size: 2rem; }}
-            .price {{ font-size: 2.5rem; }}
-            .buy-button {{ padding: 15px 30px; font-size: 1.1rem; }}
-            .stats {{ flex-direction: column; }}
-        }}
-        
-        /* Apply template-specific styles */
-        {template_styles}
+        /* Template-specific styles */
+        {get_template_styles(template, color_scheme)}
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
             <div class="ai-badge">🤖 AI-Generated Business Intelligence</div>
-            <h1>{sales_copy['headline']}</h1>
-            <p class="subtitle">{sales_copy['subheadline']}</p>
-            <div class="price">${base_price}</div>
-            <a href="{create_stripe_payment_link(product_data, base_price)}" class="buy-button" id="buyButton">📈 Get Instant Access Now</a>
+            <h1>{headline}</h1>
+            <p class="subtitle">{context['subheadline']}</p>
+            <div class="price">${context['price']}</div>
+            <a href="{context['payment_link']}" class="buy-button" id="buyButton">📈 Get Instant Access Now</a>
         </div>
         
         <div class="stats">
             <div class="stat">
-                <div class="stat-number">{len(product_content.split())}</div>
+                <div class="stat-number">{context['word_count']}</div>
                 <div>Words of Content</div>
             </div>
             <div class="stat">
-                <div class="stat-number">{len(sales_copy['benefits'])}</div>
+                <div class="stat-number">{context['benefit_count']}</div>
                 <div>Key Benefits</div>
             </div>
             <div class="stat">
@@ -701,17 +773,17 @@ def generate_sales_page_html(product_data, product_content):
         <div class="features">
             <h2>🎯 What You'll Get:</h2>
             <ul>
-                {''.join([f'<li>{benefit}</li>' for benefit in sales_copy['benefits']])}
+                {context['benefits_html']}
             </ul>
         </div>
         
         <div class="preview">
             <h3>📋 About This Report:</h3>
-            <p>{sales_copy['description']}</p>
-            <p><strong>Target Market:</strong> {target_audience}</p>
-            <p><strong>Key Focus Areas:</strong> {', '.join(keywords[:5])}</p>
-            <p><strong>Report Length:</strong> {len(product_content.split())} words of actionable content</p>
-            <p><strong>Generated:</strong> {datetime.now().strftime('%B %Y')}</p>
+            <p>{context['description']}</p>
+            <p><strong>Target Market:</strong> {context['target_audience']}</p>
+            <p><strong>Key Focus Areas:</strong> {context['focus_areas']}</p>
+            <p><strong>Report Length:</strong> {context['word_count']} words of actionable content</p>
+            <p><strong>Generated:</strong> {context['generated_month']}</p>
         </div>
         
         <div class="testimonial">
@@ -719,7 +791,7 @@ def generate_sales_page_html(product_data, product_content):
         </div>
         
         <div class="urgency">
-            ⚡ {sales_copy['urgency']}
+            ⚡ {context['urgency']}
         </div>
         
         <div class="guarantee">
@@ -728,13 +800,13 @@ def generate_sales_page_html(product_data, product_content):
         </div>
         
         <div style="text-align: center; margin: 40px 0;">
-            <a href="{create_stripe_payment_link(product_data, base_price)}" class="buy-button" id="buyButton2">🚀 Transform Your Business Today - ${base_price}</a>
+            <a href="{context['payment_link']}" class="buy-button" id="buyButton2">🚀 Transform Your Business Today - ${context['price']}</a>
         </div>
         
         <div style="text-align: center; padding: 20px; color: #7f8c8d; font-size: 0.9rem;">
             <p>Generated by ANIPE - Autonomous Niche Intelligence & Product Engine</p>
             <p>🤖 AI Business Intelligence. All rights reserved.</p>
-            <p>Template: {sales_copy['template'].title()} | Colors: {sales_copy['color_scheme'].title()}</p>
+            <p>Template: {template.title()} | Colors: {color_scheme.title()}</p>
         </div>
     </div>
     
@@ -754,8 +826,219 @@ def generate_sales_page_html(product_data, product_content):
     </script>
 </body>
 </html>"""
+
+def plan_variants(sales_copy, count):
+    """
+    Pick `count` distinct (template, color_scheme, headline) combinations.
+    The AI-chosen layout and headline always come first.
+    """
+    headlines = [sales_copy['headline']] + [
+        h for h in sales_copy.get('alternate_headlines', []) if h and h != sales_copy['headline']
+    ]
+    primary = (sales_copy['template'], sales_copy['color_scheme'])
+    layouts = [primary] + [
+        (template, color) for color in COLOR_SCHEMES for template in TEMPLATES
+        if (template, color) != primary
+    ]
+    
+    variants = []
+    for i, (template, color_scheme) in enumerate(layouts[:max(1, count)]):
+        variants.append({
+            "variant": i,
+            "template": template,
+            "color_scheme": color_scheme,
+            "headline": headlines[i % len(headlines)]
+        })
+    return variants
+
+def generate_sales_page_html(product_data: Opportunity, document: ProductDocument, stylesheet_href=None):
+    """
+    Generate a professional sales page HTML from product data.
+    Pages link the shared base stylesheet when stylesheet_href is given,
+    otherwise the base CSS is inlined.
+    """
+    context = prepare_sales_page(product_data, document, stylesheet_href)
+    sales_copy = context['sales_copy']
+    html_content = render_sales_page(context, sales_copy['template'], sales_copy['color_scheme'], sales_copy['headline'])
     
-    return html_content, f"{clean_title}_{timestamp}.html"
+    page_info = {
+        "title": sales_copy['headline'],
+        "niche_topic": context['niche_topic'],
+        "price": context['price'],
+        "template": sales_copy['template'],
+        "color_scheme": sales_copy['color_scheme']
+    }
+    
+    return html_content, f"{context['slug']}.html", page_info
+
+def get_sales_bucket():
+    """Return the sales page bucket, reusing one storage client per process"""
+    global storage_client
+    bucket_name = os.environ.get('GCS_BUCKET_NAME', 'windsurf-anipe-sales-pages')
+    if not bucket_name:
+        return None
+    if storage_client is None:
+        storage_client = storage.Client()
+    return storage_client.bucket(bucket_name)
+
+def publish_base_stylesheet(bucket):
+    """Publish the shared base CSS once and return its href relative to sales-pages/"""
+    blob_name = publish_hashed_asset(bucket, "sales-pages/assets", "base", "css", BASE_CSS, "text/css; charset=utf-8")
+    return blob_name[len("sales-pages/"):]
+
+# Speculative preparations made by /prepare, by prepare_id -> (monotonic time, state)
+# (this process only; GCS holds the copy other instances read)
+prepared_pages = OrderedDict()
+_prepared_lock = threading.Lock()
+PREPARED_CACHE_SIZE = 256
+
+# A preparation not finalized within this window is dropped, and its GCS copy
+# is removed by a sweep at most every PREPARED_SWEEP_INTERVAL seconds
+PREPARED_TTL = timedelta(hours=int(os.environ.get("SALES_PREPARED_TTL_HOURS", 6)))
+PREPARED_SWEEP_INTERVAL = 3600
+_last_prepared_sweep = None
+
+# Product length assumed when pricing before the product exists (~3000 words)
+EXPECTED_CONTENT_CHARS = int(os.environ.get("SALES_EXPECTED_CONTENT_CHARS", 20000))
+
+def _request_run_id(data: dict):
+    """The workflow run this request belongs to, if the caller passed one"""
+    run_id = data.get('run_id') or (data.get('opportunity') or {}).get('run_id')
+    return clean_run_id(run_id) if run_id else None
+
+def _prepared_blob_name(prepare_id):
+    return f"sales-pages/prepared/{prepare_id}.json"
+
+def _remember_prepared(prepare_id, prepared):
+    """Cache a preparation, evicting expired ones and the oldest beyond PREPARED_CACHE_SIZE"""
+    now = time.monotonic()
+    with _prepared_lock:
+        prepared_pages[prepare_id] = (now, prepared)
+        while prepared_pages:
+            oldest_at, _ = next(iter(prepared_pages.values()))
+            if len(prepared_pages) <= PREPARED_CACHE_SIZE and now - oldest_at <= PREPARED_TTL.total_seconds():
+                break
+            prepared_pages.popitem(last=False)
+
+def load_prepared(bucket, prepare_id):
+    """
+    Return the state saved by /prepare, or None if it can't be found or has
+    expired. It's used once, so the GCS copy is deleted as it's taken.
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", prepare_id or ""):
+        return None
+    with _prepared_lock:
+        cached = prepared_pages.pop(prepare_id, None)
+    prepared = cached[1] if cached else None
+    if bucket is None:
+        return prepared
+    
+    blob = bucket.blob(_prepared_blob_name(prepare_id))
+    if prepared is None:
+        try:
+            prepared = anipe_json.read_json(blob)
+        except Exception as e:
+            print(f"Prepared sales page {prepare_id} not available: {e}")
+            return None
+    try:
+        get_breaker("gcs").call(blob.delete)
+    except Exception as e:
+        # The sweep removes it later
+        print(f"Deleting prepared sales page {prepare_id} failed: {e}")
+    
+    if datetime.now() - datetime.fromisoformat(prepared['prepared_at']) > PREPARED_TTL:
+        print(f"Prepared sales page {prepare_id} expired, preparing from scratch")
+        return None
+    return prepared
+
+def sweep_prepared(bucket):
+    """Delete GCS copies of preparations that were never finalized"""
+    cutoff = datetime.now(timezone.utc) - PREPARED_TTL
+    removed = 0
+    for blob in storage_client.list_blobs(bucket, prefix="sales-pages/prepared/"):
+        if blob.time_created and blob.time_created < cutoff:
+            try:
+                blob.delete()
+                removed += 1
+            except Exception as e:
+                print(f"Deleting stale prepared page {blob.name} failed: {e}")
+    if removed:
+        print(f"Swept {removed} stale prepared sales pages")
+
+def _maybe_sweep_prepared(bucket):
+    """Run sweep_prepared in the background at most every PREPARED_SWEEP_INTERVAL seconds"""
+    global _last_prepared_sweep
+    # Replays only have the calls the cassette recorded
+    if anipe_cassette.MODE == anipe_cassette.REPLAY:
+        return
+    with _prepared_lock:
+        if _last_prepared_sweep is not None and time.monotonic() - _last_prepared_sweep < PREPARED_SWEEP_INTERVAL:
+            return
+        _last_prepared_sweep = time.monotonic()
+    
+    def run():
+        try:
+            sweep_prepared(bucket)
+        except Exception as e:
+            print(f"Prepared sales page sweep failed: {e}")
+    
+    threading.Thread(target=run, name="prepared-sweep", daemon=True).start()
+
+@app.route('/prepare', methods=['POST'])
+def prepare_sales_page_early():
+    """
+    Speculatively prepare a sales page from the opportunity alone, while the
+    product is still being generated: draft copy and Stripe payment link.
+    /generate finalizes it when called with the returned prepare_id.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        
+        opportunity = Opportunity.from_dict(data.get('opportunity', {}))
+        run_id = _request_run_id(data)
+        price = calculate_price(EXPECTED_CONTENT_CHARS, opportunity.keywords)
+        prepare_id = uuid.uuid4().hex
+        slug = unique_name(opportunity.slug)
+        prepared = {
+            "prepare_id": prepare_id,
+            "niche_topic": opportunity.niche_topic,
+            "slug": slug,
+            "sales_copy": generate_ai_sales_copy(opportunity, ProductDocument("")),
+            "price": price,
+            "payment_link": create_stripe_payment_link(opportunity, slug, price),
+            "prepared_at": datetime.now().isoformat()
+        }
+        _remember_prepared(prepare_id, prepared)
+        
+        try:
+            bucket = get_sales_bucket()
+            if bucket is not None:
+                blob = bucket.blob(_prepared_blob_name(prepare_id))
+                if run_id:
+                    blob.metadata = {"run_id": run_id}
+                anipe_json.upload_json(blob, prepared)
+                _maybe_sweep_prepared(bucket)
+        except Exception as e:
+            # Only a different instance finalizing would miss it
+            print(f"Saving prepared sales page failed: {e}")
+        
+        print(f"Prepared sales page {prepare_id} for: {opportunity.niche_topic}")
+        return jsonify({
+            "status": "success",
+            "prepare_id": prepare_id,
+            "price": price,
+            "payment_link": prepared['payment_link'],
+            "message": "Sales page prepared"
+        })
+        
+    except Exception as e:
+        print(f"Sales page preparation failed: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "failed"
+        }), 500
 
 @app.route('/generate', methods=['POST'])
 def generate_sales_page():
@@ -767,40 +1050,120 @@ def generate_sales_page():
             return jsonify({"error": "No data provided"}), 400
             
         # Extract the opportunity and product content
-        opportunity = data.get('opportunity', {})
+        opportunity = Opportunity.from_dict(data.get('opportunity', {}))
         product_content = data.get('product_content', '')
+        run_id = _request_run_id(data)
+        metadata = {"run_id": run_id} if run_id else None
         
         if not product_content:
             return jsonify({"error": "No product content provided"}), 400
         
-        # Generate the sales page
-        html_content, filename = generate_sales_page_html(opportunity, product_content)
+        # Optional A/B testing mode: render N layout/headline variants in one pass
+        try:
+            variant_count = int(data.get('variants', 1) or 1)
+        except (TypeError, ValueError):
+            return jsonify({"error": "variants must be an integer"}), 400
+        variant_count = max(1, min(variant_count, len(TEMPLATES) * len(COLOR_SCHEMES)))
+        
+        bucket = None
+        stylesheet_href = None
+        try:
+            bucket = get_sales_bucket()
+            if bucket is not None:
+                stylesheet_href = publish_base_stylesheet(bucket)
+        except Exception as e:
+            # Fall back to inline CSS so the page still renders
+            print(f"Base stylesheet publish failed: {e}")
+        
+        # Reuse the draft copy and Stripe link from an earlier /prepare call
+        prepared = None
+        if data.get('prepare_id'):
+            prepared = load_prepared(bucket, data['prepare_id'])
+        
+        # Sales copy, Stripe link, word counts and shared fragments are computed once
+        context = prepare_sales_page(opportunity, ProductDocument(product_content), stylesheet_href, prepared)
+        variants = plan_variants(context['sales_copy'], variant_count)
+        
+        html_content = None
+        for variant in variants:
+            suffix = f"_v{variant['variant']}" if variant['variant'] else ""
+            variant['filename'] = f"{context['slug']}{suffix}.html"
+            variant['gcs_url'] = None
+            
+            # Generate the sales page
+            variant_html = render_sales_page(context, variant['template'], variant['color_scheme'], variant['headline'])
+            if html_content is None:
+                html_content = variant_html
+            
+            # Upload to GCS if configured (gzip-encoded, immutable, public in one request)
+            if bucket is not None:
+                try:
+                    blob = upload_compressed(bucket, f"sales-pages/{variant['filename']}", variant_html, 'text/html; charset=utf-8',
+                                             metadata=metadata)
+                    variant['gcs_url'] = blob.public_url
+                    print(f"Sales page uploaded: {variant['gcs_url']}")
+                    
+                except Exception as e:
+                    print(f"GCS upload failed: {e}")
+        
+        primary = variants[0]
+        filename = primary['filename']
+        gcs_url = primary['gcs_url']
         
-        # Upload to GCS if configured
-        gcs_url = None
-        bucket_name = os.environ.get('GCS_BUCKET_NAME', 'windsurf-anipe-sales-pages')
-        if bucket_name:
+        # Variant manifest so traffic can be split and results attributed
+        variant_manifest = None
+        if len(variants) > 1 and bucket is not None:
             try:
-                client = storage.Client()
-                bucket = client.bucket(bucket_name)
-                blob = bucket.blob(f"sales-pages/{filename}")
-                blob.upload_from_string(html_content, content_type='text/html')
-                
-                # Make the blob publicly accessible
-                blob.make_public()
-                gcs_url = blob.public_url
-                print(f"Sales page uploaded: {gcs_url}")
-                
+                manifest = {
+                    "slug": context['slug'],
+                    "niche_topic": context['niche_topic'],
+                    "price": context['price'],
+                    "payment_link": context['payment_link'],
+                    "variants": variants
+                }
+                manifest_blob = upload_compressed(bucket, f"sales-pages/variants/{context['slug']}.json",
+                                                  anipe_json.dumps(manifest), 'application/json',
+                                                  metadata=metadata)
+                variant_manifest = manifest_blob.public_url
             except Exception as e:
-                print(f"GCS upload failed: {e}")
+                print(f"Variant manifest upload failed: {e}")
         
-        return jsonify({
+        # Record the primary page in the catalog (index.html + sitemap.xml)
+        if gcs_url:
+            try:
+                add_to_catalog(bucket, {
+                    "blob_name": f"sales-pages/{filename}",
+                    "url": gcs_url,
+                    "title": primary['headline'],
+                    "niche_topic": context['niche_topic'],
+                    "price": context['price'],
+                    "template": primary['template'],
+                    "color_scheme": primary['color_scheme']
+                })
+            except Exception as e:
+                print(f"Catalog update failed: {e}")
+        
+        # Let the fulfillment service find the product bought through this page's link
+        if data.get('product_gcs_path') and stripe_api_key and storage_client is not None:
+            try:
+                record_payment_link(storage_client, context['payment_link'], data['product_gcs_path'],
+                                    context['niche_topic'], gcs_url, run_id)
+            except Exception as e:
+                print(f"Fulfillment record failed: {e}")
+        
+        response = {
             "status": "success",
             "filename": filename,
             "gcs_url": gcs_url,
             "html_content": html_content[:500] + "..." if len(html_content) > 500 else html_content,
-            "message": "Sales page generated successfully"
-        })
+            "message": "Sales page generated successfully",
+            "prepared": prepared is not None,
+            "run_id": run_id
+        }
+        if len(variants) > 1:
+            response["variants"] = variants
+            response["variant_manifest"] = variant_manifest
+        return jsonify(response)
         
     except Exception as e:
         print(f"Sales page generation failed: {e}")
@@ -809,10 +1172,48 @@ def generate_sales_page():
             "status": "failed"
         }), 500
 
+@app.route('/payment-links', methods=['POST'])
+def create_payment_links():
+    """
+    Create payment links for a batch of opportunities concurrently.
+    Body: {"items": [{"opportunity": {...}, "price": 47, "slug": "..."}, ...]}
+    Each link is keyed on its page slug; items without one get a fresh slug,
+    returned so a retry can pass it back and get the same link.
+    """
+    try:
+        data = request.get_json()
+        if not data or not data.get('items'):
+            return jsonify({"error": "No items provided"}), 400
+        if not stripe_api_key:
+            return jsonify({"error": "Stripe is not configured", "status": "failed"}), 503
+        
+        opportunities = [Opportunity.from_dict(item.get('opportunity', {})) for item in data['items']]
+        prices = [tier_for(int(item.get('price', 27))) for item in data['items']]
+        slugs = [item.get('slug') or unique_name(opp.slug) for opp, item in zip(opportunities, data['items'])]
+        urls = stripe_catalog.create_payment_links(
+            [(opp.niche_topic, slug, price) for opp, slug, price in zip(opportunities, slugs, prices)])
+        
+        return jsonify({
+            "status": "success" if all(urls) else "partial",
+            "links": [
+                {"niche_topic": opp.niche_topic, "slug": slug, "price": price, "payment_link": url}
+                for opp, slug, price, url in zip(opportunities, slugs, prices, urls)
+            ]
+        })
+        
+    except Exception as e:
+        print(f"Payment link batch failed: {e}")
+        return jsonify({
+            "error": str(e),
+            "status": "failed"
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "anip-sales-page-generator"})
+    return jsonify({"status": "healthy", "service": "anip-sales-page-generator", "stripe": stripe_catalog.stats,
+                    "llm": router.snapshot(), "breakers": breaker_states(),
+                    "admission": admission.snapshot()})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
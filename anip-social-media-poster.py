@@ -8,12 +8,31 @@ import os
 import json
 import base64
 import requests
+import time
 from datetime import datetime
 from flask import Flask, request, jsonify
 from google.cloud import storage
 import google.generativeai as genai
+import anipe_admission
+import anipe_cassette
+import anipe_json
+from anipe_keys import artifact_key, clean_run_id
+from anipe_llm import expect_json, router
+from anipe_resilience import breaker_states, get_breaker
+from anipe_models import Opportunity
+from anipe_prompts import compile_prompt, log_response
+from anipe_scheduler import PostScheduler, expand_calendar, rate_limit_headers
 
 app = Flask(__name__)
+anipe_json.init_app(app)
+# Per-endpoint concurrency and queue limits; bulk callers send X-ANIPE-Priority: bulk
+admission = anipe_admission.init_app(app, {
+    "promote_product": {"concurrency": 4, "queue": 6, "queue_timeout": 30.0},
+    "schedule_posts": {"concurrency": 2, "queue": 2, "queue_timeout": 10.0},
+    "dispatch_posts": {"concurrency": 1, "queue": 0, "default_priority": "bulk"},
+})
+# Record or replay outbound calls per ANIPE_CASSETTE_MODE
+anipe_cassette.init_app(app, "anip-social-media-poster")
 
 @app.route('/favicon.ico')
 def favicon():
@@ -37,14 +56,58 @@ GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "windsurf-anipe-data")
 TWITTER_BEARER_TOKEN = os.environ.get("TWITTER_BEARER_TOKEN")
 LINKEDIN_ACCESS_TOKEN = os.environ.get("LINKEDIN_ACCESS_TOKEN")
 
-def generate_social_media_content(product_data: dict, sales_page_url: str) -> dict:
+# Seconds to wait on a social API before treating the post as failed
+SOCIAL_API_TIMEOUT = 15
+
+BREAKERS = {"twitter": get_breaker("twitter"), "linkedin": get_breaker("linkedin")}
+
+
+def _post_raising_5xx(url: str, **kwargs):
+    """requests.post that raises on 5xx, so the breaker records the outage as its one outcome"""
+    response = requests.post(url, **kwargs)
+    if response.status_code >= 500:
+        error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+        error.status_code = response.status_code
+        raise error
+    return response
+
+
+def _post_through_breaker(platform: str, url: str, headers: dict, data: dict):
+    """
+    POST to a social API through its circuit breaker. Returns (response, None),
+    or (None, result) with an error result when the breaker is open.
+    5xx responses count as failures; 4xx (including 429) mean the API is up.
+    """
+    breaker = BREAKERS[platform]
+    if not breaker.allow():
+        return None, {
+            "status": "error",
+            "platform": platform,
+            "message": f"{platform} circuit open, not calling the API",
+            "circuit_open": True,
+            "retry_after": breaker.retry_after(),
+        }
+    try:
+        response = breaker.observe(_post_raising_5xx, url, headers=headers, json=data, timeout=SOCIAL_API_TIMEOUT)
+    except requests.HTTPError as e:
+        if e.response is None:  # Replayed from a cassette, which keeps only the status
+            return None, {
+                "status": "error",
+                "platform": platform,
+                "message": f"{platform} API error: {e}",
+                "status_code": getattr(e, "status_code", None),
+            }
+        response = e.response
+    return response, None
+
+def generate_social_media_content(product_data: Opportunity, sales_page_url: str) -> dict:
     """
     Generate engaging social media posts for the product using AI
     """
-    niche_topic = product_data.get("niche_topic", "Business Intelligence")
-    target_audience = product_data.get("target_audience", "professionals")
+    niche_topic = product_data.niche_topic
+    target_audience = product_data.target_audience
     
-    prompt = f"""
+    prompt = compile_prompt("social", """
     Create engaging social media content to promote this AI-generated product:
 
     Product Topic: {niche_topic}
@@ -74,14 +137,14 @@ def generate_social_media_content(product_data: dict, sales_page_url: str) -> di
     Format as JSON with keys: twitter, linkedin, facebook
     Each should be ready to post directly.
     Include relevant hashtags for each platform.
-    """
+    """, niche_topic=niche_topic, target_audience=target_audience, sales_page_url=sales_page_url)
 
     try:
         if not api_key:
             raise Exception("No API key configured")
             
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
+        response = router.generate("social", prompt, validate=expect_json)
+        log_response("social", prompt, response)
         
         # Try to extract JSON from response
         content = response.text.strip()
@@ -126,7 +189,9 @@ def post_to_twitter(content: str) -> dict:
         }
         data = {"text": content}
         
-        response = requests.post(url, headers=headers, json=data)
+        response, unavailable = _post_through_breaker("twitter", url, headers, data)
+        if unavailable:
+            return unavailable
         
         if response.status_code == 201:
             tweet_data = response.json()
@@ -134,13 +199,17 @@ def post_to_twitter(content: str) -> dict:
                 "status": "success",
                 "platform": "twitter",
                 "post_id": tweet_data.get("data", {}).get("id"),
-                "message": "Posted to Twitter successfully"
+                "message": "Posted to Twitter successfully",
+                "status_code": response.status_code,
+                "rate_limit": rate_limit_headers(response.headers)
             }
         else:
             return {
                 "status": "error",
                 "platform": "twitter",
-                "message": f"Twitter API error: {response.status_code} - {response.text}"
+                "message": f"Twitter API error: {response.status_code} - {response.text}",
+                "status_code": response.status_code,
+                "rate_limit": rate_limit_headers(response.headers)
             }
             
     except Exception as e:
@@ -182,20 +251,26 @@ def post_to_linkedin(content: str) -> dict:
             }
         }
         
-        response = requests.post(url, headers=headers, json=data)
+        response, unavailable = _post_through_breaker("linkedin", url, headers, data)
+        if unavailable:
+            return unavailable
         
         if response.status_code == 201:
             return {
                 "status": "success",
                 "platform": "linkedin",
                 "post_id": response.headers.get("x-linkedin-id"),
-                "message": "Posted to LinkedIn successfully"
+                "message": "Posted to LinkedIn successfully",
+                "status_code": response.status_code,
+                "rate_limit": rate_limit_headers(response.headers)
             }
         else:
             return {
                 "status": "error",
                 "platform": "linkedin",
-                "message": f"LinkedIn API error: {response.status_code} - {response.text}"
+                "message": f"LinkedIn API error: {response.status_code} - {response.text}",
+                "status_code": response.status_code,
+                "rate_limit": rate_limit_headers(response.headers)
             }
             
     except Exception as e:
@@ -205,6 +280,18 @@ def post_to_linkedin(content: str) -> dict:
             "message": f"Error posting to LinkedIn: {e}"
         }
 
+# Platforms the scheduler can post to, and the persistent post queue.
+# /promote sends due posts itself (recorded in its own cassette); queued posts go out
+# on the scheduler thread or through /dispatch, outside any request, so each records its own
+POSTERS = {"twitter": post_to_twitter, "linkedin": post_to_linkedin}
+SENDERS = {platform: anipe_cassette.recorded("anip-social-media-poster", poster, "scheduled-posts")
+           for platform, poster in POSTERS.items()}
+post_scheduler = PostScheduler(SENDERS)
+post_scheduler.start()
+
+# Upper bound on how long one /dispatch call keeps sending due posts (seconds)
+DISPATCH_BUDGET = 60.0
+
 @app.route('/promote', methods=['POST'])
 def promote_product():
     """
@@ -216,30 +303,35 @@ def promote_product():
         if not data:
             return jsonify({"status": "error", "message": "No data provided"}), 400
         
-        product_data = data.get('product_data', {})
+        product_data = Opportunity.from_dict(data.get('product_data', {}))
         sales_page_url = data.get('sales_page_url')
         
         if not sales_page_url:
             return jsonify({"status": "error", "message": "Sales page URL required"}), 400
         
-        print(f"Promoting product: {product_data.get('niche_topic', 'Unknown')}")
+        print(f"Promoting product: {product_data.niche_topic}")
         
         # Generate social media content
         content_result = generate_social_media_content(product_data, sales_page_url)
         social_content = content_result.get('content', {})
         
-        # Post to each platform
+        # Post to each platform now, unless its rate limit says to wait or the caller
+        # asked for a later time; only those posts are left to the scheduler
         results = []
-        
-        # Twitter
-        if social_content.get('twitter'):
-            twitter_result = post_to_twitter(social_content['twitter'])
-            results.append(twitter_result)
-        
-        # LinkedIn  
-        if social_content.get('linkedin'):
-            linkedin_result = post_to_linkedin(social_content['linkedin'])
-            results.append(linkedin_result)
+        due_at = data.get('post_at')  # epoch seconds, default now
+        source = f"promote:{product_data.slug}"
+        for platform in SENDERS:
+            if not social_content.get(platform):
+                continue
+            if due_at and float(due_at) > time.time():
+                post_id, result = post_scheduler.schedule(platform, social_content[platform], due_at,
+                                                          priority=1, source=source), None
+            else:
+                post_id, result = post_scheduler.post_now(platform, social_content[platform], priority=1,
+                                                          source=source, sender=POSTERS[platform])
+            if result is None:
+                result = {"status": "scheduled", "platform": platform, "message": f"Queued for {platform}"}
+            results.append({**result, "scheduled_post_id": post_id})
         
         # Facebook posting would require similar implementation
         # For now, we'll just log the content
@@ -252,24 +344,25 @@ def promote_product():
             })
         
         # Save promotion record to GCS
-        niche_topic = product_data.get('niche_topic', 'unknown')
-        safe_niche = niche_topic.replace(' ', '_').replace('/', '-')
         promotion_record = {
             "timestamp": datetime.now().isoformat(),
-            "product_data": product_data,
+            "product_data": product_data.to_dict(),
             "sales_page_url": sales_page_url,
             "generated_content": social_content,
             "posting_results": results,
             "debug_info": content_result.get('debug_info')
         }
         
-        record_blob_name = f"promotions/{safe_niche}_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+        record_blob_name = artifact_key("promotions", product_data.slug, "json")
         record_blob = storage_client.bucket(GCS_BUCKET_NAME).blob(record_blob_name)
-        record_blob.upload_from_string(json.dumps(promotion_record, indent=2), content_type="application/json")
+        run_id = data.get('run_id') or (data.get('product_data') or {}).get('run_id')
+        if run_id:
+            record_blob.metadata = {"run_id": clean_run_id(run_id)}
+        anipe_json.upload_json(record_blob, promotion_record)
         
         return jsonify({
             "status": "success",
-            "message": "Social media promotion completed",
+            "message": "Social media promotion sent",
             "generated_content": social_content,
             "posting_results": results,
             "promotion_record": f"gs://{GCS_BUCKET_NAME}/{record_blob_name}"
@@ -279,10 +372,67 @@ def promote_product():
         print(f"Error in promote_product: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/schedule', methods=['POST'])
+def schedule_posts():
+    """
+    Queue posts for later. Accepts explicit posts
+    ({"posts": [{"platform", "content", "due_at", "priority"}]}) or a
+    ContentAutomator calendar ({"calendar": [...], "start_date": "YYYY-MM-DD", "timezone": "UTC"}).
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"status": "error", "message": "No data provided"}), 400
+        
+        posts = list(data.get('posts', []))
+        if data.get('calendar'):
+            posts.extend(expand_calendar(data['calendar'], data.get('start_date'),
+                                         data.get('timezone', 'UTC'), platforms=list(SENDERS)))
+        if not posts:
+            return jsonify({"status": "error", "message": "No posts or calendar provided"}), 400
+        
+        post_ids = post_scheduler.schedule_many(posts)
+        return jsonify({
+            "status": "success",
+            "scheduled": len(post_ids),
+            "post_ids": post_ids
+        }), 200
+        
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid post: {e}"}), 400
+    except Exception as e:
+        print(f"Error in schedule_posts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/schedule', methods=['GET'])
+def list_scheduled_posts():
+    """List queued posts (or ?status=posted|failed|skipped) with scheduler stats"""
+    status = request.args.get('status', 'pending')
+    limit = min(int(request.args.get('limit', 100)), 1000)
+    return jsonify({
+        "status": "success",
+        "posts": post_scheduler.list_posts(status, limit),
+        "scheduler": post_scheduler.stats()
+    }), 200
+
+@app.route('/dispatch', methods=['POST'])
+def dispatch_posts():
+    """Send queued posts that have come due (run from Cloud Scheduler)"""
+    started = time.monotonic()
+    sent = 0
+    while time.monotonic() - started < DISPATCH_BUDGET:
+        batch = post_scheduler.run_once()
+        if not batch:
+            break
+        sent += batch
+    return jsonify({"status": "success", "sent": sent, "scheduler": post_scheduler.stats()}), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Cloud Run."""
-    return jsonify({"status": "healthy", "service": "anip-social-media-poster"}), 200
+    return jsonify({"status": "healthy", "service": "anip-social-media-poster",
+                    "scheduler": post_scheduler.stats(), "llm": router.snapshot(),
+                    "breakers": breaker_states(), "admission": admission.snapshot()}), 200
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+ANIPE Admission Control
+Per-endpoint concurrency limits and bounded queues for the Flask services,
+with interactive and bulk priority lanes and fast 429/503 + Retry-After
+rejections, so admitted requests keep a stable latency under overload
+"""
+
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+
+INTERACTIVE, BULK = "interactive", "bulk"
+PRIORITY_RANK = {INTERACTIVE: 0, BULK: 1}
+
+# Callers pick their lane with this header; pipeline runs are interactive,
+# backfills and speculative work should send "bulk"
+PRIORITY_HEADER = "X-ANIPE-Priority"
+
+DEFAULT_ADMISSION_SETTINGS = {
+    "concurrency": 4,              # Requests executing at once
+    "queue": 8,                    # Requests waiting for a slot; beyond this they are rejected
+    "queue_timeout": 30.0,         # Longest a request waits for a slot
+    "bulk_share": 0.5,             # Fraction of slots and queue bulk requests may hold
+    "default_priority": INTERACTIVE,
+}
+
+# Service time estimate for Retry-After and expected-wait shedding, weight of the newest request
+SERVICE_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER = 120
+
+
+class Rejected(Exception):
+    """Why a request wasn't admitted: HTTP status (429 or 503), reason and Retry-After seconds"""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "admitted", "evicted", "cancelled")
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.admitted = False
+        self.evicted = False
+        self.cancelled = False
+
+
+class EndpointGate:
+    """
+    A counting semaphore with a priority queue. Interactive requests are
+    always dequeued first, bulk requests may only hold `bulk_share` of the
+    slots and queue, and a full queue makes room for an interactive request
+    by evicting the most recently queued bulk one. A request that would wait
+    longer than `queue_timeout` is rejected on arrival instead of queueing.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue: int, queue_timeout: float,
+                 bulk_share: float, default_priority: str = INTERACTIVE):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.queue_limit = max(0, int(queue))
+        self.queue_timeout = queue_timeout
+        self.default_priority = default_priority if default_priority in PRIORITY_RANK else INTERACTIVE
+        self.bulk_concurrency = max(1, int(self.concurrency * bulk_share))
+        self.bulk_queue_limit = int(self.queue_limit * bulk_share)
+
+        self.active = {INTERACTIVE: 0, BULK: 0}
+        self.queued = {INTERACTIVE: 0, BULK: 0}
+        self.heap = []  # (rank, sequence, waiter)
+        self.sequence = itertools.count()
+        self.service_time = None
+        self.cond = threading.Condition()
+        self.stats = {"admitted": 0, "queued": 0, "rejected_429": 0, "rejected_503": 0,
+                      "evicted": 0, "timed_out": 0, "wait_seconds": 0.0}
+
+    def _can_run(self, priority: str) -> bool:
+        if sum(self.active.values()) >= self.concurrency:
+            return False
+        return priority == INTERACTIVE or self.active[BULK] < self.bulk_concurrency
+
+    def _retry_after(self, ahead: int = None) -> int:
+        if ahead is None:
+            ahead = sum(self.active.values()) + sum(self.queued.values())
+        estimate = (self.service_time or 1.0) * max(1, ahead) / self.concurrency
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(estimate)))
+
+    def _reject(self, status: int, reason: str, ahead: int = None):
+        self.stats[f"rejected_{status}"] += 1
+        raise Rejected(status, reason, self._retry_after(ahead))
+
+    def _evict_bulk(self) -> bool:
+        newest = None
+        for rank, sequence, waiter in self.heap:
+            if waiter.priority == BULK and not waiter.cancelled and (newest is None or sequence > newest[0]):
+                newest = (sequence, waiter)
+        if newest is None:
+            return False
+        waiter = newest[1]
+        waiter.evicted = waiter.cancelled = True
+        self.queued[BULK] -= 1
+        self.stats["evicted"] += 1
+        self.cond.notify_all()
+        return True
+
+    def _dispatch(self):
+        """Hand free slots to the best waiters; caller holds the lock"""
+        while self.heap:
+            rank, sequence, waiter = self.heap[0]
+            if waiter.cancelled:
+                heapq.heappop(self.heap)
+                continue
+            if not self._can_run(waiter.priority):
+                return
+            heapq.heappop(self.heap)
+            self.queued[waiter.priority] -= 1
+            self.active[waiter.priority] += 1
+            waiter.admitted = True
+            self.cond.notify_all()
+
+    def acquire(self, priority: str = None) -> str:
+        """Block until admitted; returns the lane used, raises Rejected otherwise"""
+        priority = priority if priority in PRIORITY_RANK else self.default_priority
+        with self.cond:
+            rank = PRIORITY_RANK[priority]
+            ahead = sum(1 for r, _, w in self.heap if not w.cancelled and r <= rank)
+            if not ahead and self._can_run(priority):
+                self.active[priority] += 1
+                self.stats["admitted"] += 1
+                return priority
+
+            if priority == BULK and self.queued[BULK] >= self.bulk_queue_limit:
+                self._reject(429, "bulk queue full")
+            if sum(self.queued.values()) >= self.queue_limit:
+                if priority == BULK or not self._evict_bulk():
+                    self._reject(503, "queue full")
+            if self.service_time is not None:
+                expected = self.service_time * (ahead + 1) / self.concurrency
+                if expected > self.queue_timeout:
+                    self._reject(503, f"expected wait {expected:.0f}s exceeds {self.queue_timeout:.0f}s", ahead + 1)
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self.heap, (rank, next(self.sequence), waiter))
+            self.queued[priority] += 1
+            self.stats["queued"] += 1
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            while not waiter.admitted and not waiter.evicted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            self.stats["wait_seconds"] += time.monotonic() - started
+
+            if waiter.admitted:
+                self.stats["admitted"] += 1
+                return priority
+            if waiter.evicted:
+                self.stats["rejected_503"] += 1
+                raise Rejected(503, "pre-empted by interactive traffic", self._retry_after())
+            waiter.cancelled = True
+            self.queued[priority] -= 1
+            self.stats["timed_out"] += 1
+            self._reject(503, f"no slot within {self.queue_timeout:.0f}s")
+
+    def release(self, priority: str, seconds: float):
+        with self.cond:
+            self.active[priority] -= 1
+            if self.service_time is None:
+                self.service_time = seconds
+            else:
+                self.service_time += SERVICE_TIME_ALPHA * (seconds - self.service_time)
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            admitted = self.stats["admitted"]
+            return {
+                "concurrency": self.concurrency,
+                "queue_limit": self.queue_limit,
+                "active": dict(self.active),
+                "queued_now": dict(self.queued),
+                "service_seconds": round(self.service_time, 3) if self.service_time is not None else None,
+                **{key: value for key, value in self.stats.items() if key != "wait_seconds"},
+                "mean_wait_seconds": round(self.stats["wait_seconds"] / admitted, 3) if admitted else 0.0,
+            }
+
+
+def _settings(endpoint: str, overrides: dict) -> dict:
+    settings = dict(DEFAULT_ADMISSION_SETTINGS, **(overrides or {}))
+    for key, default in settings.items():
+        name = f"ADMISSION_{endpoint.upper()}_{key.upper()}"
+        value = os.environ.get(name)
+        if not value:
+            continue
+        if isinstance(default, str):
+            settings[key] = value
+            continue
+        try:
+            settings[key] = type(default)(float(value))
+        except ValueError:
+            print(f"Warning: invalid {name}={value!r}, using default")
+    return settings
+
+
+class AdmissionController:
+    """Gates the Flask endpoints it was given limits for; other endpoints (health checks) pass untouched"""
+
+    def __init__(self, limits: dict):
+        self.gates = {endpoint: EndpointGate(endpoint, **_settings(endpoint, overrides))
+                      for endpoint, overrides in limits.items()}
+
+    def before_request(self):
+        from flask import g, jsonify, request
+
+        gate = self.gates.get(request.endpoint)
+        if gate is None:
+            return None
+        priority = (request.headers.get(PRIORITY_HEADER) or "").strip().lower() or None
+        try:
+            g.admission = (gate, gate.acquire(priority), time.monotonic())
+        except Rejected as e:
+            response = jsonify({"status": "error", "message": f"Service busy: {e.reason}",
+                                "retry_after": e.retry_after})
+            return response, e.status, {"Retry-After": str(e.retry_after)}
+        return None
+
+    def teardown_request(self, error=None):
+        from flask import g
+
+        admission = g.pop("admission", None)
+        if admission is not None:
+            gate, priority, started = admission
+            gate.release(priority, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        return {endpoint: gate.snapshot() for endpoint, gate in self.gates.items()}
+
+
+def init_app(app, limits: dict) -> AdmissionController:
+    """
+    Install admission control on a Flask app. `limits` maps endpoint names to
+    DEFAULT_ADMISSION_SETTINGS overrides; any setting can also be set as
+    ADMISSION_<ENDPOINT>_<SETTING>, e.g. ADMISSION_GENERATE_PRODUCT_CONCURRENCY=3.
+    Queued requests hold a worker thread, so run gunicorn with --threads.
+    """
+    controller = AdmissionController(limits)
+    # First in line, so rejected requests skip the other hooks' work
+    app.before_request_funcs.setdefault(None, []).insert(0, controller.before_request)
+    app.teardown_request(controller.teardown_request)
+    app.extensions["anipe_admission"] = controller
+    return controller
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+ANIPE Artifact Archives
+Compacts small JSON artifacts into daily, compressed JSONL archives with a footer index
+"""
+
+import re
+import gzip
+import json
+import struct
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from anipe_json import read_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional, JSONL needs only the stdlib
+    pa = pq = None
+
+# Source prefixes rolled up by the compactor, by archive kind
+ARCHIVE_KINDS = {
+    "opportunities": "opportunities/",
+    "results": "results/",
+    "promotions": "promotions/",
+}
+
+ARCHIVE_PREFIX = "archives"
+
+# Records are compressed in blocks of about this many raw bytes, so one
+# record can be read without inflating the whole day
+BLOCK_SIZE = 256 * 1024
+
+# Archive layout: gzip members (one per block), then the JSON footer and a
+# trailer, each carried in the FEXTRA field of empty gzip members. The whole
+# file is a valid multi-member gzip stream, so zcat prints just the records.
+# The trailer member is always TRAILER_MEMBER_SIZE bytes and holds MAGIC and
+# the byte length of the footer members as a little-endian uint64.
+MAGIC = b"ANIPEIX2"
+TRAILER = struct.Struct("<8sQ")
+FOOTER_SUBFIELD = b"AF"
+TRAILER_SUBFIELD = b"AT"
+# Largest FEXTRA payload: XLEN is 16 bits and includes the 4-byte subfield header
+FOOTER_CHUNK = 65535 - 4
+
+# Fixed gzip header with FEXTRA set, mtime 0 and OS unknown; an empty deflate
+# stream, then CRC32 and ISIZE of no data
+_EMPTY_MEMBER_HEAD = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff"
+_EMPTY_MEMBER_TAIL = b"\x03\x00" + struct.pack("<II", 0, 0)
+TRAILER_MEMBER_SIZE = len(_EMPTY_MEMBER_HEAD) + 2 + 4 + TRAILER.size + len(_EMPTY_MEMBER_TAIL)
+
+# Archives written before the footer moved into gzip members end with the bare trailer
+LEGACY_MAGIC = b"ANIPEIX1"
+
+_TIMESTAMP_RE = re.compile(r"(\d{8})_?(\d{6})")
+
+
+def artifact_day(blob) -> str:
+    """Day an artifact belongs to: the timestamp in its name, else its creation time (UTC)"""
+    match = _TIMESTAMP_RE.search(blob.name)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    created = blob.time_created or datetime.now(timezone.utc)
+    return created.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+
+def partition_prefix(kind: str, day: str) -> str:
+    return f"{ARCHIVE_PREFIX}/{kind}/dt={day}/"
+
+
+def _extra_member(subfield_id: bytes, payload: bytes) -> bytes:
+    """An empty gzip member carrying payload in one FEXTRA subfield"""
+    extra = subfield_id + struct.pack("<H", len(payload)) + payload
+    return _EMPTY_MEMBER_HEAD + struct.pack("<H", len(extra)) + extra + _EMPTY_MEMBER_TAIL
+
+
+def _read_extra_members(data: bytes, subfield_id: bytes) -> bytes:
+    """Concatenate the subfield_id payloads of a run of empty FEXTRA members"""
+    out = bytearray()
+    position = 0
+    while position < len(data):
+        if data[position:position + len(_EMPTY_MEMBER_HEAD)] != _EMPTY_MEMBER_HEAD:
+            raise ValueError("Corrupt ANIPE archive footer")
+        position += len(_EMPTY_MEMBER_HEAD)
+        (xlen,) = struct.unpack_from("<H", data, position)
+        position += 2
+        end = position + xlen
+        while position < end:
+            sid = data[position:position + 2]
+            (length,) = struct.unpack_from("<H", data, position + 2)
+            if sid == subfield_id:
+                out += data[position + 4:position + 4 + length]
+            position += 4 + length
+        position = end + len(_EMPTY_MEMBER_TAIL)
+    return bytes(out)
+
+
+def _footer_span(tail: bytes) -> tuple:
+    """
+    From the last TRAILER_MEMBER_SIZE (or more) bytes of an archive, return
+    (footer_length, trailer_length): the footer's bytes and everything after
+    them. The footer is raw JSON in legacy archives, gzip members otherwise.
+    """
+    magic, footer_length = TRAILER.unpack(tail[-TRAILER.size:])
+    if magic == LEGACY_MAGIC:
+        return footer_length, TRAILER.size
+    trailer = _read_extra_members(tail[-TRAILER_MEMBER_SIZE:], TRAILER_SUBFIELD) if len(tail) >= TRAILER_MEMBER_SIZE else b""
+    if len(trailer) != TRAILER.size:
+        raise ValueError("Not an ANIPE archive")
+    magic, footer_length = TRAILER.unpack(trailer)
+    if magic != MAGIC:
+        raise ValueError("Not an ANIPE archive")
+    return footer_length, TRAILER_MEMBER_SIZE
+
+
+def _decode_footer(footer: bytes, trailer_length: int) -> dict:
+    if trailer_length != TRAILER.size:
+        footer = _read_extra_members(footer, FOOTER_SUBFIELD)
+    return json.loads(footer)
+
+
+def build_archive(records: list) -> bytes:
+    """
+    Serialize records (dicts with "name" and "data") into an archive:
+    compact JSON lines gzip-compressed in blocks, then a footer that maps
+    every record name to its block and line, stored in empty gzip members.
+    """
+    body = bytearray()
+    blocks = []
+    index = {}
+    lines = []
+    raw_size = 0
+
+    def flush():
+        nonlocal lines, raw_size
+        if not lines:
+            return
+        member = gzip.compress(b"".join(lines), compresslevel=9, mtime=0)
+        blocks.append({"offset": len(body), "length": len(member), "records": len(lines)})
+        body.extend(member)
+        lines, raw_size = [], 0
+
+    for record in records:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+        index[record["name"]] = [len(blocks), len(lines)]
+        lines.append(line)
+        raw_size += len(line)
+        if raw_size >= BLOCK_SIZE:
+            flush()
+    flush()
+
+    footer = json.dumps({
+        "version": 2,
+        "records": len(records),
+        "data_length": len(body),
+        "blocks": blocks,
+        "index": index,
+    }, separators=(",", ":")).encode("utf-8")
+    footer_members = b"".join(_extra_member(FOOTER_SUBFIELD, footer[start:start + FOOTER_CHUNK])
+                              for start in range(0, len(footer), FOOTER_CHUNK))
+    trailer_member = _extra_member(TRAILER_SUBFIELD, TRAILER.pack(MAGIC, len(footer_members)))
+    return bytes(body) + footer_members + trailer_member
+
+
+def parse_footer(data: bytes) -> dict:
+    """Read the footer from a whole archive (or any suffix of it that includes the footer)"""
+    footer_length, trailer_length = _footer_span(data[-TRAILER_MEMBER_SIZE:])
+    end = len(data) - trailer_length
+    return _decode_footer(data[end - footer_length:end], trailer_length)
+
+
+def parse_archive(data: bytes) -> list:
+    """Decode every record of an archive fetched in one read"""
+    footer = parse_footer(data)
+    # Concatenated gzip members decompress as a single stream
+    raw = gzip.decompress(data[:footer["data_length"]])
+    return [json.loads(line) for line in raw.splitlines() if line]
+
+
+def _next_part_name(bucket, kind: str, day: str, extension: str) -> str:
+    existing = list(bucket.list_blobs(prefix=partition_prefix(kind, day)))
+    return f"{partition_prefix(kind, day)}part-{len(existing):05d}.{extension}"
+
+
+def _read_footer(blob) -> dict:
+    """Footer of a JSONL archive blob with two ranged reads (trailer, then footer)"""
+    size = blob.size
+    tail = blob.download_as_bytes(start=max(0, size - TRAILER_MEMBER_SIZE), end=size - 1)
+    try:
+        footer_length, trailer_length = _footer_span(tail)
+    except (ValueError, struct.error):
+        raise ValueError(f"{blob.name} is not an ANIPE archive")
+    footer_end = size - trailer_length
+    return _decode_footer(blob.download_as_bytes(start=footer_end - footer_length, end=footer_end - 1),
+                          trailer_length)
+
+
+def archived_names(bucket, kind: str, day: str) -> set:
+    """Source object names already held by a day's archive parts"""
+    names = set()
+    for blob in bucket.list_blobs(prefix=partition_prefix(kind, day)):
+        if blob.name.endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError("Reading Parquet archives needs pyarrow installed")
+            names.update(pq.read_table(pa.BufferReader(blob.download_as_bytes()), columns=["name"])
+                         .column("name").to_pylist())
+        else:
+            names.update(_read_footer(blob)["index"])
+    return names
+
+
+def _delete_originals(blobs: list):
+    for blob in blobs:
+        try:
+            blob.delete()
+        except NotFound:
+            pass
+        except Exception as e:
+            # Still listed next run, and deleted then without being archived again
+            print(f"Failed to delete compacted artifact {blob.name}: {e}")
+
+
+def _write_parquet(records: list) -> bytes:
+    table = pa.table({
+        "name": [record["name"] for record in records],
+        "time_created": [record["time_created"] for record in records],
+        "data": [json.dumps(record["data"], separators=(",", ":")) for record in records],
+    })
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+
+def compact_prefix(bucket, kind: str, before_day: str = None, delete: bool = True,
+                   file_format: str = "jsonl") -> dict:
+    """
+    Roll every small JSON object under the kind's prefix into one archive part
+    per day. Only days before `before_day` (default today, UTC) are compacted,
+    so the current day keeps accumulating. Parts are append-only: compacting a
+    day again adds a new part. Originals are deleted only once a committed part
+    holds them; originals left over from an interrupted delete are found in the
+    existing parts by name and deleted without being archived twice.
+    Returns {day: {"archive": name, "records": n}}.
+    """
+    if file_format == "parquet" and pa is None:
+        raise RuntimeError("Parquet output needs pyarrow installed")
+    before_day = before_day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    by_day = {}
+    for blob in bucket.list_blobs(prefix=ARCHIVE_KINDS[kind]):
+        if not blob.name.endswith(".json"):
+            continue
+        day = artifact_day(blob)
+        if day < before_day:
+            by_day.setdefault(day, []).append(blob)
+
+    summary = {}
+    for day, blobs in sorted(by_day.items()):
+        covered = archived_names(bucket, kind, day)
+        if covered:
+            done = [blob for blob in blobs if blob.name in covered]
+            blobs = [blob for blob in blobs if blob.name not in covered]
+            if done and delete:
+                print(f"Deleting {len(done)} {kind} artifacts for {day} already archived")
+                _delete_originals(done)
+
+        records = []
+        archived = []
+        for blob in sorted(blobs, key=lambda b: b.name):
+            try:
+                data = read_json(blob)
+            except NotFound:
+                # Deleted since the listing (by another compaction, say)
+                continue
+            except ValueError as e:
+                # Left in place so nothing is lost
+                print(f"Skipping unreadable artifact {blob.name}: {e}")
+                continue
+            created = blob.time_created.isoformat() if blob.time_created else None
+            records.append({"name": blob.name, "time_created": created, "data": data})
+            archived.append(blob)
+        if not records:
+            continue
+
+        if file_format == "parquet":
+            payload, extension, content_type = _write_parquet(records), "parquet", "application/vnd.apache.parquet"
+        else:
+            payload, extension, content_type = build_archive(records), "jsonl.gz", "application/gzip"
+
+        # if_generation_match=0 keeps parts append-only even if two compactions race
+        for _ in range(3):
+            archive_name = _next_part_name(bucket, kind, day, extension)
+            try:
+                archive_blob = bucket.blob(archive_name)
+                archive_blob.metadata = {"records": str(len(records)), "format": file_format}
+                archive_blob.upload_from_string(payload, content_type=content_type, if_generation_match=0)
+                break
+            except PreconditionFailed:
+                continue
+        else:
+            raise RuntimeError(f"Could not claim an archive part for {kind} {day}")
+
+        # The part is committed, so its originals can go
+        if delete:
+            _delete_originals(archived)
+
+        summary[day] = {"archive": archive_name, "records": len(records), "bytes": len(payload)}
+        print(f"Compacted {len(records)} {kind} artifacts for {day} into {archive_name} ({len(payload)} bytes)")
+    return summary
+
+
+def read_day(bucket, kind: str, day: str) -> list:
+    """Return every archived record of a kind for one day: one GET per part (usually one)"""
+    records = []
+    for blob in sorted(bucket.list_blobs(prefix=partition_prefix(kind, day)), key=lambda b: b.name):
+        if blob.name.endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError("Reading Parquet archives needs pyarrow installed")
+            table = pq.read_table(pa.BufferReader(blob.download_as_bytes()))
+            records.extend({"name": name, "time_created": created, "data": json.loads(data)}
+                           for name, created, data in zip(*(table.column(c).to_pylist() for c in ("name", "time_created", "data"))))
+        else:
+            records.extend(parse_archive(blob.download_as_bytes()))
+    return records
+
+
+def read_record(bucket, archive_name: str, name: str):
+    """
+    Fetch one record from a JSONL archive with ranged reads: the trailer,
+    the footer, then just the block holding the record. Returns None if absent.
+    """
+    blob = bucket.get_blob(archive_name)
+    footer = _read_footer(blob)
+
+    location = footer["index"].get(name)
+    if location is None:
+        return None
+    block = footer["blocks"][location[0]]
+    member = blob.download_as_bytes(start=block["offset"], end=block["offset"] + block["length"] - 1)
+    return json.loads(gzip.decompress(member).splitlines()[location[1]])
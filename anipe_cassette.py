@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+"""
+ANIPE Cassettes
+Record the outbound Gemini, Stripe, GCS and social API calls a request makes,
+with their timings, into a compact per-run cassette, and replay them offline
+with the original latency profile or none at all
+
+Set ANIPE_CASSETTE_MODE=record on a service to capture every request into
+ANIPE_CASSETTE_DIR (a local directory or gs://bucket/prefix), then re-drive a
+run on a laptop:
+
+    python anipe_cassette.py list /tmp/anipe-cassettes
+    python anipe_cassette.py replay anip-product-generator.py CASSETTE [--latency zero] [--profile]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import uuid
+import base64
+import hashlib
+import argparse
+import importlib
+import importlib.util
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from requests.structures import CaseInsensitiveDict
+except ImportError:  # Only needed to replay HTTP responses
+    CaseInsensitiveDict = None
+
+OFF, RECORD, REPLAY = "off", "record", "replay"
+
+MODE = os.environ.get("ANIPE_CASSETTE_MODE", OFF).lower()
+CASSETTE_DIR = os.environ.get("ANIPE_CASSETTE_DIR", "/tmp/anipe-cassettes")
+
+# "original" sleeps for each call's recorded duration, "zero" returns at once,
+# a number scales the recorded durations (0.5 = twice as fast)
+REPLAY_LATENCY = os.environ.get("ANIPE_REPLAY_LATENCY", "original")
+
+# Replay mode: the recorded request to serve, otherwise the latest cassette for the request's run
+CASSETTE_HEADER = "X-ANIPE-Cassette"
+RUN_ID_HEADER = "X-ANIPE-Run-Id"
+
+# Credentials only say whether they were set; their values are never written
+RECORDED_ENV = ("GEMINI_API_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET",
+                "TWITTER_BEARER_TOKEN", "LINKEDIN_ACCESS_TOKEN", "SMTP_HOST")
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie", "proxy-authorization", "stripe-signature",
+                    "x-api-key", "x-goog-api-key", "api-key"}
+
+# Buyer details in request bodies and recorded results are replaced by a digest of
+# the value, so replays take the same branches without the cassette holding PII:
+# any field named here, and every field inside one of the PII_OBJECTS
+PII_FIELDS = {"email", "customer_email", "receipt_email", "to_email", "phone"}
+PII_OBJECTS = {"customer_details", "billing_details", "shipping_details", "shipping", "address"}
+
+FORMAT_VERSION = 1
+
+_session = contextvars.ContextVar("anipe_cassette_session", default=None)
+
+# Cassettes the offline replayer has already loaded, by path
+_preloaded = {}
+
+# Cassettes are written off the request path
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cassette-writer")
+
+
+class CassetteMiss(RuntimeError):
+    """Replay reached a call the cassette has no recording for"""
+
+
+class ReplayedError(RuntimeError):
+    """Stands in for a recorded exception whose class can't be rebuilt offline"""
+
+
+def replay_scale(latency: str = None) -> float:
+    latency = (latency or REPLAY_LATENCY).lower()
+    if latency == "zero":
+        return 0.0
+    if latency == "original":
+        return 1.0
+    try:
+        return max(0.0, float(latency))
+    except ValueError:
+        print(f"Warning: invalid ANIPE_REPLAY_LATENCY={latency!r}, using original")
+        return 1.0
+
+
+# --- Encoding ---
+
+def _describe(value):
+    """JSON fallback for call arguments: blobs and files by name, bytes by digest"""
+    if isinstance(value, (bytes, bytearray)):
+        return hashlib.sha256(value).hexdigest()
+    return getattr(value, "name", None) or type(value).__name__
+
+
+def _pseudonym(value: str) -> str:
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+    return f"{digest}@redacted.invalid" if "@" in value else f"redacted-{digest}"
+
+
+def scrub(value, field: str = None, inside: bool = False):
+    """Copy of a JSON value with PII_FIELDS (and everything in PII_OBJECTS) pseudonymised"""
+    if isinstance(value, dict):
+        return {k: scrub(v, k, inside or k in PII_OBJECTS) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(v, field, inside) for v in value]
+    if isinstance(value, str) and value and (inside or field in PII_FIELDS):
+        return _pseudonym(value)
+    return value
+
+
+def _redact_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in REDACTED_HEADERS}
+
+
+def call_key(args: tuple, kwargs: dict) -> str:
+    """Fingerprint of a call's arguments, matched first when replaying"""
+    text = json.dumps([args, kwargs], sort_keys=True, default=_describe)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _operation(fn) -> str:
+    # The method name only, so a cassette recorded against a test double still replays
+    return getattr(fn, "__name__", None) or type(fn).__name__
+
+
+def encode_result(value) -> dict:
+    """Turn a dependency's return value into JSON, keeping what callers read from it"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {"value": value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"bytes": base64.b64encode(value).decode("ascii")}
+    if type(value).__module__.startswith("stripe"):
+        # to_dict_recursive before stripe 8, to_dict (recursive) after
+        to_dict = getattr(value, "to_dict_recursive", None) or value.to_dict
+        return {"stripe": scrub(to_dict())}
+    if hasattr(value, "status_code") and hasattr(value, "content"):
+        return {"http": {"status": value.status_code, "headers": _redact_headers(value.headers),
+                         "body": base64.b64encode(value.content or b"").decode("ascii")}}
+    if hasattr(value, "usage_metadata"):
+        usage = value.usage_metadata
+        fields = ("prompt_token_count", "candidates_token_count", "cached_content_token_count", "total_token_count")
+        try:
+            text, text_error = value.text, None
+        except Exception as e:  # Blocked or empty candidates raise on .text
+            text, text_error = None, str(e)
+        return {"gemini": {"text": text, "text_error": text_error,
+                           "usage": {f: getattr(usage, f, None) for f in fields} if usage else None}}
+    if isinstance(value, (dict, list, tuple)):
+        try:
+            return {"value": scrub(json.loads(json.dumps(value)))}
+        except (TypeError, ValueError):
+            pass
+    if hasattr(value, "bucket") and hasattr(value, "name"):
+        return {"blob": value.name}
+    return {"unrecorded": type(value).__name__}
+
+
+class ReplayedHTTPResponse:
+    """The parts of requests.Response the services read"""
+
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status_code = status
+        self.headers = CaseInsensitiveDict(headers) if CaseInsensitiveDict else headers
+        self.content = body
+        self.ok = status < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ReplayedGeminiResponse:
+    def __init__(self, text: str, text_error: str, usage: dict):
+        self._text = text
+        self._text_error = text_error
+        self.usage_metadata = SimpleNamespace(**usage) if usage else None
+
+    @property
+    def text(self) -> str:
+        if self._text_error:
+            raise ValueError(self._text_error)
+        return self._text
+
+
+def decode_result(data: dict):
+    if "value" in data:
+        return data["value"]
+    if "bytes" in data:
+        return base64.b64decode(data["bytes"])
+    if "stripe" in data:
+        import stripe
+        return stripe.StripeObject.construct_from(data["stripe"], stripe.api_key)
+    if "http" in data:
+        http = data["http"]
+        return ReplayedHTTPResponse(http["status"], http["headers"], base64.b64decode(http["body"]))
+    if "gemini" in data:
+        gemini = data["gemini"]
+        return ReplayedGeminiResponse(gemini["text"], gemini["text_error"], gemini["usage"])
+    if "blob" in data:
+        return SimpleNamespace(name=data["blob"])
+    return None
+
+
+def encode_error(error: Exception) -> dict:
+    attrs = {}
+    for attr in ("http_status", "status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, (int, str)):
+            attrs[attr] = value
+    cls = type(error)
+    # google.api_core errors prefix str() with their code; keep the bare message
+    message = getattr(error, "message", None)
+    return {"type": f"{cls.__module__}.{cls.__qualname__}",
+            "message": message if isinstance(message, str) else str(error), "attrs": attrs}
+
+
+def decode_error(data: dict) -> Exception:
+    """Rebuild the recorded exception, so `except NotFound:` and friends take the same branch"""
+    module_name, _, class_name = data["type"].rpartition(".")
+    error = None
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            for args in ((data["message"],), (data["message"], None)):  # Stripe errors also take a param
+                try:
+                    error = cls(*args)
+                    break
+                except TypeError:
+                    continue
+    except Exception:
+        pass
+    if error is None:
+        error = ReplayedError(f"{data['type']}: {data['message']}")
+    for attr, value in data.get("attrs", {}).items():
+        try:
+            setattr(error, attr, value)
+        except Exception:
+            pass
+    return error
+
+
+# --- Cassettes ---
+
+class Cassette:
+    """
+    The calls one request (or background task) made, in the order they
+    started. Calls are matched on replay by dependency, operation and argument
+    fingerprint, falling back to recording order when arguments differ
+    (prompts with timestamps, temporary file names).
+    """
+
+    def __init__(self, header: dict, calls: list = None, footer: dict = None):
+        self.header = header
+        self.calls = calls if calls is not None else []
+        self.footer = footer or {}
+        self.started = time.monotonic()
+        self.cpu_started = time.thread_time()
+        self.mode = RECORD  # session() switches it for replays
+        self.scale = 1.0
+        self.used = set()
+        self.missed = []
+        self.lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.header['run_id']}/{self.header['service']}.{self.header['label']}.{self.header['id']}.jsonl.gz"
+
+    def start_call(self, dependency: str, operation: str, key: str) -> dict:
+        entry = {"dep": dependency, "op": operation, "key": key,
+                 "at": round(time.monotonic() - self.started, 4), "pending": True}
+        with self.lock:
+            self.calls.append(entry)
+        return entry
+
+    def next_call(self, dependency: str, operation: str, key: str) -> dict:
+        """The recording to replay for a call: same arguments first, then the next unused of its kind"""
+        with self.lock:
+            same_kind = [i for i, c in enumerate(self.calls) if c["dep"] == dependency and c["op"] == operation]
+            unused = [i for i in same_kind if i not in self.used]
+            match = next((i for i in unused if self.calls[i]["key"] == key), None)
+            if match is None and unused:
+                match = unused[0]
+            if match is None and same_kind:
+                match = same_kind[-1]  # More calls than recorded (an extra hedge): repeat the last
+            if match is None:
+                self.missed.append(f"{dependency}.{operation}")
+                raise CassetteMiss(f"No recorded {dependency} {operation} call in {self.name}")
+            self.used.add(match)
+            return self.calls[match]
+
+    def replay_report(self) -> dict:
+        return {"matched": len(self.used), "recorded": len(self.calls), "missed": self.missed,
+                "unused": [f"{c['dep']}.{c['op']}" for i, c in enumerate(self.calls) if i not in self.used]}
+
+    def finish(self, status: int = None):
+        self.footer = {"status": status,
+                       "duration": round(time.monotonic() - self.started, 4),
+                       "cpu_seconds": round(time.thread_time() - self.cpu_started, 4)}
+
+    def to_bytes(self) -> bytes:
+        now = time.monotonic() - self.started
+        lines = [dict(self.header, version=FORMAT_VERSION)]
+        with self.lock:
+            for call in self.calls:
+                call = dict(call)
+                if call.pop("pending", False):
+                    # Still running (a losing hedge): replays as a failure after the time it had taken
+                    call.pop("result", None)
+                    call.update(elapsed=round(now - call["at"], 4),
+                                error={"type": "builtins.TimeoutError", "attrs": {},
+                                       "message": "call unfinished when the request ended"})
+                lines.append(call)
+        lines.append({"footer": self.footer})
+        text = "\n".join(json.dumps(line, separators=(",", ":"), default=str) for line in lines)
+        return gzip.compress(text.encode("utf-8"), compresslevel=9, mtime=0)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Cassette":
+        lines = [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines() if line]
+        header, calls, footer = lines[0], lines[1:], {}
+        if calls and "footer" in calls[-1]:
+            footer = calls.pop()["footer"]
+        return cls(header, calls, footer)
+
+    def summary(self) -> dict:
+        by_dependency = {}
+        for call in self.calls:
+            dep = by_dependency.setdefault(call["dep"], {"calls": 0, "seconds": 0.0, "errors": 0})
+            dep["calls"] += 1
+            dep["seconds"] = round(dep["seconds"] + call.get("elapsed", 0.0), 3)
+            dep["errors"] += 1 if "error" in call else 0
+        return by_dependency
+
+
+def _is_gcs(path: str) -> bool:
+    return path.startswith("gs://")
+
+
+def _gcs_blob(path: str):
+    from google.cloud import storage
+
+    bucket_name, _, blob_name = path[len("gs://"):].partition("/")
+    return storage.Client().bucket(bucket_name).blob(blob_name)
+
+
+def write_bytes(path: str, data: bytes):
+    # Straight to the client: cassette writes are not themselves recorded or breakered
+    if _is_gcs(path):
+        _gcs_blob(path).upload_from_string(data, content_type="application/gzip")
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read_bytes(path: str) -> bytes:
+    if _is_gcs(path):
+        return _gcs_blob(path).download_as_bytes()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load(path: str) -> Cassette:
+    return Cassette.from_bytes(read_bytes(path))
+
+
+def list_cassettes(directory: str = CASSETTE_DIR, run_id: str = None) -> list:
+    """Cassette paths under a directory (optionally one run), oldest first"""
+    if _is_gcs(directory):
+        from google.cloud import storage
+
+        bucket_name, _, prefix = directory[len("gs://"):].partition("/")
+        prefix = "/".join(p for p in (prefix.rstrip("/"), run_id) if p)
+        blobs = storage.Client().list_blobs(bucket_name, prefix=prefix)
+        found = [(blob.time_created, f"gs://{bucket_name}/{blob.name}") for blob in blobs
+                 if blob.name.endswith(".jsonl.gz")]
+    else:
+        root = os.path.join(directory, run_id) if run_id else directory
+        found = []
+        for base, _, files in os.walk(root):
+            found.extend((os.path.getmtime(os.path.join(base, f)), os.path.join(base, f))
+                         for f in files if f.endswith(".jsonl.gz"))
+    return [path for _, path in sorted(found)]
+
+
+def save(cassette: Cassette, directory: str = CASSETTE_DIR):
+    path = f"{directory.rstrip('/')}/{cassette.name}"
+
+    def write():
+        try:
+            write_bytes(path, cassette.to_bytes())
+            print(f"Recorded cassette {path} ({len(cassette.calls)} calls)")
+        except Exception as e:
+            print(f"Saving cassette {path} failed: {e}")
+
+    _writer.submit(write)
+
+
+# --- Sessions ---
+
+@contextmanager
+def session(run_id: str, service: str, label: str, request: dict = None, task: dict = None,
+            cassette: Cassette = None):
+    """
+    Record (or, given a loaded cassette, replay) the dependency calls made
+    inside the block; recordings are saved when it exits. Outside
+    record/replay mode this does nothing.
+    """
+    if cassette is None and MODE != RECORD:
+        yield None
+        return
+    if cassette is None:
+        cassette = Cassette({
+            "id": uuid.uuid4().hex[:8], "run_id": run_id or "norun", "service": service, "label": label,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "request": request, "task": scrub(task),
+            "env": {name: bool(os.environ.get(name)) for name in RECORDED_ENV},
+        })
+        cassette.mode = RECORD
+    else:
+        cassette.mode = REPLAY
+        cassette.scale = replay_scale()
+        cassette.started = time.monotonic()
+        cassette.cpu_started = time.thread_time()
+    token = _session.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _session.reset(token)
+        if cassette.mode == RECORD:
+            if not cassette.footer:
+                cassette.finish()
+            save(cassette)
+
+
+def recorded(service: str, fn, run_id: str = None):
+    """
+    Wrap a background task (a scheduled post, say) so each call gets its own
+    cassette, replayable with `replay SERVICE CASSETTE` like a request
+    """
+    def run(*args):
+        if MODE != RECORD:
+            return fn(*args)
+        task = {"name": fn.__name__, "args": json.loads(json.dumps(args, default=str))}
+        with session(run_id or fn.__name__, service, fn.__name__, task=task):
+            return fn(*args)
+
+    return run
+
+
+def current():
+    return _session.get()
+
+
+def bind(fn):
+    """Wrap fn to run in the caller's cassette session, for work handed to another thread"""
+    cassette = _session.get()
+    if cassette is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _session.set(cassette)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _session.reset(token)
+
+    return run
+
+
+def call(dependency: str, fn, *args, **kwargs):
+    """
+    Call a dependency through the active cassette: recorded in record mode,
+    served from the recording (after its recorded latency) in replay mode,
+    and a plain call otherwise.
+    """
+    cassette = _session.get()
+    if cassette is None:
+        return fn(*args, **kwargs)
+
+    operation = _operation(fn)
+    key = call_key(args, kwargs)
+    if cassette.mode == REPLAY:
+        entry = cassette.next_call(dependency, operation, key)
+        if cassette.scale:
+            time.sleep(entry.get("elapsed", 0.0) * cassette.scale)
+        if "error" in entry:
+            raise decode_error(entry["error"])
+        return decode_result(entry.get("result", {}))
+
+    entry = cassette.start_call(dependency, operation, key)
+    started = time.monotonic()
+    # Stays like this if fn is interrupted by a BaseException (KeyboardInterrupt, SystemExit)
+    outcome = {"error": {"type": "builtins.InterruptedError", "attrs": {}, "message": "call interrupted"}}
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        outcome = {"error": encode_error(e)}
+        raise
+    else:
+        outcome = {"result": encode_result(result)}
+        return result
+    finally:
+        with cassette.lock:
+            entry.update(outcome, elapsed=round(time.monotonic() - started, 4))
+            del entry["pending"]
+
+
+# --- Flask ---
+
+def _find_run_id(data) -> str:
+    if not isinstance(data, dict):
+        return None
+    if data.get("run_id"):
+        return str(data["run_id"])
+    for value in data.values():
+        if isinstance(value, dict) and value.get("run_id"):
+            return str(value["run_id"])
+    return None
+
+
+def _request_record(request) -> dict:
+    body = request.get_data()
+    data = request.get_json(silent=True)
+    if data is not None:
+        # Re-encoded only when it held PII (a Stripe webhook's customer, say)
+        scrubbed = scrub(data)
+        if scrubbed != data:
+            body = json.dumps(scrubbed).encode("utf-8")
+    try:
+        body_field = {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        body_field = {"body_b64": base64.b64encode(body).decode("ascii")}
+    return {"method": request.method, "path": request.path, "query": request.query_string.decode("latin-1"),
+            "headers": _redact_headers(request.headers), **body_field}
+
+
+def init_app(app, service: str):
+    """Record or replay every request to the app's endpoints (not /health) per ANIPE_CASSETTE_MODE"""
+    if MODE not in (RECORD, REPLAY):
+        return app
+
+    def before_request():
+        from flask import g, request
+
+        if request.endpoint in (None, "health_check", "favicon", "static"):
+            return None
+        run_id = request.headers.get(RUN_ID_HEADER) or _find_run_id(request.get_json(silent=True))
+        cassette = None
+        if MODE == REPLAY:
+            path = request.headers.get(CASSETTE_HEADER)
+            if not path:
+                matches = [p for p in list_cassettes(CASSETTE_DIR, run_id)
+                           if os.path.basename(p).startswith(f"{service}.{request.endpoint}.")]
+                path = matches[-1] if matches else None
+            if path is None:
+                print(f"No cassette for run {run_id} {request.endpoint}, calls will miss")
+                cassette = Cassette({"id": "none", "run_id": run_id or "norun", "service": service,
+                                     "label": request.endpoint})
+            else:
+                cassette = _preloaded.pop(path, None) or load(path)
+        g.cassette = session(run_id, service, request.endpoint, request=_request_record(request), cassette=cassette)
+        g.cassette.__enter__()
+        return None
+
+    def after_request(response):
+        from flask import g
+
+        cassette = current()
+        if cassette is not None and getattr(g, "cassette", None) is not None:
+            cassette.finish(response.status_code)
+            if cassette.mode == REPLAY:
+                response.headers["X-ANIPE-Replay"] = (
+                    f"matched={len(cassette.used)}/{len(cassette.calls)} misses={len(cassette.missed)}")
+        return response
+
+    def teardown_request(error=None):
+        from flask import g
+
+        manager = g.pop("cassette", None)
+        if manager is not None:
+            manager.__exit__(None, None, None)
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    print(f"Cassettes: {MODE} mode, {CASSETTE_DIR}")
+    return app
+
+
+# --- Offline replay ---
+
+def _load_service(path: str):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0].replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def replay(service_path: str, cassette_path: str, latency: str = "original", profile: bool = False,
+           env: dict = None) -> dict:
+    """
+    Re-drive a recorded request (or background task) through the service
+    in-process, with every dependency call served from the cassette.
+    Returns recorded and replayed timings.
+    """
+    cassette = load(cassette_path)
+    header = cassette.header
+
+    # Take the same branches as the recorded process: placeholders for the
+    # credentials it had, and a storage client that builds without credentials
+    # (pointed at a closed port, so an unrecorded GCS call fails fast)
+    for name, was_set in header.get("env", {}).items():
+        if was_set and not os.environ.get(name):
+            os.environ[name] = "replay"
+    os.environ.setdefault("STORAGE_EMULATOR_HOST", "http://127.0.0.1:9")
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "anipe-replay")
+    os.environ.update(env or {}, ANIPE_CASSETTE_MODE=REPLAY, ANIPE_REPLAY_LATENCY=latency)
+
+    # The services import this module by name; run as a script, this copy is __main__
+    sys.path.insert(0, os.path.dirname(os.path.abspath(service_path)))
+    cassettes = importlib.import_module("anipe_cassette")
+    cassettes.MODE, cassettes.REPLAY_LATENCY = REPLAY, latency
+    module = _load_service(service_path)
+
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    if header.get("request"):
+        cassettes._preloaded[cassette_path] = cassette
+        request = header["request"]
+        body = request["body"].encode("utf-8") if "body" in request else base64.b64decode(request.get("body_b64", ""))
+        headers = dict(request["headers"], **{CASSETTE_HEADER: cassette_path})
+        response = module.app.test_client().open(request["path"], method=request["method"],
+                                                 query_string=request.get("query"), data=body, headers=headers)
+        status = response.status_code
+    else:
+        task = header["task"]
+        with cassettes.session(header["run_id"], header["service"], header["label"], cassette=cassette):
+            getattr(module, task["name"])(*task.get("args", []))
+        status = None
+    if profiler:
+        profiler.disable()
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+    result = {
+        "cassette": cassette_path, "run_id": header["run_id"], "service": header["service"],
+        "label": header["label"], "recorded_at": header.get("recorded_at"),
+        "recorded": dict(cassette.footer, calls=len(cassette.calls), dependencies=cassette.summary()),
+        "replayed": {"status": status, "latency": latency, "wall_seconds": round(wall, 3),
+                     "cpu_seconds": round(cpu, 3), "calls": cassette.replay_report()},
+    }
+    if profiler:
+        import pstats
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(30)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, inspect and replay ANIPE cassettes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List cassettes, optionally for one run")
+    list_parser.add_argument("directory", nargs="?", default=CASSETTE_DIR)
+    list_parser.add_argument("--run-id")
+
+    show_parser = commands.add_parser("show", help="Print a cassette's request and call timeline")
+    show_parser.add_argument("cassette")
+
+    replay_parser = commands.add_parser("replay", help="Re-drive a recorded request offline")
+    replay_parser.add_argument("service", help="Service file, e.g. anip-product-generator.py")
+    replay_parser.add_argument("cassette")
+    replay_parser.add_argument("--latency", default="original", help="original, zero or a scale factor")
+    replay_parser.add_argument("--profile", action="store_true", help="Print a cProfile of the replay")
+    replay_parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                               help="Extra environment, e.g. the webhook secret the request was signed with")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in list_cassettes(args.directory, args.run_id):
+            print(path)
+    elif args.command == "show":
+        cassette = load(args.cassette)
+        header = cassette.header
+        print(f"{header['service']} {header['label']} run={header['run_id']} recorded {header.get('recorded_at')}")
+        print(f"  result: {cassette.footer}")
+        for call in cassette.calls:
+            outcome = f"error {call['error']['type']}" if "error" in call else "ok"
+            print(f"  +{call['at']:8.3f}s {call.get('elapsed', 0):8.3f}s  {call['dep']:<9} {call['op']}  {outcome}")
+        print(f"  dependencies: {json.dumps(cassette.summary())}")
+    else:
+        env = dict(item.split("=", 1) for item in args.env)
+        print(json.dumps(replay(args.service, args.cassette, args.latency, args.profile, env), indent=2))
+
+
+if __name__ == "__main__":
+    main()
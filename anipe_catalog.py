@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+ANIPE Sales Page Catalog
+Incrementally maintained catalog manifest, index.html and sitemap.xml for published sales pages
+"""
+
+from datetime import datetime
+from html import escape
+from xml.sax.saxutils import escape as xml_escape
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from anipe_json import read_json, upload_json
+from anipe_publish import SHORT_CACHE_CONTROL, upload_compressed
+from anipe_resilience import get_breaker
+
+# Entries per manifest shard (and per sitemap / archive page). Every publish
+# touches at most one shard, so work per page is bounded by this size.
+SHARD_SIZE = 500
+
+# Newest pages listed directly on index.html
+RECENT_LIMIT = 50
+
+# Optimistic concurrency retries when two publishes race on the head manifest
+MAX_RETRIES = 5
+
+CATALOG_PREFIX = "sales-pages/catalog"
+
+# Custom metadata on each rendered page: the head generation it was rendered from
+VIEW_VERSION_KEY = "catalog_generation"
+
+gcs_breaker = get_breaker("gcs")
+
+
+def _shard_name(shard: int) -> str:
+    return f"{CATALOG_PREFIX}/shard-{shard:05d}.json"
+
+
+def _archive_page_name(shard: int) -> str:
+    return f"sales-pages/archive/page-{shard:05d}.html"
+
+
+def _sitemap_name(shard: int) -> str:
+    return f"sales-pages/sitemaps/sitemap-{shard:05d}.xml"
+
+
+def _read_json(bucket, blob_name: str):
+    """Read a JSON manifest, returning (data, generation) or (None, 0) if missing"""
+    blob = bucket.blob(blob_name)
+    try:
+        data = read_json(blob)
+    except NotFound:
+        return None, 0
+    return data, blob.generation
+
+
+def _write_json(bucket, blob_name: str, data, generation: int):
+    """Write a JSON manifest only if it still has the generation we read"""
+    blob = bucket.blob(blob_name)
+    blob.cache_control = "no-cache"
+    upload_json(blob, data, if_generation_match=generation)
+    return blob.generation
+
+
+def _contains(entries: list, entry: dict) -> bool:
+    return any(e["blob_name"] == entry["blob_name"] for e in entries)
+
+
+def _public_base(bucket) -> str:
+    return f"https://storage.googleapis.com/{bucket.name}/sales-pages/"
+
+
+def _render_entry_list(entries: list) -> str:
+    items = []
+    for entry in reversed(entries):
+        items.append(
+            f'<li><a href="{escape(entry["url"])}">{escape(entry.get("title", entry["blob_name"]))}</a>'
+            f' <span class="meta">${escape(str(entry.get("price", "")))} &middot; {escape(entry.get("published_at", "")[:10])}</span></li>'
+        )
+    return "\n".join(items)
+
+
+def _render_page(title: str, entries: list, more_href: str = None) -> str:
+    more = f'<p><a href="{escape(more_href)}">More reports &rarr;</a></p>' if more_href else ""
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{escape(title)}</title>
+</head>
+<body>
+    <h1>{escape(title)}</h1>
+    <ul>
+{_render_entry_list(entries)}
+    </ul>
+    {more}
+</body>
+</html>"""
+
+
+def _render_sitemap(entries: list) -> str:
+    urls = "\n".join(
+        f"  <url><loc>{xml_escape(entry['url'])}</loc><lastmod>{entry.get('published_at', '')[:10]}</lastmod></url>"
+        for entry in entries
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{urls}
+</urlset>"""
+
+
+def _render_sitemap_index(bucket, shard_count: int) -> str:
+    base = _public_base(bucket)
+    sitemaps = "\n".join(
+        f"  <sitemap><loc>{xml_escape(base + _sitemap_name(shard)[len('sales-pages/'):])}</loc></sitemap>"
+        for shard in range(shard_count)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{sitemaps}
+</sitemapindex>"""
+
+
+def add_to_catalog(bucket, entry: dict) -> dict:
+    """
+    Record a published sales page in the catalog and refresh index.html/sitemaps.
+    Touches only the head manifest, the current shard and their rendered pages,
+    so the cost per publish stays constant however large the catalog grows.
+    Returns the updated head manifest.
+    """
+    entry = dict(entry)
+    entry.setdefault("published_at", datetime.now().isoformat())
+
+    for attempt in range(MAX_RETRIES):
+        head, head_generation = _read_json(bucket, f"{CATALOG_PREFIX}/head.json")
+        head = head or {"shard_count": 1, "current_shard": 0, "total": 0, "recent": []}
+
+        shard = head["current_shard"]
+        entries, shard_generation = _read_json(bucket, _shard_name(shard))
+        entries = entries or []
+
+        rolled_over = False
+        if len(entries) >= SHARD_SIZE and not _contains(entries, entry):
+            # Another publish may already have started the next shard without getting to the head
+            shard += 1
+            entries, shard_generation = _read_json(bucket, _shard_name(shard))
+            entries = entries or []
+            rolled_over = True
+
+        # A retry after a lost head race may find our entry already written, in
+        # this shard or, if another publish rolled over since, the one before it
+        already_recorded = _contains(entries, entry)
+        view_shard, view_entries = shard, entries
+        if attempt and not already_recorded and not rolled_over and shard > 0:
+            previous, _ = _read_json(bucket, _shard_name(shard - 1))
+            if _contains(previous or [], entry):
+                already_recorded = True
+                view_shard, view_entries = shard - 1, previous
+        try:
+            if not already_recorded:
+                entries.append(entry)
+                _write_json(bucket, _shard_name(shard), entries, shard_generation)
+
+            # Shards before the current one are full, so the total follows from the
+            # shard sizes; counting it up would drift when a head write is lost
+            head["current_shard"] = shard
+            head["shard_count"] = shard + 1
+            head["total"] = SHARD_SIZE * shard + len(entries)
+            head["recent"] = ([entry] + [e for e in head["recent"] if e["blob_name"] != entry["blob_name"]])[:RECENT_LIMIT]
+            head["updated_at"] = datetime.now().isoformat()
+            version = _write_json(bucket, f"{CATALOG_PREFIX}/head.json", head, head_generation)
+            break
+        except PreconditionFailed:
+            print(f"Catalog update raced with another publish, retrying ({attempt + 1}/{MAX_RETRIES})")
+    else:
+        raise RuntimeError(f"Catalog update for {entry['blob_name']} failed after {MAX_RETRIES} retries")
+
+    _publish_views(bucket, head, int(version or 0), view_shard, view_entries, rolled_over)
+    return head
+
+
+def _view_state(bucket, blob_name: str) -> tuple:
+    """(generation, head generation it was rendered from) of a rendered page, (0, 0) if missing"""
+    blob = bucket.get_blob(blob_name)
+    if blob is None:
+        return 0, 0
+    return int(blob.generation or 0), int((blob.metadata or {}).get(VIEW_VERSION_KEY, 0))
+
+
+def _publish_view(bucket, blob_name: str, version: int, render, content_type: str, only_if_missing: bool = False):
+    """
+    Upload a rendered page unless it already reflects this head generation or a
+    later one, so a publish that committed first but renders last can't replace
+    a newer page with a stale one. `only_if_missing` writes it only if it's absent.
+    """
+    for _ in range(MAX_RETRIES):
+        generation, rendered_from = gcs_breaker.call(_view_state, bucket, blob_name)
+        if (generation and only_if_missing) or (version and rendered_from >= version):
+            return
+        try:
+            upload_compressed(bucket, blob_name, render(), content_type, cache_control=SHORT_CACHE_CONTROL,
+                              if_generation_match=generation, metadata={VIEW_VERSION_KEY: str(version)})
+            return
+        except PreconditionFailed:
+            continue  # Another publish wrote it meanwhile; check whose is newer
+    print(f"Gave up publishing {blob_name} after {MAX_RETRIES} races")
+
+
+def _publish_views(bucket, head: dict, version: int, shard: int, entries: list, rolled_over: bool):
+    """Re-render the pages affected by one catalog update, `version` being the committed head generation"""
+    # Archive page for the current shard links to the previous one
+    archive_older = f"page-{shard - 1:05d}.html" if shard > 0 else None
+    _publish_view(bucket, _archive_page_name(shard), version,
+                  lambda: _render_page(f"ANIPE Reports (page {shard + 1})", entries, archive_older),
+                  "text/html; charset=utf-8")
+
+    _publish_view(bucket, _sitemap_name(shard), version, lambda: _render_sitemap(entries), "application/xml")
+
+    # The sitemap index only changes when a new shard starts, or if it was never written
+    _publish_view(bucket, "sales-pages/sitemap.xml", version,
+                  lambda: _render_sitemap_index(bucket, head["shard_count"]),
+                  "application/xml", only_if_missing=not rolled_over)
+
+    _publish_view(bucket, "sales-pages/index.html", version,
+                  lambda: _render_page(f"ANIPE Reports ({head['total']} available)", list(reversed(head["recent"])),
+                                       _archive_page_name(shard)[len("sales-pages/"):]),
+                  "text/html; charset=utf-8")
+
+
+def read_head(bucket) -> dict:
+    """Return the head manifest (shard_count, current_shard, total, recent), or None"""
+    head, _ = _read_json(bucket, f"{CATALOG_PREFIX}/head.json")
+    return head
+
+
+def iter_catalog(bucket, start_shard: int = 0):
+    """Yield catalog entries, oldest first, by reading the manifest shards from start_shard on"""
+    head = read_head(bucket)
+    if not head:
+        return
+    for shard in range(start_shard, head["shard_count"]):
+        entries, _ = _read_json(bucket, _shard_name(shard))
+        for entry in entries or []:
+            yield entry
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+ANIPE Context Cache
+Splits prompts into a static preamble and a per-call suffix, and sends every
+call for a preamble with the same leading bytes so the provider's implicit
+prefix caching can apply
+"""
+
+import hashlib
+import threading
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Only needed for real calls; tests pass a model_factory
+    genai = None
+
+from anipe_prompts import count_tokens
+
+# Explicit Gemini cached contents are not used: the 1.5 models these services call
+# reject caches under 32,768 tokens, and the static preambles are a few hundred
+
+
+class _PrefixedModel:
+    """Sends prefix + suffix as one prompt through a regular model"""
+
+    def __init__(self, model, prefix: str):
+        self.model = model
+        self.prefix = prefix
+
+    def generate_content(self, suffix, **kwargs):
+        return self.model.generate_content(f"{self.prefix}\n\n{suffix}", **kwargs)
+
+
+class ContextCache:
+    """
+    One prefixed model per (model, static prefix), built on first use. Tests
+    pass a model_factory that returns fake models.
+    """
+
+    def __init__(self, model_factory=None):
+        self.model_factory = model_factory or (lambda model_name: genai.GenerativeModel(model_name))
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {"prefixes": 0, "calls": 0, "prefix_tokens": 0, "cached_tokens": 0}
+
+    @staticmethod
+    def _key(model_name: str, prefix: str) -> tuple:
+        return model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def _entry(self, model_name: str, prefix: str) -> _PrefixedModel:
+        key = self._key(model_name, prefix)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _PrefixedModel(self.model_factory(model_name), prefix)
+                self.stats["prefixes"] += 1
+            return entry
+
+    def generate(self, model_name: str, prefix: str, suffix: str, **kwargs):
+        """generate_content for prefix + suffix"""
+        response = self._entry(model_name, prefix).generate_content(suffix, **kwargs)
+
+        usage = getattr(response, "usage_metadata", None)
+        with self.lock:
+            self.stats["calls"] += 1
+            self.stats["prefix_tokens"] += count_tokens(prefix)
+            # Tokens the provider served from its implicit cache, when it reports them
+            self.stats["cached_tokens"] += getattr(usage, "cached_content_token_count", None) or 0
+        return response
+
+
+context_cache = ContextCache()
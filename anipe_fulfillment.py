@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+ANIPE Fulfillment Records
+Payment link -> product mapping shared by the sales page generator and the fulfillment service
+"""
+
+import os
+import hashlib
+from datetime import datetime
+
+from google.api_core.exceptions import NotFound
+
+from anipe_json import read_json, upload_json
+
+# Private bucket holding link mappings and order records (never published)
+FULFILLMENT_BUCKET = os.environ.get("FULFILLMENT_BUCKET", "windsurf-anipe-data")
+
+LINKS_PREFIX = "fulfillment/links"
+ORDERS_PREFIX = "fulfillment/orders"
+# One empty marker per order not yet delivered, so the sweeper lists only those
+PENDING_PREFIX = "fulfillment/pending"
+
+
+def link_key(payment_link_url: str) -> str:
+    return hashlib.sha256(payment_link_url.encode("utf-8")).hexdigest()[:32]
+
+
+def link_blob_name(payment_link_url: str) -> str:
+    return f"{LINKS_PREFIX}/{link_key(payment_link_url)}.json"
+
+
+def order_blob_name(session_id: str) -> str:
+    return f"{ORDERS_PREFIX}/{session_id}.json"
+
+
+def pending_blob_name(session_id: str) -> str:
+    return f"{PENDING_PREFIX}/{session_id}"
+
+
+def split_gcs_path(gcs_path: str):
+    """Split gs://bucket/blob into (bucket, blob)"""
+    bucket_name, _, blob_name = gcs_path.replace("gs://", "", 1).partition("/")
+    return bucket_name, blob_name
+
+
+def record_payment_link(storage_client, payment_link_url: str, product_gcs_path: str,
+                        niche_topic: str, sales_page_url: str = None, run_id: str = None):
+    """Remember which product a payment link sells, so purchases through it can be fulfilled"""
+    record = {
+        "payment_link": payment_link_url,
+        "product_gcs_path": product_gcs_path,
+        "niche_topic": niche_topic,
+        "sales_page_url": sales_page_url,
+        "recorded_at": datetime.now().isoformat(),
+    }
+    blob = storage_client.bucket(FULFILLMENT_BUCKET).blob(link_blob_name(payment_link_url))
+    if run_id:
+        blob.metadata = {"run_id": run_id}
+    upload_json(blob, record)
+    return record
+
+
+def load_payment_link(storage_client, payment_link_url: str):
+    """Return the product record for a payment link, or None if it was never recorded"""
+    blob = storage_client.bucket(FULFILLMENT_BUCKET).blob(link_blob_name(payment_link_url))
+    try:
+        return read_json(blob)
+    except NotFound:
+        return None
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+ANIPE Artifact Index
+Incrementally synced local SQLite index of opportunities, products, sales pages and promotions
+"""
+
+import os
+import re
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from anipe_archive import ARCHIVE_PREFIX, parse_archive
+from anipe_catalog import iter_catalog, read_head
+from anipe_json import read_json
+from anipe_models import slugify
+
+ARTIFACT_INDEX_DB = os.environ.get("ARTIFACT_INDEX_DB", "anipe-index.db")
+
+# Parallel GETs when new JSON artifacts are found
+DOWNLOAD_WORKERS = 8
+
+# Incremental syncs list only objects named for days since the last sync (less
+# this overlap, for late writes); a full listing, which also drops rows for
+# deleted objects, runs at least every FULL_SYNC_DAYS
+INCREMENTAL_OVERLAP_DAYS = 1
+FULL_SYNC_DAYS = 7
+
+# Table indexed from each listed kind
+KIND_TABLES = {"opportunities": "opportunities", "results": "runs", "promotions": "promotions",
+               "products": "products"}
+
+_NAME_RE = re.compile(r"^(?:.*/)?(.+?)_(\d{8})_?(\d{6})")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (name TEXT PRIMARY KEY, generation INTEGER, kind TEXT);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS archived (name TEXT PRIMARY KEY, archive TEXT);
+CREATE TABLE IF NOT EXISTS opportunities (
+    name TEXT PRIMARY KEY, slug TEXT, niche_topic TEXT, target_audience TEXT,
+    confidence_score REAL, keywords TEXT, created_at TEXT);
+CREATE TABLE IF NOT EXISTS products (
+    name TEXT PRIMARY KEY, slug TEXT, content_name TEXT, size INTEGER, created_at TEXT);
+CREATE TABLE IF NOT EXISTS sales_pages (
+    name TEXT PRIMARY KEY, slug TEXT, niche_topic TEXT, title TEXT, url TEXT, price REAL, created_at TEXT);
+CREATE TABLE IF NOT EXISTS promotions (
+    name TEXT PRIMARY KEY, slug TEXT, niche_topic TEXT, sales_page_url TEXT, created_at TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY, slug TEXT, niche_topic TEXT, product_path TEXT, sales_page_url TEXT,
+    status TEXT, created_at TEXT);
+CREATE INDEX IF NOT EXISTS opportunities_slug ON opportunities (slug, created_at);
+CREATE INDEX IF NOT EXISTS opportunities_created ON opportunities (created_at);
+CREATE INDEX IF NOT EXISTS products_slug ON products (slug, created_at);
+CREATE INDEX IF NOT EXISTS sales_pages_slug ON sales_pages (slug, created_at);
+CREATE INDEX IF NOT EXISTS promotions_slug ON promotions (slug, created_at);
+CREATE INDEX IF NOT EXISTS runs_slug ON runs (slug, created_at);
+"""
+
+
+def _created_at(name: str, blob=None) -> str:
+    """Timestamp embedded in an artifact name, else the object's creation time"""
+    match = _NAME_RE.match(name)
+    if match:
+        try:
+            return datetime.strptime(match.group(2) + match.group(3), "%Y%m%d%H%M%S").isoformat()
+        except ValueError:
+            pass
+    if blob is not None and blob.time_created:
+        return blob.time_created.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+    return None
+
+
+def _name_slug(name: str) -> str:
+    match = _NAME_RE.match(name)
+    return match.group(1) if match else None
+
+
+def _opportunity_of(data: dict) -> dict:
+    """Opportunity dicts are stored bare, or nested in /identify and workflow envelopes"""
+    data = data.get("opportunity", data) if isinstance(data, dict) else {}
+    if "niche_topic" not in data and isinstance(data.get("opportunity"), dict):
+        data = data["opportunity"]
+    return data
+
+
+class ArtifactIndex:
+    """
+    Local SQLite index of pipeline artifacts. `sync` lists the bucket prefixes
+    and only downloads objects whose generation number changed since the last
+    sync; queries are then plain indexed SQL lookups. Between full syncs only
+    objects named for recent days are listed.
+    """
+
+    def __init__(self, db_path: str = ARTIFACT_INDEX_DB):
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+
+    # Sync
+
+    @staticmethod
+    def _list(bucket, prefix: str, days: list, pattern: str) -> list:
+        """
+        Every object under prefix, or with days given, only those matching
+        pattern (a GCS glob, formatted with prefix and day) for one of the days
+        """
+        if days is None:
+            return list(bucket.list_blobs(prefix=prefix))
+        blobs = []
+        try:
+            for day in days:
+                blobs.extend(bucket.list_blobs(prefix=prefix, match_glob=pattern.format(prefix=prefix, day=day)))
+        except TypeError:  # match_glob needs google-cloud-storage >= 2.11
+            return list(bucket.list_blobs(prefix=prefix))
+        return blobs
+
+    def _prune(self, kind: str, names: list) -> int:
+        """After a full listing: drop objects of a kind that are gone, keeping records still held by archives"""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS listed (name TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM listed")
+        self.db.executemany("INSERT OR IGNORE INTO listed VALUES (?)", ((name,) for name in names))
+        removed = self.db.execute(
+            "DELETE FROM objects WHERE kind = ? AND name NOT IN (SELECT name FROM listed)", (kind,)).rowcount
+        if kind == "archive":
+            self.db.execute("DELETE FROM archived WHERE archive NOT IN (SELECT name FROM listed)")
+        else:
+            self.db.execute(
+                f"DELETE FROM {KIND_TABLES[kind]} WHERE name NOT IN (SELECT name FROM listed) "
+                f"AND name NOT IN (SELECT name FROM archived)")
+        return removed
+
+    def _changed(self, blobs, kind: str) -> list:
+        known = dict(self.db.execute("SELECT name, generation FROM objects WHERE kind = ?", (kind,)).fetchall())
+        return [blob for blob in blobs if known.get(blob.name) != blob.generation]
+
+    def _mark(self, blob, kind: str):
+        self.db.execute("INSERT OR REPLACE INTO objects (name, generation, kind) VALUES (?, ?, ?)",
+                        (blob.name, blob.generation, kind))
+
+    def _index_json(self, kind: str, name: str, data: dict, blob=None):
+        created = _created_at(name, blob)
+        if kind == "opportunities":
+            opportunity = _opportunity_of(data)
+            niche = opportunity.get("niche_topic")
+            self.db.execute(
+                "INSERT OR REPLACE INTO opportunities VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, slugify(niche) if niche else None, niche, opportunity.get("target_audience"),
+                 opportunity.get("confidence_score"), json.dumps(opportunity.get("keywords", [])), created))
+        elif kind == "promotions":
+            niche = _opportunity_of(data.get("product_data", {})).get("niche_topic")
+            self.db.execute(
+                "INSERT OR REPLACE INTO promotions VALUES (?, ?, ?, ?, ?)",
+                (name, slugify(niche) if niche else _name_slug(name), niche, data.get("sales_page_url"),
+                 data.get("timestamp") or created))
+        elif kind == "results":
+            niche = _opportunity_of(data.get("opportunity", {})).get("niche_topic")
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, slugify(niche) if niche else None, niche, data.get("product_path"),
+                 data.get("sales_page_url"), data.get("status"), created))
+
+    def _sync_json_prefix(self, bucket, kind: str, days: list = None) -> int:
+        blobs = [blob for blob in self._list(bucket, f"{kind}/", days, "{prefix}**_{day}*")
+                 if blob.name.endswith(".json")]
+        changed = self._changed(blobs, kind)
+
+        def fetch(blob):
+            try:
+                return blob, read_json(blob)
+            except Exception as e:
+                print(f"Skipping {blob.name}: {e}")
+                return blob, None
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for blob, data in executor.map(fetch, changed):
+                if data is not None:
+                    self._index_json(kind, blob.name, data, blob)
+                    self._mark(blob, kind)
+        if days is None:
+            self._prune(kind, [blob.name for blob in blobs])
+        return len(changed)
+
+    def _sync_archives(self, bucket, days: list = None) -> int:
+        """Index records that the compactor moved into archives/ (whole part per read)"""
+        blobs = [blob for blob in self._list(bucket, f"{ARCHIVE_PREFIX}/", days, "{prefix}*/dt={day}/*")
+                 if blob.name.endswith(".jsonl.gz")]
+        changed = self._changed(blobs, "archive")
+        for blob in changed:
+            kind = blob.name.split("/")[1]
+            records = parse_archive(blob.download_as_bytes())
+            for record in records:
+                self._index_json(kind, record["name"], record["data"])
+            self.db.execute("DELETE FROM archived WHERE archive = ?", (blob.name,))
+            self.db.executemany("INSERT OR REPLACE INTO archived VALUES (?, ?)",
+                                ((record["name"], blob.name) for record in records))
+            self._mark(blob, "archive")
+        if days is None:
+            self._prune("archive", [blob.name for blob in blobs])
+        return len(changed)
+
+    def _sync_products(self, bucket, days: list = None) -> int:
+        blobs = [blob for blob in self._list(bucket, "products/", days, "{prefix}**_{day}*")
+                 if blob.name.endswith(".pdf")]
+        changed = self._changed(blobs, "products")
+        for blob in changed:
+            content_name = blob.name[:-len(".pdf")] + "_content.txt"
+            self.db.execute("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?)",
+                            (blob.name, _name_slug(blob.name), content_name, blob.size, _created_at(blob.name, blob)))
+            self._mark(blob, "products")
+        if days is None:
+            self._prune("products", [blob.name for blob in blobs])
+        return len(changed)
+
+    def _sync_sales_pages(self, bucket) -> int:
+        """Read only catalog shards added or grown since the last sync"""
+        head = read_head(bucket)
+        if not head:
+            return 0
+        row = self.db.execute("SELECT value FROM state WHERE key = 'catalog_shard'").fetchone()
+        added = 0
+        for entry in iter_catalog(bucket, int(row["value"]) if row else 0):
+            niche = entry.get("niche_topic")
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO sales_pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry["blob_name"], slugify(niche) if niche else _name_slug(entry["blob_name"]), niche,
+                 entry.get("title"), entry.get("url"), entry.get("price"),
+                 (entry.get("published_at") or "")[:19] or None))
+            added += cursor.rowcount
+        # The last shard may still grow, so it's re-read next time
+        self.db.execute("INSERT OR REPLACE INTO state VALUES ('catalog_shard', ?)", (str(head["current_shard"]),))
+        return added
+
+    def _state(self, key: str):
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def sync(self, data_bucket, sales_bucket=None, full: bool = None) -> dict:
+        """
+        Bring the index up to date; returns how many artifacts were (re)indexed per kind.
+        `full` lists every object and drops rows for deleted ones; by default that
+        happens on the first sync and every FULL_SYNC_DAYS, and other syncs only list
+        objects named for the days since the last one.
+        """
+        started = time.perf_counter()
+        today = datetime.now(timezone.utc).date()
+        last_sync, last_full = self._state("synced_on"), self._state("full_synced_on")
+        if full is None:
+            full = not last_sync or not last_full or \
+                (today - datetime.fromisoformat(last_full).date()).days >= FULL_SYNC_DAYS
+        days = None
+        if not full:
+            first = datetime.fromisoformat(last_sync).date() - timedelta(days=INCREMENTAL_OVERLAP_DAYS)
+            days = [first + timedelta(days=n) for n in range((today - first).days + 1)]
+
+        counts = {}
+        with self.db:
+            # Archives first, so pruning a kind sees which records archives still hold
+            counts["archives"] = self._sync_archives(data_bucket, days and [d.isoformat() for d in days])
+            for kind in ("opportunities", "results", "promotions"):
+                counts[kind] = self._sync_json_prefix(data_bucket, kind, days and [d.strftime("%Y%m%d") for d in days])
+            counts["products"] = self._sync_products(data_bucket, days and [d.strftime("%Y%m%d") for d in days])
+            if sales_bucket is not None:
+                counts["sales_pages"] = self._sync_sales_pages(sales_bucket)
+            self.db.execute("INSERT OR REPLACE INTO state VALUES ('synced_at', ?)", (datetime.now().isoformat(),))
+            self.db.execute("INSERT OR REPLACE INTO state VALUES ('synced_on', ?)", (today.isoformat(),))
+            if full:
+                self.db.execute("INSERT OR REPLACE INTO state VALUES ('full_synced_on', ?)", (today.isoformat(),))
+        print(f"Artifact index {'full' if full else 'incremental'} sync in {time.perf_counter() - started:.2f}s: {counts}")
+        return counts
+
+    # Queries
+
+    def products_for_niche(self, niche: str, since: str = None) -> list:
+        """Products whose niche slug matches `niche` (exact topic or slug), newest first"""
+        rows = self.db.execute(
+            "SELECT * FROM products WHERE slug = ? AND created_at >= ? ORDER BY created_at DESC",
+            (slugify(niche), since or "")).fetchall()
+        return [dict(row) for row in rows]
+
+    def opportunities_without_sales_page(self, since: str = None) -> list:
+        """Opportunities for which no sales page exists for the same niche"""
+        rows = self.db.execute(
+            """SELECT o.* FROM opportunities o
+               WHERE o.created_at >= ? AND o.slug IS NOT NULL
+                 AND NOT EXISTS (SELECT 1 FROM sales_pages s WHERE s.slug = o.slug)
+               ORDER BY o.created_at DESC""",
+            (since or "",)).fetchall()
+        return [dict(row) for row in rows]
+
+    def niche_history(self, niche: str) -> dict:
+        """Everything indexed for one niche"""
+        slug = slugify(niche)
+        return {
+            table: [dict(row) for row in self.db.execute(
+                f"SELECT * FROM {table} WHERE slug = ? ORDER BY created_at DESC", (slug,))]
+            for table in ("opportunities", "products", "sales_pages", "promotions", "runs")
+        }
+
+    def search(self, text: str, limit: int = 50) -> list:
+        rows = self.db.execute(
+            "SELECT * FROM opportunities WHERE niche_topic LIKE ? ORDER BY created_at DESC LIMIT ?",
+            (f"%{text}%", limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        counts = {table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("opportunities", "products", "sales_pages", "promotions", "runs")}
+        row = self.db.execute("SELECT value FROM state WHERE key = 'synced_at'").fetchone()
+        counts["synced_at"] = row["value"] if row else None
+        return counts
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+ANIPE JSON Serialization
+One codec for every service: orjson when installed (stdlib JSON otherwise),
+compact gzip-encoded artifact uploads, and Accept-Encoding negotiated
+compression for Flask responses
+"""
+
+import os
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib codec produces the same JSON
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is offered to every client
+    brotli = None
+
+from anipe_resilience import get_breaker
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Payloads smaller than this are stored and served uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("ANIPE_COMPRESS_MIN_BYTES", 1024))
+
+# Fast levels: responses and artifacts are compressed on every request, unlike
+# the once-published assets in anipe_publish which use the maximum levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/javascript", "image/svg+xml"}
+
+gcs_breaker = get_breaker("gcs")
+
+
+def dumps(data) -> bytes:
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_text(data) -> str:
+    return dumps(data).decode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from str or bytes; gzip bytes (an untranscoded GCS read) are inflated first"""
+    if isinstance(data, (bytes, bytearray)) and data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def upload_gzip(blob, data, content_type: str, **upload_kwargs):
+    """
+    Upload data with Content-Encoding: gzip once it's worth compressing.
+    GCS transcodes it back for readers that don't accept gzip, and the
+    Python client inflates it on download, so readers see the original bytes.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        blob.content_encoding = "gzip"
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    gcs_breaker.call(blob.upload_from_string, data, content_type=content_type, **upload_kwargs)
+    return blob
+
+
+def upload_json(blob, data, **upload_kwargs):
+    """Store data as a compact (and, above COMPRESS_MIN_BYTES, gzip-encoded) JSON artifact"""
+    return upload_gzip(blob, dumps(data), "application/json", **upload_kwargs)
+
+
+def read_json(blob, **download_kwargs):
+    return loads(gcs_breaker.call(blob.download_as_bytes, **download_kwargs))
+
+
+def compress_response(response):
+    """
+    Flask after_request hook: gzip or Brotli encode text and JSON responses
+    larger than COMPRESS_MIN_BYTES, whichever the client's Accept-Encoding prefers.
+    """
+    from flask import request
+
+    mimetype = response.mimetype or ""
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or not (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES)):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli is not None else ["gzip"])
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    else:
+        return response
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    """Serve jsonify/get_json through this codec and compress responses"""
+    from flask.json.provider import DefaultJSONProvider
+
+    class JSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            if orjson is None:
+                return super().dumps(obj, **kwargs)
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+    app.json = JSONProvider(app)
+    app.after_request(compress_response)
+    return app
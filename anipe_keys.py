@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+ANIPE Artifact Keys
+Sortable unique IDs, hash-spread object names and per-run IDs shared by every service
+"""
+
+import re
+import time
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+
+# Crockford base32, lowercase so IDs are safe in URLs and object names
+_ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+_RANDOM_BITS = 80
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+# Hex characters of hash put in front of private artifact names (256 prefixes)
+SPREAD_WIDTH = 2
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def new_id() -> str:
+    """
+    26-character ULID-style ID: 48-bit millisecond time then 80 random bits.
+    IDs sort by creation time, and IDs made in the same millisecond in one
+    process increase monotonically, so they never collide or reorder.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        ms = int(time.time() * 1000)
+        if ms <= _last_ms:
+            ms = _last_ms
+            random_part = _last_random + 1
+            if random_part >> _RANDOM_BITS:
+                ms, random_part = ms + 1, secrets.randbits(_RANDOM_BITS)
+        else:
+            random_part = secrets.randbits(_RANDOM_BITS)
+        _last_ms, _last_random = ms, random_part
+
+    value = (ms << _RANDOM_BITS) | random_part
+    chars = []
+    for _ in range(26):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def id_time(artifact_id: str) -> datetime:
+    """Creation time encoded in an ID from new_id()"""
+    value = 0
+    for char in artifact_id[:10]:
+        value = value * 32 + _ALPHABET.index(char)
+    return datetime.fromtimestamp(value / 1000)
+
+
+def new_run_id() -> str:
+    """ID shared by every artifact of one pipeline run"""
+    return new_id()
+
+
+def clean_run_id(run_id) -> str:
+    """Return a caller-supplied run ID if it is safe to store, else a new one"""
+    if isinstance(run_id, str) and _RUN_ID_RE.match(run_id):
+        return run_id
+    return new_run_id()
+
+
+def spread_prefix(artifact_id: str) -> str:
+    """Short hash prefix so concurrent writes land on different key ranges"""
+    return hashlib.sha1(artifact_id.encode("utf-8")).hexdigest()[:SPREAD_WIDTH]
+
+
+def unique_name(stem: str, artifact_id: str = None) -> str:
+    """`{stem}_{YYYYmmddHHMMSS}_{id}`: human readable, sortable within a stem and collision free"""
+    artifact_id = artifact_id or new_id()
+    return f"{stem}_{id_time(artifact_id).strftime('%Y%m%d%H%M%S')}_{artifact_id}"
+
+
+def artifact_key(kind: str, stem: str, extension: str = None, artifact_id: str = None) -> str:
+    """
+    Object name for a private artifact: `{kind}/{hash}/{stem}_{timestamp}_{id}[.ext]`.
+    Pass the same artifact_id to name files that belong together (e.g. a PDF
+    and its text content); everything else gets a fresh ID.
+    """
+    artifact_id = artifact_id or new_id()
+    name = f"{kind}/{spread_prefix(artifact_id)}/{unique_name(stem, artifact_id)}"
+    return f"{name}.{extension}" if extension else name
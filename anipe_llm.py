@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+ANIPE LLM Routing
+Per-step model selection with deadlines and hedged requests: a call that
+hasn't answered by the step's observed latency percentile gets a duplicate,
+and the first valid response wins
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Only needed for real calls; tests pass their own `call`
+    genai = None
+
+import anipe_cassette
+from anipe_context_cache import context_cache
+from anipe_resilience import get_breaker
+
+# Model, hedge model, initial hedge delay and deadline (seconds) per pipeline step.
+# Override with LLM_MODEL_<STEP>, LLM_HEDGE_MODEL_<STEP>, LLM_HEDGE_AFTER_<STEP>
+# and LLM_DEADLINE_<STEP>, e.g. LLM_MODEL_PRODUCT=gemini-1.5-pro. Hedges go to a
+# different model, so whatever is slowing the primary's backend doesn't also
+# hold up the duplicate; LLM_HEDGE_MODEL_<STEP>=none turns hedging off
+DEFAULT_STEP_ROUTES = {
+    "identify": {"model": "gemini-1.5-flash", "hedge_model": "gemini-1.5-flash-8b", "hedge_after": 10.0, "deadline": 60.0},
+    "product": {"model": "gemini-1.5-flash", "hedge_model": "gemini-1.5-flash-8b", "hedge_after": 60.0, "deadline": 240.0},
+    "sales_copy": {"model": "gemini-1.5-flash", "hedge_model": "gemini-1.5-flash-8b", "hedge_after": 20.0, "deadline": 90.0},
+    "social": {"model": "gemini-1.5-flash", "hedge_model": "gemini-1.5-flash-8b", "hedge_after": 10.0, "deadline": 60.0},
+}
+
+# Once a step has MIN_LATENCY_SAMPLES, it hedges at this percentile of its recent latencies
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Hedges are capped at this fraction of calls, so a provider-wide slowdown
+# can't double the bill
+MAX_HEDGE_RATIO = float(os.environ.get("LLM_MAX_HEDGE_RATIO", "0.1"))
+
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", "8"))
+
+# Hedges run on their own small pool and are skipped while it's full, so
+# duplicates (and losers still running out their timeout) never hold up primaries
+HEDGE_WORKERS = int(os.environ.get("LLM_HEDGE_WORKERS", "2"))
+
+
+class Route:
+    __slots__ = ("step", "model", "hedge_model", "hedge_after", "deadline")
+
+    def __init__(self, step: str, model: str, hedge_model: str, hedge_after: float, deadline: float):
+        self.step = step
+        self.model = model
+        self.hedge_model = None if (hedge_model or "none").lower() == "none" else hedge_model
+        self.hedge_after = hedge_after
+        self.deadline = deadline
+
+
+def get_route(step: str) -> Route:
+    """Return the model route for a pipeline step, with environment overrides applied"""
+    defaults = DEFAULT_STEP_ROUTES.get(step, DEFAULT_STEP_ROUTES["identify"])
+    suffix = step.upper()
+
+    def number(name, default):
+        value = os.environ.get(f"{name}_{suffix}")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                print(f"Warning: invalid {name}_{suffix}={value!r}, using default")
+        return default
+
+    return Route(
+        step,
+        os.environ.get(f"LLM_MODEL_{suffix}") or defaults["model"],
+        os.environ.get(f"LLM_HEDGE_MODEL_{suffix}") or defaults["hedge_model"],
+        number("LLM_HEDGE_AFTER", defaults["hedge_after"]),
+        number("LLM_DEADLINE", defaults["deadline"]),
+    )
+
+
+def _percentile(values: list, percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))]
+
+
+class StepStats:
+    """Recent latencies and hedge outcomes for one step"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def hedge_delay(self, default: float) -> float:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return default
+        return _percentile(self.latencies, HEDGE_PERCENTILE)
+
+    def snapshot(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins_after_hedge": self.primary_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedged, 3) if self.hedged else None,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "p50_seconds": round(_percentile(latencies, 50), 2) if latencies else None,
+            "p99_seconds": round(_percentile(latencies, 99), 2) if latencies else None,
+        }
+
+
+class _Attempt:
+    """One submitted call; its clock starts when a worker picks it up, not while it's queued"""
+    __slots__ = ("label", "future", "running", "started")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.future = None
+        self.running = threading.Event()
+        self.started = None
+
+
+def expect_json(response):
+    """Validator for JSON steps: a response only wins if its text parses"""
+    text = response.text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else text[3:]
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    json.loads(text)
+
+
+def _expect_text(response):
+    if not response.text.strip():
+        raise ValueError("Empty response")
+
+
+class ModelRouter:
+    """
+    Runs each LLM call on a shared thread pool, fires at most one hedge per
+    call on a separate bounded pool and returns the first response that passes
+    validation. Losers still queued are cancelled; ones already in flight
+    can't be interrupted and run out their request timeout.
+    """
+
+    def __init__(self, call=None, workers: int = LLM_WORKERS, hedge_workers: int = HEDGE_WORKERS):
+        self.call = call or self._call_gemini
+        self.breaker = get_breaker("gemini")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self.hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge")
+        self.hedge_workers = hedge_workers
+        self.hedges_in_flight = 0
+        self.steps = {}
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def _call_gemini(self, model_name: str, prompt: str, prefix: str, timeout: float):
+        options = {"request_options": {"timeout": timeout}}
+        if prefix:
+            return context_cache.generate(model_name, prefix, prompt, **options)
+        with self.lock:
+            model = self.models.get(model_name)
+            if model is None:
+                model = self.models[model_name] = genai.GenerativeModel(model_name)
+        return model.generate_content(prompt, **options)
+
+    def _stats(self, step: str) -> StepStats:
+        with self.lock:
+            return self.steps.setdefault(step, StepStats())
+
+    def _submit(self, executor, label: str, stats: StepStats, model_name: str, prompt: str, prefix: str,
+                timeout: float) -> _Attempt:
+        attempt = _Attempt(label)
+        # bind() carries the request's cassette (record/replay) onto the pool thread
+        observe = anipe_cassette.bind(self.breaker.observe)
+
+        def run():
+            attempt.started = time.monotonic()
+            attempt.running.set()
+            return observe(self.call, model_name, prompt, prefix, timeout)
+
+        def record(done):
+            # Every successful attempt counts, including hedge losers, so the percentile isn't biased
+            if not done.cancelled() and done.exception() is None:
+                with self.lock:
+                    stats.latencies.append(time.monotonic() - attempt.started)
+
+        attempt.future = executor.submit(run)
+        attempt.future.add_done_callback(record)
+        return attempt
+
+    def _submit_hedge(self, stats: StepStats, model_name: str, prompt: str, prefix: str, timeout: float):
+        """Hedge on the hedge pool, or None while every hedge worker is busy"""
+        with self.lock:
+            if self.hedges_in_flight >= self.hedge_workers:
+                return None
+            self.hedges_in_flight += 1
+
+        def release(_):
+            with self.lock:
+                self.hedges_in_flight -= 1
+
+        attempt = self._submit(self.hedge_executor, "hedge", stats, model_name, prompt, prefix, timeout)
+        attempt.future.add_done_callback(release)
+        return attempt
+
+    def generate(self, step: str, prompt: str, prefix: str = None, validate=None):
+        """
+        Generate for a pipeline step. `prefix` is static context served through
+        the context cache; `validate(response)` raises for unusable responses.
+        Raises TimeoutError when nothing valid arrives by the step's deadline,
+        counted from when the primary starts running, and CircuitOpenError at
+        once while Gemini's breaker is open.
+        """
+        self.breaker.check()
+        route = get_route(step)
+        stats = self._stats(step)
+        validate = validate or _expect_text
+        with self.lock:
+            stats.calls += 1
+            hedge_at = stats.hedge_delay(route.hedge_after) if route.hedge_model else None
+        primary = self._submit(self.executor, "primary", stats, route.model, prompt, prefix, route.deadline)
+        # Time spent queued behind other calls doesn't count against the deadline
+        primary.running.wait()
+        started = primary.started
+        attempts = {primary.future: primary}
+        hedged = False
+        last_error = None
+
+        try:
+            while True:
+                elapsed = time.monotonic() - started
+                remaining = route.deadline - elapsed
+                if remaining <= 0:
+                    break
+                if hedge_at is not None and (not attempts or elapsed >= hedge_at):
+                    # Slow (or failed) primary: fire the one hedge if the budget and hedge pool allow
+                    hedge_at = None
+                    with self.lock:
+                        if stats.hedged < MAX_HEDGE_RATIO * stats.calls:
+                            stats.hedged += 1
+                            hedged = True
+                    if hedged:
+                        hedge = self._submit_hedge(stats, route.hedge_model, prompt, prefix, remaining)
+                        if hedge is None:
+                            with self.lock:
+                                stats.hedged -= 1
+                            hedged = False
+                            print(f"LLM [{step}]: hedge pool busy, not hedging")
+                        else:
+                            print(f"LLM [{step}]: no valid response after {elapsed:.1f}s, hedging on {route.hedge_model}")
+                            attempts[hedge.future] = hedge
+                if not attempts:
+                    break
+
+                timeout = remaining if hedge_at is None else min(remaining, hedge_at - elapsed)
+                done, _ = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    label = attempts.pop(future).label
+                    try:
+                        response = future.result()
+                        validate(response)
+                    except Exception as e:
+                        last_error = e
+                        print(f"LLM [{step}] {label} attempt failed: {e}")
+                        continue
+                    if hedged:
+                        with self.lock:
+                            if label == "hedge":
+                                stats.hedge_wins += 1
+                            else:
+                                stats.primary_wins += 1
+                    return response
+                if not attempts and hedge_at is not None:
+                    # The primary failed: the hedge doubles as an immediate retry
+                    hedge_at = 0
+        finally:
+            # Losers that haven't started never run
+            for future in attempts:
+                future.cancel()
+
+        with self.lock:
+            if attempts or last_error is None:
+                stats.timeouts += 1
+            else:
+                stats.failures += 1
+        if attempts or last_error is None:
+            raise TimeoutError(f"No valid {step} response within {route.deadline:.0f}s")
+        raise last_error
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {step: stats.snapshot() for step, stats in self.steps.items()}
+
+
+router = ModelRouter()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+ANIPE Mailer
+Streams subscriber lists through merged email templates over pooled, pipelined
+SMTP connections, throttled to provider limits, with a SQLite send ledger for resume
+"""
+
+import os
+import re
+import csv
+import json
+import uuid
+import queue
+import socket
+import sqlite3
+import smtplib
+import hashlib
+import binascii
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.header import Header
+from email.utils import formatdate
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+SMTP_USER = os.environ.get("SMTP_USER")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true" if SMTP_PORT == 587 else "false").lower() == "true"
+FROM_EMAIL = os.environ.get("MAILER_FROM_EMAIL", SMTP_USER or "newsletter@example.com")
+SENDER_NAME = os.environ.get("MAILER_SENDER_NAME", "The ANIPE Team")
+
+# SQLite ledger of every message sent (or failed); point it at a persistent disk
+MAILER_LEDGER = os.environ.get("MAILER_LEDGER", "anipe-mailer.db")
+
+# Provider limits: messages per second overall, and per connection before reconnecting
+DEFAULT_RATE = float(os.environ.get("MAILER_RATE", 10))
+MAX_PER_CONNECTION = int(os.environ.get("MAILER_MAX_PER_CONNECTION", 100))
+
+# Subscribers are checked against the ledger in batches of this size
+LEDGER_BATCH = 500
+
+_FIELD_RE = re.compile(r"\[([A-Za-z][A-Za-z ]*)\]")
+
+# A bare addr-spec; whitespace (so CR/LF), angle brackets and separators would
+# let an address break out of the To: header or the RCPT TO: command
+_ADDRESS_RE = re.compile(r'^[^@\s<>()\[\],;:"\\]+@[^@\s<>()\[\],;:"\\]+$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    message_key TEXT PRIMARY KEY,
+    campaign TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sends_campaign ON sends (campaign, step, status);
+"""
+
+
+def field_name(placeholder: str) -> str:
+    """"First Name" -> "first_name" """
+    return placeholder.strip().lower().replace(" ", "_")
+
+
+class Template:
+    """
+    Email template with [Field Name] placeholders, split once into literal and
+    field parts so merging per subscriber is a single join. Placeholders with
+    no value for a subscriber fall back to `defaults`, else stay as written.
+    """
+
+    def __init__(self, subject: str, body: str, defaults: dict = None):
+        self.defaults = {"first_name": "there", "your_name": SENDER_NAME, **(defaults or {})}
+        self.subject = self._compile(subject)
+        self.body = self._compile(body.strip() + "\n")
+
+    @staticmethod
+    def _compile(text: str) -> list:
+        parts = []
+        position = 0
+        for match in _FIELD_RE.finditer(text):
+            parts.append((False, text[position:match.start()]))
+            parts.append((True, (field_name(match.group(1)), match.group(0))))
+            position = match.end()
+        parts.append((False, text[position:]))
+        return parts
+
+    def _render(self, parts: list, subscriber: dict) -> str:
+        out = []
+        for is_field, value in parts:
+            if is_field:
+                name, original = value
+                out.append(subscriber.get(name) or self.defaults.get(name) or original)
+            else:
+                out.append(value)
+        return "".join(out)
+
+    def render(self, subscriber: dict) -> tuple:
+        return self._render(self.subject, subscriber), self._render(self.body, subscriber)
+
+
+def sequence_templates(emails: list) -> list:
+    """Templates from ContentAutomator.generate_email_sequence output"""
+    return [Template(email["subject"], email["content"]) for email in emails]
+
+
+def newsletter_templates(newsletter: dict) -> list:
+    """Templates from AIIncomeGenerator.create_email_newsletter_template: one issue per subject line"""
+    sections = "\n\n".join(f"{name.replace('_', ' ').title()}\n[{name.replace('_', ' ').title()}]"
+                           for name in newsletter["structure"])
+    body = f"Hi [First Name],\n\n{sections}\n\nTalk soon,\n[Your Name]"
+    return [Template(subject, body) for subject in newsletter["subject_lines"]]
+
+
+def iter_subscribers(path: str):
+    """Stream subscribers from a CSV (with an email column) or JSON lines file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield {field_name(key): value for key, value in row.items() if key}
+
+
+def valid_address(email: str) -> bool:
+    return bool(_ADDRESS_RE.match(email))
+
+
+def message_key(campaign: str, step: int, email: str) -> str:
+    return hashlib.sha1(f"{campaign}\x1f{step}\x1f{email.strip().lower()}".encode("utf-8")).hexdigest()
+
+
+class SendLedger:
+    """
+    Persistent record of sent messages, checked in batches so resuming a 100k
+    run stays fast. Each send is committed as it happens, so a crashed run
+    resumes without re-sending anything it had already delivered.
+    """
+
+    def __init__(self, db_path: str = MAILER_LEDGER):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL commits without an fsync each; a power loss can drop the last few, a crash can't
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def already_sent(self, keys: list) -> set:
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT message_key FROM sends WHERE status = 'sent' AND message_key IN ({','.join('?' * len(keys))})",
+                keys).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, key: str, campaign: str, step: int, email: str, status: str, error: str = None):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO sends VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (key, campaign, step, email, status, error, time.time()))
+
+    def summary(self, campaign: str) -> dict:
+        with self.lock:
+            rows = self.db.execute("SELECT step, status, COUNT(*) FROM sends WHERE campaign = ? GROUP BY step, status",
+                                   (campaign,)).fetchall()
+        summary = {}
+        for step, status, count in rows:
+            summary.setdefault(step, {})[status] = count
+        return summary
+
+
+class Throttle:
+    """Token bucket: `rate` messages per second across all connections, bursts up to `burst`"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class PooledConnection:
+    """One SMTP session; sends with ESMTP PIPELINING (RFC 2920) when the server offers it"""
+
+    def __init__(self, host: str, port: int, user: str = None, password: str = None, starttls: bool = False):
+        self.smtp = smtplib.SMTP(host, port, timeout=30)
+        # Pipelined commands and the message body go out as separate small writes;
+        # without this Nagle's algorithm holds each one back for the server's delayed ACK
+        self.smtp.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.smtp.ehlo()
+        if starttls:
+            self.smtp.starttls()
+            self.smtp.ehlo()
+        if user:
+            self.smtp.login(user, password)
+        self.pipelining = self.smtp.has_extn("pipelining")
+        self.sent = 0
+
+    def send(self, from_email: str, to_email: str, data: bytes):
+        for address in (from_email, to_email):
+            if not valid_address(address):
+                raise ValueError(f"Invalid email address: {address!r}")
+        if not self.pipelining:
+            self.smtp.sendmail(from_email, [to_email], data)
+        else:
+            # MAIL, RCPT and DATA in one write, then their three replies: one round trip instead of three
+            self.smtp.send(f"MAIL FROM:<{from_email}>\r\nRCPT TO:<{to_email}>\r\nDATA\r\n")
+            replies = [self.smtp.getreply() for _ in range(3)]
+            if replies[0][0] != 250 or replies[1][0] not in (250, 251) or replies[2][0] != 354:
+                if replies[2][0] == 354:
+                    self.smtp.send(b".\r\n")  # close the DATA we were let into, then discard
+                    self.smtp.getreply()
+                self.smtp.rset()
+                code, message = next((reply for reply in replies if reply[0] >= 400), replies[-1])
+                raise smtplib.SMTPResponseException(code, message)
+            body = re.sub(rb"(?m)^\.", b"..", data)
+            if not body.endswith(b"\r\n"):
+                body += b"\r\n"
+            self.smtp.send(body + b".\r\n")
+            code, message = self.smtp.getreply()
+            if code != 250:
+                raise smtplib.SMTPDataError(code, message)
+        self.sent += 1
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+
+class SMTPPool:
+    """
+    Reusable SMTP sessions shared by sender threads. A session is recycled
+    after MAX_PER_CONNECTION messages (most providers cap this) or on error.
+    """
+
+    def __init__(self, size: int = 4, host: str = SMTP_HOST, port: int = SMTP_PORT, user: str = SMTP_USER,
+                 password: str = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS,
+                 max_per_connection: int = MAX_PER_CONNECTION):
+        self.settings = (host, port, user, password, starttls)
+        self.max_per_connection = max_per_connection
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    @contextmanager
+    def connection(self):
+        self.slots.acquire()
+        try:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = PooledConnection(*self.settings)
+                self.opened += 1
+            try:
+                yield connection
+            except Exception:
+                connection.close()
+                raise
+            if connection.sent >= self.max_per_connection:
+                connection.close()
+            else:
+                self.idle.put(connection)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def build_message(from_email: str, to_email: str, subject: str, body: str) -> bytes:
+    """
+    Plain-text UTF-8 message with a quoted-printable body, assembled directly:
+    EmailMessage.as_bytes costs ~1.5 ms per message, which capped a single
+    sender at a few hundred messages per second.
+    Addresses must pass valid_address; line breaks in the merged subject are
+    folded to spaces, so subscriber fields can't inject headers.
+    """
+    for address in (from_email, to_email):
+        if not valid_address(address):
+            raise ValueError(f"Invalid email address: {address!r}")
+    subject = " ".join(subject.splitlines())
+    if not subject.isascii():
+        subject = Header(subject, "utf-8").encode(linesep="\r\n")
+    domain = from_email.rpartition("@")[2] or "localhost"
+    headers = (
+        f"Subject: {subject}\r\nFrom: {from_email}\r\nTo: {to_email}\r\n"
+        f"Date: {formatdate()}\r\nMessage-ID: <{uuid.uuid4().hex}@{domain}>\r\nMIME-Version: 1.0\r\n"
+        "Content-Type: text/plain; charset=\"utf-8\"\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n"
+    )
+    encoded = binascii.b2a_qp(body.encode("utf-8"), istext=True)
+    return headers.encode("ascii") + encoded.replace(b"\n", b"\r\n")
+
+
+class DeliveryEngine:
+    """
+    Sends one template to a stream of subscribers. Subscribers are read in
+    batches, checked against the ledger, merged and handed to `workers`
+    sender threads through a bounded queue, so memory stays flat however
+    long the list is.
+    """
+
+    def __init__(self, pool: SMTPPool, ledger: SendLedger, throttle: Throttle, workers: int = 4,
+                 from_email: str = FROM_EMAIL, attempts: int = 3):
+        self.pool = pool
+        self.ledger = ledger
+        self.throttle = throttle
+        self.workers = workers
+        self.from_email = from_email
+        self.attempts = attempts
+
+    def _send(self, to_email: str, data: bytes):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with self.pool.connection() as connection:
+                    connection.send(self.from_email, to_email, data)
+                return
+            except smtplib.SMTPResponseException as e:
+                # 5xx is permanent (bad address, policy); 4xx and dropped connections are retried
+                if e.smtp_code >= 500 or attempt == self.attempts:
+                    raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                if attempt == self.attempts:
+                    raise
+            time.sleep(2 ** attempt)
+
+    def send_campaign(self, campaign: str, step: int, template: Template, subscribers, progress_every: int = 5000) -> dict:
+        stats = {"sent": 0, "failed": 0, "skipped": 0, "invalid": 0}
+        latencies = deque(maxlen=10000)
+        work = queue.Queue(maxsize=self.workers * 50)
+        stats_lock = threading.Lock()
+        started = time.perf_counter()
+
+        def sender():
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                key, email, data = item
+                self.throttle.acquire()
+                sent_started = time.perf_counter()
+                try:
+                    self._send(email, data)
+                    status, error = "sent", None
+                except Exception as e:
+                    status, error = "failed", f"{type(e).__name__}: {e}"
+                self.ledger.record(key, campaign, step, email, status, error)
+                with stats_lock:
+                    stats[status] += 1
+                    latencies.append(time.perf_counter() - sent_started)
+                    done = stats["sent"] + stats["failed"]
+                    if progress_every and done % progress_every == 0:
+                        elapsed = time.perf_counter() - started
+                        print(f"[{campaign} #{step}] {done} messages, {done / elapsed:.1f} msg/s")
+
+        threads = [threading.Thread(target=sender, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        def batches():
+            batch = []
+            for subscriber in subscribers:
+                batch.append(subscriber)
+                if len(batch) == LEDGER_BATCH:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        try:
+            for batch in batches():
+                keyed = []
+                for subscriber in batch:
+                    email = (subscriber.get("email") or "").strip()
+                    if not valid_address(email):
+                        stats["invalid"] += 1
+                        continue
+                    keyed.append((message_key(campaign, step, email), email, subscriber))
+                done = self.ledger.already_sent([key for key, _, _ in keyed]) if keyed else set()
+                for key, email, subscriber in keyed:
+                    if key in done:
+                        stats["skipped"] += 1
+                        continue
+                    subject, body = template.render(subscriber)
+                    work.put((key, email, build_message(self.from_email, email, subject, body)))
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - started
+        ordered = sorted(latencies)
+        stats.update({
+            "seconds": round(elapsed, 2),
+            "messages_per_second": round((stats["sent"] + stats["failed"]) / elapsed, 1) if elapsed else None,
+            "send_p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+            "send_p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 1) if ordered else None,
+            "connections_opened": self.pool.opened,
+        })
+        return stats
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+ANIPE Markdown Renderer
+Single-pass Markdown parser that turns Gemini output into ReportLab flowables
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus.flowables import HRFlowable
+
+# Parsed documents kept per process, keyed by content hash
+PARSE_CACHE_SIZE = 64
+
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+parse_stats = {"parses": 0, "cache_hits": 0, "lines": 0, "seconds": 0.0}
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET_RE = re.compile(r"^(\s*)([-*+])\s+(.*)$")
+_ORDERED_RE = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+
+# Code spans and links are atomic; emphasis delimiters go through a stack so tags always nest
+_INLINE_TOKEN_RE = re.compile(r"`([^`]+)`|\[([^\]]+)\]\((https?://[^)\s]+)\)|\*\*\*|___|\*\*|__|\*|_")
+_EMPHASIS_TAGS = {"**": "b", "__": "b", "*": "i", "_": "i"}
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char in "_*"
+
+
+def render_inline(text: str) -> str:
+    """
+    Escape text for ReportLab's paragraph parser and convert inline Markdown
+    in one left-to-right pass. Unmatched or crossed delimiters stay literal,
+    so the markup is always well-formed.
+    """
+    out = []
+    stack = []  # (delimiter, index of its placeholder in out)
+    open_counts = {delimiter: 0 for delimiter in _EMPHASIS_TAGS}
+    pos = 0
+
+    def can_close(delimiter, before, after):
+        return open_counts[delimiter] and not before.isspace() and not (len(delimiter) == 1 and _is_word(after))
+
+    def emphasis(delimiter, before, after):
+        if can_close(delimiter, before, after):
+            # Close it; openers left inside it were never closed and fall back to literal text
+            while stack[-1][0] != delimiter:
+                open_counts[stack.pop()[0]] -= 1
+            _, index = stack.pop()
+            open_counts[delimiter] -= 1
+            out[index] = f"<{_EMPHASIS_TAGS[delimiter]}>"
+            out.append(f"</{_EMPHASIS_TAGS[delimiter]}>")
+        elif not after.isspace() and not (len(delimiter) == 1 and _is_word(before)):
+            stack.append((delimiter, len(out)))
+            open_counts[delimiter] += 1
+            out.append(delimiter)
+        else:
+            out.append(delimiter)
+
+    for match in _INLINE_TOKEN_RE.finditer(text):
+        out.append(escape(text[pos:match.start()]))
+        pos = match.end()
+
+        if match.group(1) is not None:
+            out.append(f'<font face="Courier">{escape(match.group(1))}</font>')
+            continue
+        if match.group(2) is not None:
+            url = escape(match.group(3), {'"': "&quot;"})
+            out.append(f'<link href="{url}" color="blue">{render_inline(match.group(2))}</link>')
+            continue
+
+        delimiter = match.group(0)
+        before = text[match.start() - 1] if match.start() else " "
+        after = text[match.end()] if match.end() < len(text) else " "
+
+        if len(delimiter) == 3:
+            # ***both*** is a strong and an emphasis run: open strong first, close the innermost first
+            strong, single = delimiter[:2], delimiter[0]
+            parts = [strong, single]
+            if can_close(strong, before, after) and can_close(single, before, after):
+                innermost = next(d for d, _ in reversed(stack) if d in parts)
+                parts = [innermost, strong if innermost == single else single]
+            for part in parts:
+                emphasis(part, before, after)
+        else:
+            emphasis(delimiter, before, after)
+
+    out.append(escape(text[pos:]))
+    return "".join(out)
+
+
+def _paragraph(text: str, style, **kwargs) -> Paragraph:
+    """Paragraph from inline Markdown, falling back to plain text if ReportLab rejects the markup"""
+    try:
+        return Paragraph(render_inline(text), style, **kwargs)
+    except ValueError as e:
+        print(f"MARKDOWN: falling back to plain text: {e}")
+        return Paragraph(escape(text), style, **kwargs)
+
+
+def _split_row(line: str) -> list:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown(content: str) -> list:
+    """
+    Parse Markdown into a flat list of blocks in one pass over the lines:
+    ("heading", level, text), ("paragraph", text), ("item", ordered, number, level, text),
+    ("table", rows), ("code", text) and ("rule",).
+    """
+    blocks = []
+    paragraph = []
+    table = []
+    code = None
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append(("paragraph", " ".join(paragraph)))
+            paragraph.clear()
+
+    def flush_table():
+        if table:
+            blocks.append(("table", [list(row) for row in table]))
+            table.clear()
+
+    for line in content.splitlines():
+        # Fenced code blocks are kept verbatim
+        if line.lstrip().startswith("```"):
+            if code is None:
+                flush_paragraph()
+                flush_table()
+                code = []
+            else:
+                blocks.append(("code", "\n".join(code)))
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+
+        stripped = line.strip()
+
+        if stripped.startswith("|") and stripped.count("|") >= 2:
+            flush_paragraph()
+            if not _TABLE_SEPARATOR_RE.match(stripped):
+                table.append(_split_row(stripped))
+            continue
+        flush_table()
+
+        if not stripped:
+            flush_paragraph()
+            continue
+
+        match = _HEADING_RE.match(stripped)
+        if match:
+            flush_paragraph()
+            blocks.append(("heading", len(match.group(1)), match.group(2)))
+            continue
+
+        if _RULE_RE.match(stripped):
+            flush_paragraph()
+            blocks.append(("rule",))
+            continue
+
+        match = _BULLET_RE.match(line)
+        if match:
+            flush_paragraph()
+            blocks.append(("item", False, 0, len(match.group(1).expandtabs(4)) // 2, match.group(3)))
+            continue
+
+        match = _ORDERED_RE.match(line)
+        if match:
+            flush_paragraph()
+            blocks.append(("item", True, int(match.group(2)), len(match.group(1).expandtabs(4)) // 2, match.group(3)))
+            continue
+
+        paragraph.append(stripped)
+
+    flush_paragraph()
+    flush_table()
+    if code is not None:
+        blocks.append(("code", "\n".join(code)))
+    return blocks
+
+
+def parse_markdown_cached(content: str, content_hash: str) -> list:
+    """Parse content, reusing the result for content already parsed in this process"""
+    with _parse_cache_lock:
+        blocks = _parse_cache.get(content_hash)
+        if blocks is not None:
+            _parse_cache.move_to_end(content_hash)
+            parse_stats["cache_hits"] += 1
+            return blocks
+
+    # Parsed outside the lock; two threads parsing the same content both store the same blocks
+    started = time.perf_counter()
+    blocks = parse_markdown(content)
+    elapsed = time.perf_counter() - started
+    print(f"MARKDOWN: parsed {content.count(chr(10)) + 1} lines into {len(blocks)} blocks in {elapsed * 1000:.1f} ms")
+
+    with _parse_cache_lock:
+        parse_stats["parses"] += 1
+        parse_stats["lines"] += content.count("\n") + 1
+        parse_stats["seconds"] += elapsed
+        _parse_cache[content_hash] = blocks
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return blocks
+
+
+def blocks_to_flowables(blocks: list, styles: dict, width: float) -> list:
+    """
+    Convert parsed blocks into ReportLab flowables.
+    `styles` needs "h1", "h2", "h3", "body" and "code" ParagraphStyles.
+    """
+    body = styles["body"]
+    item_styles = {}
+    story = []
+
+    for block in blocks:
+        kind = block[0]
+        if kind == "heading":
+            level = block[1]
+            style = styles["h1"] if level == 1 else styles["h2"] if level == 2 else styles["h3"]
+            story.append(_paragraph(block[2], style))
+        elif kind == "paragraph":
+            story.append(_paragraph(block[1], body))
+            story.append(Spacer(1, 6))
+        elif kind == "item":
+            _, ordered, number, level, text = block
+            style = item_styles.get(level)
+            if style is None:
+                style = ParagraphStyle(f"ListItem{level}", parent=body, leftIndent=18 + 14 * level,
+                                       bulletIndent=6 + 14 * level, spaceAfter=2)
+                item_styles[level] = style
+            story.append(_paragraph(text, style, bulletText=f"{number}." if ordered else "•"))
+        elif kind == "table":
+            rows = block[1]
+            columns = max(len(row) for row in rows)
+            cells = [[_paragraph(cell, body) for cell in row + [""] * (columns - len(row))] for row in rows]
+            table = Table(cells, colWidths=[width / columns] * columns, repeatRows=1)
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ecf0f1')),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ]))
+            story.append(table)
+            story.append(Spacer(1, 10))
+        elif kind == "code":
+            story.append(Paragraph(escape(block[1]).replace("\n", "<br/>"), styles["code"]))
+            story.append(Spacer(1, 6))
+        elif kind == "rule":
+            story.append(HRFlowable(width="100%", color=colors.HexColor('#bdc3c7'), spaceBefore=6, spaceAfter=6))
+
+    return story
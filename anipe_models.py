@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+ANIPE Domain Model
+Compact shared Opportunity and ProductDocument types with derived fields computed once
+"""
+
+import re
+import hashlib
+
+from anipe_json import dumps_text as _dumps, loads as _loads
+
+_SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+# Markdown headings or numbered uppercase ones ("1. EXECUTIVE SUMMARY"), as in anipe_prompts.split_sections
+_SECTION_RE = re.compile(r"^(#{1,6})\s+(.*)$|^(\d+)\.\s+([A-Z][A-Z &/\-]+)$", re.MULTILINE)
+
+SLUG_MAX_LENGTH = 50
+
+
+def slugify(text: str, max_length: int = SLUG_MAX_LENGTH) -> str:
+    """Make a filesystem/URL safe slug: ASCII letters, digits and underscores only"""
+    slug = _SLUG_RE.sub("_", text or "").strip("_")[:max_length].rstrip("_")
+    return slug or "untitled"
+
+
+class Opportunity:
+    """A niche opportunity as produced by the opportunity identifier"""
+
+    __slots__ = (
+        "niche_topic", "problem_statement", "target_audience", "product_idea",
+        "keywords", "revenue_potential", "market_validation", "confidence_score",
+        "ai_powered", "status", "extra", "slug",
+    )
+
+    # Defaults used when a field is missing, shared by every service
+    DEFAULTS = {
+        "niche_topic": "Digital Report",
+        "problem_statement": "Industry challenges",
+        "target_audience": "Professional audience",
+        "product_idea": "a detailed report",
+        "revenue_potential": "",
+        "market_validation": "",
+        "confidence_score": 0.0,
+        "ai_powered": False,
+        "status": "success",
+    }
+
+    def __init__(self, niche_topic=None, problem_statement=None, target_audience=None,
+                 product_idea=None, keywords=None, revenue_potential=None,
+                 market_validation=None, confidence_score=None, ai_powered=None,
+                 status=None, extra=None):
+        defaults = self.DEFAULTS
+        self.niche_topic = niche_topic or defaults["niche_topic"]
+        self.problem_statement = problem_statement or defaults["problem_statement"]
+        self.target_audience = target_audience or defaults["target_audience"]
+        self.product_idea = product_idea or defaults["product_idea"]
+        self.keywords = list(keywords) if isinstance(keywords, (list, tuple)) else []
+        self.revenue_potential = revenue_potential or defaults["revenue_potential"]
+        self.market_validation = market_validation or defaults["market_validation"]
+        self.confidence_score = confidence_score if confidence_score is not None else defaults["confidence_score"]
+        self.ai_powered = bool(ai_powered) if ai_powered is not None else defaults["ai_powered"]
+        self.status = status or defaults["status"]
+        # Fields the model doesn't know about are carried through untouched
+        self.extra = dict(extra) if extra else {}
+        self.slug = slugify(self.niche_topic)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Opportunity":
+        """
+        Build an Opportunity from a dict. Accepts either the opportunity itself
+        or an /identify response envelope with the opportunity under "opportunity".
+        """
+        data = data or {}
+        if "niche_topic" not in data and isinstance(data.get("opportunity"), dict):
+            data = data["opportunity"]
+        known = {name: data.get(name) for name in cls.__slots__ if name not in ("extra", "slug")}
+        extra = {key: value for key, value in data.items() if key not in known}
+        return cls(extra=extra, **known)
+
+    def to_dict(self) -> dict:
+        data = dict(self.extra)
+        for name in self.__slots__:
+            if name not in ("extra", "slug"):
+                data[name] = getattr(self, name)
+        return data
+
+    @classmethod
+    def from_json(cls, data) -> "Opportunity":
+        return cls.from_dict(_loads(data))
+
+    def to_json(self) -> str:
+        return _dumps(self.to_dict())
+
+    def __repr__(self):
+        return f"Opportunity({self.niche_topic!r})"
+
+
+class ProductDocument:
+    """Generated product content with its word count, hash and section offsets"""
+
+    __slots__ = ("content", "word_count", "content_hash", "sections")
+
+    def __init__(self, content: str, word_count: int = None, content_hash: str = None, sections: list = None):
+        self.content = content or ""
+        self.word_count = word_count if word_count is not None else len(self.content.split())
+        self.content_hash = content_hash or hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+        # (heading, start, end) character offsets of each Markdown section. An empty
+        # stored list may predate numbered-heading support, so it is recomputed
+        self.sections = sections if sections else self._find_sections(self.content)
+
+    @staticmethod
+    def _find_sections(content: str) -> list:
+        matches = list(_SECTION_RE.finditer(content))
+        sections = []
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+            sections.append(((match.group(2) or match.group(4)).strip(), match.start(), end))
+        return sections
+
+    def section_text(self, index: int) -> str:
+        """Return the text of one section, heading included"""
+        _, start, end = self.sections[index]
+        return self.content[start:end]
+
+    @property
+    def short_hash(self) -> str:
+        return self.content_hash[:12]
+
+    def to_dict(self) -> dict:
+        return {
+            "content": self.content,
+            "word_count": self.word_count,
+            "content_hash": self.content_hash,
+            "sections": [list(section) for section in self.sections],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProductDocument":
+        sections = data.get("sections")
+        return cls(
+            data.get("content", ""),
+            word_count=data.get("word_count"),
+            content_hash=data.get("content_hash"),
+            sections=[tuple(section) for section in sections] if sections is not None else None,
+        )
+
+    @classmethod
+    def from_json(cls, data) -> "ProductDocument":
+        return cls.from_dict(_loads(data))
+
+    def to_json(self) -> str:
+        return _dumps(self.to_dict())
+
+    def __len__(self):
+        return len(self.content)
+
+    def __repr__(self):
+        return f"ProductDocument({self.word_count} words, {len(self.sections)} sections, {self.short_hash})"
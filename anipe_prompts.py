@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+ANIPE Prompt Compiler
+Builds LLM prompts with local token counting and per-step token budgets
+"""
+
+import os
+import re
+import json
+import math
+from functools import lru_cache
+
+# Input budgets (tokens) for the variable part of each prompt.
+# Override per step with PROMPT_BUDGET_<STEP>, e.g. PROMPT_BUDGET_SALES_COPY=1200
+DEFAULT_STEP_BUDGETS = {
+    "identify": 800,
+    "product": 600,
+    "sales_copy": 700,
+    "social": 300,
+}
+
+# Roughly how many model tokens one word/punctuation piece costs.
+# Calibrated at runtime from the usage metadata Gemini returns.
+DEFAULT_TOKENS_PER_PIECE = 1.3
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$|^(\d+)\.\s+([A-Z][A-Z &/\-]+)$", re.MULTILINE)
+
+
+@lru_cache(maxsize=2048)
+def _count_pieces(text: str) -> int:
+    """Count word and punctuation pieces in text (cached by content)"""
+    return sum(1 for _ in _PIECE_RE.finditer(text))
+
+
+class TokenEstimator:
+    """Local token estimator calibrated against the provider's reported counts"""
+
+    def __init__(self, tokens_per_piece: float = DEFAULT_TOKENS_PER_PIECE, smoothing: float = 0.2):
+        self.tokens_per_piece = tokens_per_piece
+        self.smoothing = smoothing
+        self.samples = 0
+
+    def count(self, text: str) -> int:
+        """Estimate the number of tokens in text"""
+        if not text:
+            return 0
+        return int(math.ceil(_count_pieces(text) * self.tokens_per_piece))
+
+    def observe(self, text: str, actual_tokens: int):
+        """Calibrate the estimator with a real token count for text"""
+        pieces = _count_pieces(text) if text else 0
+        if not pieces or not actual_tokens:
+            return
+        ratio = actual_tokens / pieces
+        if self.samples == 0:
+            self.tokens_per_piece = ratio
+        else:
+            self.tokens_per_piece += self.smoothing * (ratio - self.tokens_per_piece)
+        self.samples += 1
+
+
+estimator = TokenEstimator()
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in text using the shared estimator"""
+    return estimator.count(text)
+
+
+def get_step_budget(step: str) -> int:
+    """Return the input token budget for a pipeline step"""
+    env_value = os.environ.get(f"PROMPT_BUDGET_{step.upper()}")
+    if env_value:
+        try:
+            return int(env_value)
+        except ValueError:
+            print(f"Warning: invalid PROMPT_BUDGET_{step.upper()}={env_value!r}, using default")
+    return DEFAULT_STEP_BUDGETS.get(step, 800)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Trim text to fit a token budget, cutting at a paragraph or sentence boundary"""
+    if count_tokens(text) <= budget:
+        return text
+
+    # Keep as many pieces as the budget allows (leaving room for the "..." pieces)
+    # and cut after the last one, in a single pass over the text
+    keep = max(int(budget / estimator.tokens_per_piece) - 3, 0)
+    end = 0
+    for index, match in enumerate(_PIECE_RE.finditer(text)):
+        if index == keep:
+            break
+        end = match.end()
+    prefix = text[:end]
+
+    # Prefer a clean break if one exists in the last third of the prefix
+    for separator in ("\n\n", ". ", "\n", " "):
+        cut = prefix.rfind(separator)
+        if cut > len(prefix) * 2 // 3:
+            return prefix[:cut + (1 if separator == ". " else 0)].rstrip() + "..."
+    return prefix.rstrip() + "..."
+
+
+def split_sections(content: str) -> list:
+    """
+    Split Markdown-ish content into (heading, body) sections.
+    Text before the first heading is returned with an empty heading.
+    """
+    sections = []
+    matches = list(_HEADING_RE.finditer(content))
+    if not matches:
+        return [("", content.strip())] if content.strip() else []
+
+    preamble = content[:matches[0].start()].strip()
+    if preamble:
+        sections.append(("", preamble))
+    for i, match in enumerate(matches):
+        heading = (match.group(2) or match.group(4) or "").strip()
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        body = content[match.end():end].strip()
+        sections.append((heading, body))
+    return sections
+
+
+def sections_from_offsets(content: str, offsets: list) -> list:
+    """(heading, body) sections from ProductDocument.sections (heading, start, end) offsets"""
+    if not offsets:
+        return [("", content.strip())] if content.strip() else []
+    sections = []
+    preamble = content[:offsets[0][1]].strip()
+    if preamble:
+        sections.append(("", preamble))
+    for heading, start, end in offsets:
+        # The heading line itself is rendered from `heading`
+        body = content[start:end].partition("\n")[2].strip()
+        sections.append((heading, body))
+    return sections
+
+
+def select_sections(content: str, budget: int, keywords: list = None, sections: list = None) -> str:
+    """
+    Pick the most relevant sections of content that fit in a token budget.
+    The head of the opening section is always kept, the rest are ranked by
+    keyword overlap and emitted in their original order. Pass a
+    ProductDocument's `sections` offsets to reuse its split instead of
+    re-parsing the content.
+    """
+    if count_tokens(content) <= budget:
+        return content
+
+    sections = sections_from_offsets(content, sections) if sections is not None else split_sections(content)
+    if not sections:
+        return ""
+
+    terms = {term.lower() for keyword in (keywords or []) for term in re.findall(r"\w+", keyword) if len(term) > 2}
+
+    def render(section):
+        heading, body = section
+        return f"## {heading}\n{body}" if heading else body
+
+    def score(index):
+        heading, body = sections[index]
+        text = f"{heading} {body}".lower()
+        hits = sum(text.count(term) for term in terms)
+        # Favour dense sections and earlier sections on ties
+        return (hits / max(count_tokens(body), 1), -index)
+
+    # The opening section may use at most a third of the budget
+    lead = truncate_to_tokens(render(sections[0]), budget // 3)
+    chosen = {0}
+    remaining = budget - count_tokens(lead)
+
+    for index in sorted(range(1, len(sections)), key=score, reverse=True):
+        cost = count_tokens(render(sections[index])) + 1
+        if cost <= remaining:
+            chosen.add(index)
+            remaining -= cost
+
+    parts = [lead] + [render(sections[i]) for i in sorted(chosen) if i != 0]
+
+    # Fill leftover budget with the head of the best section that didn't fit
+    leftovers = [i for i in sorted(range(1, len(sections)), key=score, reverse=True) if i not in chosen]
+    if leftovers and remaining > 50:
+        parts.append(truncate_to_tokens(render(sections[leftovers[0]]), remaining))
+
+    return "\n\n".join(parts)
+
+
+def select_items(items: list, budget: int) -> str:
+    """Serialize list items as compact JSON lines, keeping as many as fit in a token budget"""
+    lines = []
+    used = 0
+    for item in items:
+        line = json.dumps(item, separators=(",", ":"), ensure_ascii=False)
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            if not lines:
+                # Better a truncated first item than no context at all
+                lines.append(truncate_to_tokens(line, budget - 1))
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+def compile_prompt(step: str, template: str, **fields) -> str:
+    """
+    Fill a prompt template, holding its field values to the step's token budget,
+    and log its estimated token size. Trim fields with select_sections/select_items
+    first to choose what is kept; anything still over budget is truncated here,
+    longest fields first, so short fields (URLs, names) stay whole.
+    """
+    budget = get_step_budget(step)
+    costs = {name: count_tokens(value) for name, value in fields.items() if isinstance(value, str)}
+    used = sum(costs.values())
+    if used > budget:
+        # Each field gets an equal share of what the shorter ones leave over
+        remaining = budget
+        for position, name in enumerate(sorted(costs, key=costs.get)):
+            share = remaining // (len(costs) - position)
+            if costs[name] > share:
+                fields[name] = truncate_to_tokens(fields[name], share)
+            remaining -= min(costs[name], share)
+        print(f"PROMPT [{step}]: inputs ~{used} tokens over budget {budget}, truncated")
+
+    prompt = template.format(**fields)
+    print(f"PROMPT [{step}]: ~{count_tokens(prompt)} tokens (budget {budget} for inputs)")
+    return prompt
+
+
+def log_response(step: str, prompt: str, response) -> dict:
+    """
+    Log prompt/response token sizes for a Gemini response and calibrate the estimator
+    when the response carries usage metadata.
+    """
+    text = getattr(response, "text", "") or ""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) if usage else None
+    response_tokens = getattr(usage, "candidates_token_count", None) if usage else None
+    cached_tokens = getattr(usage, "cached_content_token_count", None) if usage else None
+
+    if prompt_tokens:
+        estimator.observe(prompt, prompt_tokens)
+    if response_tokens:
+        estimator.observe(text, response_tokens)
+
+    stats = {
+        "step": step,
+        "prompt_tokens": prompt_tokens or count_tokens(prompt),
+        "response_tokens": response_tokens or count_tokens(text),
+        "cached_tokens": cached_tokens or 0,
+        "estimated": not (prompt_tokens and response_tokens),
+    }
+    print(f"TOKENS [{step}]: prompt={stats['prompt_tokens']} response={stats['response_tokens']}"
+          f"{f' cached={cached_tokens}' if cached_tokens else ''}{' (estimated)' if stats['estimated'] else ''}")
+    return stats
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+ANIPE Publishing Helpers
+Uploads precompressed, cache-friendly public assets to Google Cloud Storage
+"""
+
+import gzip
+import hashlib
+
+from google.api_core.exceptions import PreconditionFailed
+
+from anipe_resilience import get_breaker
+
+# Published objects never change once written (names carry timestamps or hashes)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Objects that are rewritten in place (indexes, sitemaps) must be revalidated
+SHORT_CACHE_CONTROL = "public, max-age=300"
+
+PUBLIC_ACL = "publicRead"
+
+gcs_breaker = get_breaker("gcs")
+
+# Content-hashed assets already known to exist in the bucket (per process)
+_published_assets = set()
+
+
+def content_hash(data, length: int = 12) -> str:
+    """Return a short, stable hex digest of data"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def upload_compressed(bucket, blob_name: str, data, content_type: str,
+                      cache_control: str = IMMUTABLE_CACHE_CONTROL,
+                      predefined_acl: str = PUBLIC_ACL,
+                      if_generation_match: int = None,
+                      metadata: dict = None):
+    """
+    Upload data gzip-encoded with cache headers and ACL in a single request.
+    GCS transcodes the gzip object for clients that don't send Accept-Encoding: gzip.
+    `metadata` is set as custom object metadata. Returns the blob.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    blob = bucket.blob(blob_name)
+    blob.cache_control = cache_control
+    blob.content_encoding = "gzip"
+    blob.metadata = metadata
+    upload_kwargs = {"content_type": content_type, "predefined_acl": predefined_acl}
+    if if_generation_match is not None:
+        upload_kwargs["if_generation_match"] = if_generation_match
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    gcs_breaker.call(blob.upload_from_string, compressed, **upload_kwargs)
+
+    print(f"Published {blob_name}: {len(data)} bytes raw, {len(compressed)} gzip")
+    return blob
+
+
+def publish_hashed_asset(bucket, prefix: str, name: str, extension: str, data, content_type: str) -> str:
+    """
+    Publish an immutable asset under a content-hashed name, uploading it only once.
+    Returns the blob name (e.g. `sales-pages/assets/base-1a2b3c4d5e6f.css`).
+    """
+    blob_name = f"{prefix}/{name}-{content_hash(data)}.{extension}"
+    if blob_name in _published_assets:
+        return blob_name
+
+    try:
+        # if_generation_match=0 only writes when the object doesn't exist yet
+        upload_compressed(bucket, blob_name, data, content_type, if_generation_match=0)
+    except PreconditionFailed:
+        pass
+
+    _published_assets.add(blob_name)
+    return blob_name
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+ANIPE Resilience
+Per-dependency circuit breakers (closed / open / half-open) over a rolling
+failure window, so calls to a degraded Gemini, Stripe, GCS or social API
+fail fast instead of tying up workers on timeouts and retries
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import anipe_cassette
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DEFAULT_BREAKER_SETTINGS = {
+    "window_seconds": 60.0,        # Rolling window for the failure rate
+    "min_calls": 10,               # The failure rate only trips once the window holds this many calls
+    "failure_rate": 0.5,
+    "consecutive_failures": 3,     # Trips regardless of volume; the pipeline is low traffic
+    "open_seconds": 30.0,          # First cool-down, doubled after each failed probe
+    "max_open_seconds": 300.0,
+    "slow_call_seconds": 0,        # Successful calls slower than this count as failures (0 = off)
+}
+
+# Per-dependency overrides; any setting can also be set as BREAKER_<NAME>_<SETTING>,
+# e.g. BREAKER_STRIPE_OPEN_SECONDS=60
+BREAKER_SETTINGS = {
+    "gemini": {"slow_call_seconds": 180.0},
+    "stripe": {"slow_call_seconds": 20.0},
+    "gcs": {"consecutive_failures": 5},
+    "twitter": {"open_seconds": 60.0},
+    "linkedin": {"open_seconds": 60.0},
+}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(error: Exception) -> bool:
+    """
+    Whether an exception says the dependency is unhealthy. Client errors
+    (4xx other than 408/429: not found, precondition failed, bad request)
+    mean it answered, so they don't count against it.
+    """
+    code = getattr(error, "http_status", None) or getattr(error, "status_code", None) or getattr(error, "code", None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return True
+    return not (400 <= code < 500 and code not in (408, 429))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and outcomes are recorded. Open: calls are rejected
+    immediately until the cool-down passes. Half-open: one probe call is let
+    through; success closes the breaker, failure reopens it for longer.
+    """
+
+    def __init__(self, name: str, window_seconds: float, min_calls: int, failure_rate: float,
+                 consecutive_failures: int, open_seconds: float, max_open_seconds: float,
+                 slow_call_seconds: float = 0, is_failure=is_dependency_failure):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.is_failure = is_failure
+
+        self.state = CLOSED
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0
+        self.probing = False
+        self.events = deque()  # (monotonic time, 1 if failed else 0)
+        self.window_failures = 0
+        self.consecutive = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.events and self.events[0][0] < cutoff:
+            self.window_failures -= self.events.popleft()[1]
+
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self.opened_at = now
+        self.probing = False
+        self.times_opened += 1
+        print(f"Circuit {self.name} OPEN for {self.open_seconds:.0f}s: {reason}")
+
+    def allow(self) -> bool:
+        """Admit a call? Cheap enough to run before every request"""
+        if self.state == CLOSED:
+            return True
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            if self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def check(self):
+        """Raise CircuitOpenError unless a call is admitted"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self, seconds: float = None):
+        if self.slow_call_seconds and seconds is not None and seconds > self.slow_call_seconds:
+            self.record_failure(f"slow call ({seconds:.1f}s)")
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.events.append((now, 0))
+            self._prune(now)
+            self.consecutive = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.probing = False
+                self.open_seconds = self.base_open_seconds
+                self.events.clear()
+                self.window_failures = 0
+                print(f"Circuit {self.name} closed")
+
+    def record_failure(self, reason: str = "failure"):
+        with self.lock:
+            now = time.monotonic()
+            self.events.append((now, 1))
+            self.window_failures += 1
+            self.consecutive += 1
+            self._prune(now)
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+                self._open(now, f"probe failed ({reason})")
+            elif self.state == CLOSED:
+                calls = len(self.events)
+                if self.consecutive >= self.consecutive_failures:
+                    self._open(now, f"{self.consecutive} consecutive failures ({reason})")
+                elif calls >= self.min_calls and self.window_failures / calls >= self.failure_rate:
+                    self._open(now, f"{self.window_failures}/{calls} calls failed ({reason})")
+
+    def observe(self, fn, *args, **kwargs):
+        """Run fn (through the active cassette, if any) and record its outcome, without the admission check"""
+        started = time.monotonic()
+        try:
+            result = anipe_cassette.call(self.name, fn, *args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(f"{type(e).__name__}: {e}")
+            else:
+                self.record_success()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker; raises CircuitOpenError without calling it when open"""
+        self.check()
+        return self.observe(fn, *args, **kwargs)
+
+    @contextmanager
+    def guard(self):
+        """`with breaker.guard():` around a block of calls to the dependency"""
+        self.check()
+        started = time.monotonic()
+        try:
+            yield self
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(f"{type(e).__name__}: {e}")
+            else:
+                self.record_success()
+            raise
+        self.record_success(time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self._prune(time.monotonic())
+            calls = len(self.events)
+            return {
+                "state": self.state,
+                "calls_in_window": calls,
+                "failure_rate": round(self.window_failures / calls, 3) if calls else 0.0,
+                "consecutive_failures": self.consecutive,
+                "retry_after_seconds": round(self.retry_after(), 1),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+def _settings(name: str) -> dict:
+    settings = dict(DEFAULT_BREAKER_SETTINGS, **BREAKER_SETTINGS.get(name, {}))
+    for key, default in settings.items():
+        value = os.environ.get(f"BREAKER_{name.upper()}_{key.upper()}")
+        if value:
+            try:
+                settings[key] = type(default)(float(value))
+            except ValueError:
+                print(f"Warning: invalid BREAKER_{name.upper()}_{key.upper()}={value!r}, using default")
+    return settings
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for a dependency, created on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name, **_settings(name))
+    return breaker
+
+
+def breaker_states() -> dict:
+    """Snapshot of every breaker in this process, for /health"""
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+ANIPE Post Scheduler
+Persistent heap-based social post queue, paced against each platform's rate limits
+"""
+
+import os
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+# SQLite file holding the queue; point it at a mounted volume to survive restarts
+SCHEDULER_DB = os.environ.get("SCHEDULER_DB", "/tmp/anipe-scheduler.db")
+
+# Due posts taken off the heap per dispatch pass
+BATCH_SIZE = 20
+
+# Gap between posts on a platform when it sends no rate limit headers (seconds)
+DEFAULT_MIN_INTERVAL = 60
+
+# Failed (non rate limited) posts are retried with exponential backoff this many times
+MAX_ATTEMPTS = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    content TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 5,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    source TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    posted_at REAL
+);
+CREATE INDEX IF NOT EXISTS posts_pending ON posts (status, due_at);
+"""
+
+
+def _header(headers, name):
+    value = headers.get(name) if headers else None
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit_headers(headers) -> dict:
+    """Pick the x-rate-limit-* (and Retry-After) headers out of an HTTP response"""
+    return {name: headers[name] for name in ("x-rate-limit-limit", "x-rate-limit-remaining",
+                                             "x-rate-limit-reset", "retry-after") if name in headers}
+
+
+class PlatformPacer:
+    """
+    Tracks one platform's rate limit window and hands out evenly spaced send times.
+    With `remaining` requests left until `reset`, posts are spread across the
+    window instead of being sent back to back until a 429.
+    """
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.min_interval = int(os.environ.get(f"SCHEDULER_MIN_INTERVAL_{platform.upper()}", DEFAULT_MIN_INTERVAL))
+        self.remaining = None
+        self.reset_at = None
+        self.next_at = 0.0
+
+    def interval(self, now: float) -> float:
+        if self.remaining is not None and self.reset_at and self.reset_at > now:
+            if self.remaining <= 0:
+                return self.reset_at - now
+            return max(self.min_interval, (self.reset_at - now) / self.remaining)
+        return self.min_interval
+
+    def update(self, status_code, headers, now: float):
+        remaining = _header(headers, "x-rate-limit-remaining")
+        reset_at = _header(headers, "x-rate-limit-reset")
+        if remaining is not None:
+            self.remaining = remaining
+        if reset_at is not None:
+            self.reset_at = reset_at
+
+        if status_code == 429:
+            retry_after = _header(headers, "retry-after")
+            if self.reset_at and self.reset_at > now:
+                self.next_at = self.reset_at
+            else:
+                self.next_at = now + (retry_after or 15 * 60)
+        else:
+            self.next_at = now + self.interval(now)
+
+    def to_dict(self) -> dict:
+        return {"remaining": self.remaining, "reset_at": self.reset_at,
+                "next_at": self.next_at, "min_interval": self.min_interval}
+
+
+class PostScheduler:
+    """
+    Posts are stored in SQLite and mirrored in an in-memory heap of
+    (due_at, priority, id). A background thread takes due posts off the heap
+    in batches and sends them through the platform's sender, pacing each
+    platform with PlatformPacer. Senders take the post content and return a
+    result dict with "status" and, when available, "status_code" and
+    "rate_limit" (see rate_limit_headers).
+    """
+
+    def __init__(self, senders: dict, db_path: str = SCHEDULER_DB):
+        self.senders = senders
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._condition = threading.Condition()
+        self._heap = []
+        self._due = {}  # post id -> current due_at; heap entries that disagree are stale
+        self._pacers = {platform: PlatformPacer(platform) for platform in senders}
+        self._thread = None
+
+        for post_id, due_at, priority in self._db.execute(
+                "SELECT id, due_at, priority FROM posts WHERE status = 'pending'"):
+            self._push(post_id, due_at, priority)
+        print(f"Post scheduler loaded {len(self._due)} pending posts from {db_path}")
+
+    def _push(self, post_id: int, due_at: float, priority: int):
+        self._due[post_id] = due_at
+        heapq.heappush(self._heap, (due_at, priority, post_id))
+
+    def schedule_many(self, posts: list) -> list:
+        """
+        Queue posts given as dicts with platform, content, due_at (epoch seconds,
+        default now) and optional priority (lower first) and source.
+        Returns the new post IDs.
+        """
+        now = time.time()
+        rows = []
+        for post in posts:
+            if post["platform"] not in self.senders:
+                raise ValueError(f"No sender for platform {post['platform']}")
+            rows.append((post["platform"], post["content"], float(post.get("due_at") or now),
+                         int(post.get("priority", 5)), post.get("source"), now))
+
+        with self._condition:
+            post_ids = []
+            self._db.execute("BEGIN")
+            for row in rows:
+                cursor = self._db.execute(
+                    "INSERT INTO posts (platform, content, due_at, priority, source, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    row)
+                post_ids.append(cursor.lastrowid)
+            self._db.execute("COMMIT")
+            for post_id, row in zip(post_ids, rows):
+                self._push(post_id, row[2], row[3])
+            self._condition.notify()
+        return post_ids
+
+    def schedule(self, platform: str, content: str, due_at: float = None, priority: int = 5, source: str = None) -> int:
+        return self.schedule_many([{"platform": platform, "content": content, "due_at": due_at,
+                                    "priority": priority, "source": source}])[0]
+
+    def post_now(self, platform: str, content: str, priority: int = 5, source: str = None, sender=None) -> tuple:
+        """
+        Send a post straight away when the platform's pacer has a free slot,
+        otherwise queue it for the next one. Either way the post gets a row, so
+        pacing, retries and history behave as for scheduled posts. `sender`
+        overrides the platform's sender (to record the call in the caller's
+        cassette, say). Returns (post_id, result), result None if it was queued.
+        """
+        if platform not in self.senders:
+            raise ValueError(f"No sender for platform {platform}")
+        now = time.time()
+        pacer = self._pacers[platform]
+        with self._condition:
+            cursor = self._db.execute(
+                "INSERT INTO posts (platform, content, due_at, priority, source, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (platform, content, max(now, pacer.next_at), priority, source, now))
+            post_id = cursor.lastrowid
+            if pacer.next_at > now:
+                self._push(post_id, pacer.next_at, priority)
+                self._condition.notify()
+                return post_id, None
+            # Hold the slot while sending so the dispatcher doesn't post to the platform at the same time
+            pacer.next_at = now + pacer.min_interval
+
+        try:
+            result = (sender or self.senders[platform])(content) or {"status": "error", "message": "Sender returned nothing"}
+        except Exception as e:
+            result = {"status": "error", "message": f"{type(e).__name__}: {e}"}
+        sent_at = time.time()
+        pacer.update(result.get("status_code"), result.get("rate_limit"), sent_at)
+        self._record(post_id, priority, 0, result, pacer, sent_at)
+        return post_id, result
+
+    def _take_due(self, now: float) -> list:
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < BATCH_SIZE:
+            due_at, _, post_id = heapq.heappop(self._heap)
+            if self._due.get(post_id) == due_at:
+                del self._due[post_id]
+                batch.append(post_id)
+        return batch
+
+    def run_once(self, now: float = None) -> int:
+        """Dispatch one batch of due posts; returns how many were sent"""
+        now = now or time.time()
+        with self._condition:
+            post_ids = self._take_due(now)
+            if not post_ids:
+                return 0
+            placeholders = ",".join("?" * len(post_ids))
+            posts = self._db.execute(
+                f"SELECT id, platform, content, priority, attempts FROM posts WHERE id IN ({placeholders}) ORDER BY priority, due_at",
+                post_ids).fetchall()
+
+        sent = 0
+        deferred = {}  # platform -> posts waiting for a pacing slot
+        for post_id, platform, content, priority, attempts in posts:
+            pacer = self._pacers[platform]
+            if pacer.next_at > time.time() or platform in deferred:
+                deferred.setdefault(platform, []).append((post_id, priority))
+                continue
+
+            result = self._send(platform, content)
+            sent_at = time.time()
+            pacer.update(result.get("status_code"), result.get("rate_limit"), sent_at)
+            self._record(post_id, priority, attempts, result, pacer, sent_at)
+            sent += 1
+
+        # Posts that couldn't go out yet are given evenly spaced future slots
+        with self._condition:
+            self._db.execute("BEGIN")
+            for platform, waiting in deferred.items():
+                pacer = self._pacers[platform]
+                slot = max(pacer.next_at, time.time())
+                for post_id, priority in waiting:
+                    self._db.execute("UPDATE posts SET due_at = ? WHERE id = ?", (slot, post_id))
+                    self._push(post_id, slot, priority)
+                    slot += pacer.interval(time.time())
+            self._db.execute("COMMIT")
+        return sent
+
+    def _send(self, platform: str, content: str) -> dict:
+        try:
+            return self.senders[platform](content) or {"status": "error", "message": "Sender returned nothing"}
+        except Exception as e:
+            return {"status": "error", "message": f"{type(e).__name__}: {e}"}
+
+    def _record(self, post_id, priority, attempts, result, pacer, sent_at):
+        status = result.get("status")
+        attempts += 1
+        with self._condition:
+            if result.get("status_code") == 429:
+                # Rate limited: not the post's fault, so it doesn't use up an attempt
+                self._db.execute("UPDATE posts SET due_at = ?, result = ? WHERE id = ?",
+                                 (pacer.next_at, json.dumps(result), post_id))
+                self._push(post_id, pacer.next_at, priority)
+                print(f"{pacer.platform} rate limited, post {post_id} retries at {datetime.fromtimestamp(pacer.next_at)}")
+            elif result.get("circuit_open"):
+                # The platform is known to be down: wait out its breaker without using up an attempt
+                retry_at = sent_at + max(result.get("retry_after") or 0, 1)
+                self._db.execute("UPDATE posts SET due_at = ?, result = ? WHERE id = ?",
+                                 (retry_at, json.dumps(result), post_id))
+                self._push(post_id, retry_at, priority)
+            elif status == "error" and attempts < MAX_ATTEMPTS:
+                retry_at = sent_at + 60 * 2 ** attempts
+                self._db.execute("UPDATE posts SET due_at = ?, attempts = ?, result = ? WHERE id = ?",
+                                 (retry_at, attempts, json.dumps(result), post_id))
+                self._push(post_id, retry_at, priority)
+                print(f"Post {post_id} to {pacer.platform} failed, retry {attempts}/{MAX_ATTEMPTS - 1}: {result.get('message')}")
+            else:
+                final_status = "posted" if status == "success" else "failed" if status == "error" else status
+                self._db.execute("UPDATE posts SET status = ?, attempts = ?, result = ?, posted_at = ? WHERE id = ?",
+                                 (final_status, attempts, json.dumps(result), sent_at, post_id))
+
+    def start(self):
+        """Start the background dispatcher thread (once per process)"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                with self._condition:
+                    delay = self._heap[0][0] - time.time() if self._heap else 60
+                    if delay > 0:
+                        self._condition.wait(timeout=min(delay, 60))
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Post scheduler dispatch failed: {e}")
+                    time.sleep(5)
+
+        self._thread = threading.Thread(target=run, name="post-scheduler", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        with self._condition:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM posts GROUP BY status").fetchall())
+            next_due = self._heap[0][0] if self._heap else None
+        return {
+            "counts": counts,
+            "next_due": datetime.fromtimestamp(next_due).isoformat() if next_due else None,
+            "pacing": {platform: pacer.to_dict() for platform, pacer in self._pacers.items()},
+        }
+
+    def list_posts(self, status: str = "pending", limit: int = 100) -> list:
+        with self._condition:
+            rows = self._db.execute(
+                "SELECT id, platform, content, due_at, priority, status, attempts, source FROM posts WHERE status = ? ORDER BY due_at LIMIT ?",
+                (status, limit)).fetchall()
+        return [
+            {"id": row[0], "platform": row[1], "content": row[2], "due_at": datetime.fromtimestamp(row[3]).isoformat(),
+             "priority": row[4], "status": row[5], "attempts": row[6], "source": row[7]}
+            for row in rows
+        ]
+
+
+def expand_calendar(posts: list, start_date: str = None, timezone: str = "UTC", platforms: list = None) -> list:
+    """
+    Turn a ContentAutomator social calendar (day, content, hashtags,
+    best_posting_times, platforms) into scheduler posts. Each platform gets a
+    different posting time of the day so one calendar entry doesn't go out
+    everywhere at once.
+    """
+    tz = ZoneInfo(timezone) if ZoneInfo else None
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now(tz).replace(tzinfo=None) + timedelta(days=1)
+    expanded = []
+    for entry in posts:
+        content = entry["content"]
+        if entry.get("hashtags"):
+            content = f"{content}\n\n{entry['hashtags']}"
+        times = entry.get("best_posting_times") or ["9:00 AM"]
+        entry_platforms = [p.lower() for p in entry.get("platforms", ["twitter"])]
+        if platforms is not None:
+            entry_platforms = [p for p in entry_platforms if p in platforms]
+        for index, platform in enumerate(entry_platforms):
+            clock = datetime.strptime(times[index % len(times)].strip(), "%I:%M %p")
+            local = start.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0) + timedelta(days=int(entry.get("day", 1)) - 1)
+            expanded.append({
+                "platform": platform,
+                "content": content,
+                "due_at": local.replace(tzinfo=tz).timestamp() if tz else local.timestamp(),
+                "priority": int(entry.get("priority", 5)),
+                "source": entry.get("type", "calendar"),
+            })
+    return expanded
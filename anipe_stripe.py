@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+ANIPE Stripe Catalog
+Cached price tiers, idempotent creates and concurrent payment link batches for Stripe
+"""
+
+import os
+import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import stripe
+
+try:
+    from stripe import RequestsClient
+except ImportError:  # stripe < 8 keeps the HTTP clients in stripe.http_client
+    from stripe.http_client import RequestsClient
+
+import anipe_cassette
+from anipe_resilience import get_breaker
+
+# Every sales page is sold at one of these prices (dollars)
+PRICE_TIERS = (27, 37, 47, 67, 97)
+
+# All tier prices hang off one product with a fixed ID, so it can be found without searching.
+# Its name is generic; each payment link puts the report's own title on the checkout page
+# and the buyer's receipt (see create_payment_link)
+CATALOG_PRODUCT_ID = "anipe_ai_report"
+CATALOG_PRODUCT_NAME = "ANIPE AI Generated Report"
+
+# Concurrent Stripe requests for batches (and pooled connections to api.stripe.com)
+BATCH_WORKERS = 8
+
+# How often the background thread reconciles the cached tiers with Stripe
+RECONCILE_INTERVAL = int(os.environ.get("STRIPE_RECONCILE_SECONDS", 3600))
+
+# Shared with every other Stripe caller in the process
+breaker = get_breaker("stripe")
+
+# Bump to create a fresh set of tier prices (e.g. after changing their settings)
+TIER_VERSION = "v1"
+
+
+def tier_for(price: int) -> int:
+    """Snap a dollar price up to the nearest tier (the top tier caps it)"""
+    for tier in PRICE_TIERS:
+        if price <= tier:
+            return tier
+    return PRICE_TIERS[-1]
+
+
+def _lookup_key(tier: int) -> str:
+    return f"anipe_report_{tier * 100}_{TIER_VERSION}"
+
+
+def idempotency_key(kind: str, params: dict) -> str:
+    """
+    Key derived from the request itself: a retried or repeated identical create
+    returns the original object instead of making a duplicate.
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"anipe-{kind}-{digest[:40]}"
+
+
+def configure(api_key: str):
+    """Set the API key and a pooled, retrying HTTP client for every Stripe call in this process"""
+    stripe.api_key = api_key
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS)
+    session.mount("https://", adapter)
+    stripe.default_http_client = RequestsClient(session=session)
+    # Network retries are safe because every create carries an idempotency key
+    stripe.max_network_retries = 2
+
+
+class StripeCatalog:
+    """Price tiers created once and cached, plus payment link creation on top of them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tier_prices = {}  # tier (dollars) -> price ID
+        self._product_ready = False
+        self._reconciler = None
+        self.stats = {"links_created": 0, "prices_created": 0, "reconciles": 0, "last_reconcile": None}
+
+    def _ensure_product(self):
+        if self._product_ready:
+            return
+        try:
+            stripe.Product.create(
+                id=CATALOG_PRODUCT_ID,
+                name=CATALOG_PRODUCT_NAME,
+                description="Professional AI-generated analysis and recommendations delivered as a PDF report.",
+                metadata={"source": "ANIPE-AutoGenerated"},
+                idempotency_key=idempotency_key("product", {"id": CATALOG_PRODUCT_ID}),
+            )
+            print(f"Created Stripe catalog product {CATALOG_PRODUCT_ID}")
+        except stripe.error.InvalidRequestError as e:
+            if getattr(e, "code", None) != "resource_already_exists":
+                raise
+        self._product_ready = True
+
+    def _create_tier_price(self, tier: int) -> str:
+        price = stripe.Price.create(
+            product=CATALOG_PRODUCT_ID,
+            unit_amount=tier * 100,  # Stripe amounts are in cents
+            currency="usd",
+            lookup_key=_lookup_key(tier),
+            metadata={"source": "ANIPE-AutoGenerated", "tier": str(tier)},
+            idempotency_key=idempotency_key("price", {"lookup_key": _lookup_key(tier)}),
+        )
+        self.stats["prices_created"] += 1
+        print(f"Created Stripe price tier ${tier}: {price.id}")
+        return price.id
+
+    def _list_tier_prices(self) -> dict:
+        """Read the active tier prices from Stripe, following pagination"""
+        by_lookup_key = {_lookup_key(tier): tier for tier in PRICE_TIERS}
+        found = {}
+        prices = stripe.Price.list(product=CATALOG_PRODUCT_ID, active=True, limit=100)
+        for price in prices.auto_paging_iter():
+            tier = by_lookup_key.get(price.get("lookup_key"))
+            if tier is not None and price.unit_amount == tier * 100:
+                found[tier] = price.id
+        return found
+
+    def _reconcile(self) -> dict:
+        self._ensure_product()
+        found = self._list_tier_prices()
+        missing = [tier for tier in PRICE_TIERS if tier not in found]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(missing))) as executor:
+                for tier, price_id in zip(missing, executor.map(self._create_tier_price, missing)):
+                    found[tier] = price_id
+        return found
+
+    def sync(self) -> dict:
+        """
+        Make sure the product and every tier price exist, creating missing prices
+        concurrently, and replace the cache with what Stripe has. Returns the tier map.
+        """
+        # One breaker call (and one cassette entry) for the whole reconcile;
+        # JSON round trips turn the tier keys into strings
+        found = {int(tier): price_id for tier, price_id in breaker.call(self._reconcile).items()}
+
+        with self._lock:
+            self._tier_prices = found
+        self.stats["reconciles"] += 1
+        self.stats["last_reconcile"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return dict(found)
+
+    def price_id(self, price: int) -> str:
+        """Price ID for the tier a dollar price falls in, syncing on first use"""
+        tier = tier_for(price)
+        price_id = self._tier_prices.get(tier)
+        if price_id is None:
+            price_id = self.sync()[tier]
+        return price_id
+
+    def create_payment_link(self, niche_topic: str, slug: str, price: int) -> str:
+        """
+        Create the payment link for one page: the only Stripe call on the request path once tiers are cached.
+        `slug` must be unique to the page; it's part of the idempotency key, so
+        two pages for the same niche and price get their own links.
+        """
+        title = f'"{niche_topic}" AI Report'
+        params = {
+            "line_items": [{"price": self.price_id(price), "quantity": 1}],
+            # Tier prices are shared, so the line item shows the catalog product's name;
+            # the title goes next to the pay button and on the charge and receipt instead
+            "custom_text": {"submit": {"message": f"You're buying: {title}"[:1000]}},
+            "payment_intent_data": {"description": title[:1000]},
+            "metadata": {"source": "ANIPE-AutoGenerated", "niche": niche_topic[:500], "slug": slug},
+            "after_completion": {
+                "type": "hosted_confirmation",
+                "hosted_confirmation": {
+                    "custom_message": f'🎉 Thank you for your purchase! Your "{niche_topic}" PDF report will be delivered to your email within 5 minutes. Check your inbox (and spam folder) for download instructions.'
+                }
+            },
+            "allow_promotion_codes": True,
+            "billing_address_collection": "auto",
+            "shipping_address_collection": {
+                "allowed_countries": ["US", "CA", "GB", "AU", "DE", "FR"]
+            },
+        }
+        payment_link = breaker.call(stripe.PaymentLink.create, idempotency_key=idempotency_key("link", params), **params)
+        self.stats["links_created"] += 1
+        return payment_link.url
+
+    def create_payment_links(self, items: list) -> list:
+        """
+        Create payment links for a batch of (niche_topic, slug, price) concurrently.
+        Returns URLs in input order, with None where a create failed.
+        """
+        if not items:
+            return []
+        # Sync once up front so the workers don't all race to create tiers
+        if any(tier_for(price) not in self._tier_prices for _, _, price in items):
+            self.sync()
+
+        def create(item):
+            try:
+                return self.create_payment_link(*item)
+            except Exception as e:
+                print(f"Payment link for {item[1]} failed: {type(e).__name__}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(items))) as executor:
+            return list(executor.map(anipe_cassette.bind(create), items))
+
+    def start_reconciler(self):
+        """Reconcile the tier cache with Stripe now and then every RECONCILE_INTERVAL seconds, in the background"""
+        if self._reconciler is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"Stripe catalog reconcile failed: {type(e).__name__}: {e}")
+                time.sleep(RECONCILE_INTERVAL)
+
+        self._reconciler = threading.Thread(target=run, name="stripe-catalog-reconciler", daemon=True)
+        self._reconciler.start()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ANIPE Artifact Index CLI
+Sync the local artifact index from GCS and query it.
+
+Examples:
+    python artifact_index.py sync
+    python artifact_index.py sync --full              # relist everything and drop deleted objects
+    python artifact_index.py products "AI Tools for Dentists" --since 7d
+    python artifact_index.py orphans --since 30d      # opportunities that never got a sales page
+    python artifact_index.py niche "AI Tools for Dentists"
+    python artifact_index.py search dentist
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+
+from anipe_index import ARTIFACT_INDEX_DB, ArtifactIndex
+
+
+def parse_since(value: str) -> str:
+    """Accept an ISO date or a relative age such as 7d / 12h"""
+    if not value:
+        return None
+    if value[-1] in "dh" and value[:-1].isdigit():
+        delta = timedelta(days=int(value[:-1])) if value[-1] == "d" else timedelta(hours=int(value[:-1]))
+        return (datetime.now() - delta).isoformat(timespec="seconds")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the local ANIPE artifact index")
+    parser.add_argument("--db", default=ARTIFACT_INDEX_DB)
+    parser.add_argument("--sync", action="store_true", help="Sync from GCS before running the query")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync = commands.add_parser("sync", help="Index new and changed artifacts")
+    sync.add_argument("--bucket", default=os.environ.get("GCS_BUCKET_NAME", "windsurf-anipe-data"))
+    sync.add_argument("--sales-bucket", default=os.environ.get("SALES_BUCKET_NAME", "windsurf-anipe-sales-pages"))
+    sync.add_argument("--full", action="store_true", default=None,
+                      help="List every object and drop deleted ones (default: weekly)")
+
+    products = commands.add_parser("products", help="Products generated for a niche")
+    products.add_argument("niche")
+    products.add_argument("--since")
+
+    orphans = commands.add_parser("orphans", help="Opportunities without a sales page")
+    orphans.add_argument("--since")
+
+    niche = commands.add_parser("niche", help="Everything indexed for a niche")
+    niche.add_argument("niche")
+
+    search = commands.add_parser("search", help="Find opportunities by niche text")
+    search.add_argument("text")
+    search.add_argument("--limit", type=int, default=50)
+
+    commands.add_parser("stats", help="Row counts and last sync time")
+
+    args = parser.parse_args()
+    index = ArtifactIndex(args.db)
+
+    if args.command == "sync" or args.sync:
+        from google.cloud import storage
+        client = storage.Client()
+        bucket = getattr(args, "bucket", None) or os.environ.get("GCS_BUCKET_NAME", "windsurf-anipe-data")
+        sales_bucket = getattr(args, "sales_bucket", None) or os.environ.get("SALES_BUCKET_NAME", "windsurf-anipe-sales-pages")
+        result = index.sync(client.bucket(bucket), client.bucket(sales_bucket) if sales_bucket else None,
+                            full=getattr(args, "full", None))
+        if args.command == "sync":
+            print(json.dumps(result, indent=2))
+            return 0
+
+    if args.command == "products":
+        result = index.products_for_niche(args.niche, parse_since(args.since))
+    elif args.command == "orphans":
+        result = index.opportunities_without_sales_page(parse_since(args.since))
+    elif args.command == "niche":
+        result = index.niche_history(args.niche)
+    elif args.command == "search":
+        result = index.search(args.text, args.limit)
+    else:
+        result = index.stats()
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
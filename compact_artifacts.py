@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+ANIPE Artifact Compaction Job
+Rolls the small opportunity, result and promotion JSON objects into daily archives.
+
+Examples:
+    python compact_artifacts.py                      # compact every kind up to yesterday
+    python compact_artifacts.py --kinds promotions --keep
+    python compact_artifacts.py --read results 2026-10-18
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from google.cloud import storage
+
+from anipe_archive import ARCHIVE_KINDS, compact_prefix, read_day
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact small ANIPE JSON artifacts into daily archives")
+    parser.add_argument("--bucket", default=os.environ.get("GCS_BUCKET_NAME", "windsurf-anipe-data"))
+    parser.add_argument("--kinds", nargs="+", choices=sorted(ARCHIVE_KINDS), default=sorted(ARCHIVE_KINDS))
+    parser.add_argument("--before", help="Only compact days before this one (YYYY-MM-DD, default today UTC)")
+    parser.add_argument("--keep", action="store_true", help="Keep the original objects after archiving")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--read", nargs=2, metavar=("KIND", "DAY"), help="Print the archived records of one day")
+    args = parser.parse_args()
+
+    bucket = storage.Client().bucket(args.bucket)
+
+    if args.read:
+        kind, day = args.read
+        for record in read_day(bucket, kind, day):
+            print(json.dumps(record))
+        return 0
+
+    summary = {kind: compact_prefix(bucket, kind, args.before, delete=not args.keep, file_format=args.format)
+               for kind in args.kinds}
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,18 @@ This script creates actual blog posts, social media content, and email templates
 that you can immediately use to start generating income.
 """
 
+import os
 import json
 import random
+import urllib.request
 from datetime import datetime, timedelta
 
 class ContentAutomator:
+    # Title / template variants the generators choose from
+    BLOG_TITLES = 5
+    YOUTUBE_TITLES = 3
+    SOCIAL_TEMPLATES = 7
+    
     def __init__(self):
         self.niches = {
             "AI_PRODUCTIVITY": {
@@ -29,9 +36,18 @@ class ContentAutomator:
             }
         }
     
-    def generate_blog_post(self, niche_key: str) -> dict:
-        """Generate a complete, ready-to-publish blog post"""
-        niche = self.niches[niche_key]
+    def get_niche(self, niche_key: str, keyword: int = 0, pain_point: int = 0) -> dict:
+        """Niche settings with the chosen keyword and pain point moved to the front (the ones the templates use)"""
+        niche = dict(self.niches[niche_key])
+        for field, index in (("keywords", keyword), ("pain_points", pain_point)):
+            values = list(niche[field])
+            values.insert(0, values.pop(index))
+            niche[field] = values
+        return niche
+    
+    def generate_blog_post(self, niche_key: str, title_index: int = None, keyword: int = 0, pain_point: int = 0) -> dict:
+        """Generate a complete, ready-to-publish blog post (random title unless title_index is given)"""
+        niche = self.get_niche(niche_key, keyword, pain_point)
         
         titles = [
             f"How I Made $5,000 This Month Using {niche['keywords'][0].title()} (Complete Guide)",
@@ -41,7 +57,7 @@ class ContentAutomator:
             f"From Zero to $10K: My {niche['keywords'][0].title()} Journey"
         ]
         
-        title = random.choice(titles)
+        title = titles[title_index] if title_index is not None else random.choice(titles)
         
         # Generate actual content
         content = f"""
@@ -201,9 +217,13 @@ The key is to start now, even if you don't feel ready. I wish I had started soon
             ]
         }
     
-    def generate_social_media_content(self, niche_key: str, days: int = 7) -> list:
-        """Generate a week's worth of social media content"""
-        niche = self.niches[niche_key]
+    def generate_social_media_content(self, niche_key: str, days: int = 7, rotation: int = None,
+                                      keyword: int = 0, pain_point: int = 0) -> list:
+        """
+        Generate a week's worth of social media content. Templates are picked at
+        random, or in order starting at `rotation` so a week never repeats one.
+        """
+        niche = self.get_niche(niche_key, keyword, pain_point)
         posts = []
         
         post_templates = [
@@ -238,7 +258,10 @@ The key is to start now, even if you don't feel ready. I wish I had started soon
         ]
         
         for day in range(days):
-            template = random.choice(post_templates)
+            if rotation is None:
+                template = random.choice(post_templates)
+            else:
+                template = post_templates[(rotation + day) % len(post_templates)]
             posts.append({
                 "day": day + 1,
                 "type": template["type"],
@@ -250,9 +273,17 @@ The key is to start now, even if you don't feel ready. I wish I had started soon
         
         return posts
     
-    def generate_email_sequence(self, niche_key: str) -> list:
+    def schedule_social_media_content(self, posts: list, scheduler_url: str, start_date: str = None) -> dict:
+        """Queue a social calendar on the ANIPE social poster's scheduler at each post's best posting times"""
+        body = json.dumps({"calendar": posts, "start_date": start_date}).encode("utf-8")
+        req = urllib.request.Request(f"{scheduler_url.rstrip('/')}/schedule", data=body,
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return json.loads(response.read())
+    
+    def generate_email_sequence(self, niche_key: str, keyword: int = 0, pain_point: int = 0) -> list:
         """Generate a 5-email welcome sequence"""
-        niche = self.niches[niche_key]
+        niche = self.get_niche(niche_key, keyword, pain_point)
         
         emails = [
             {
@@ -421,9 +452,9 @@ P.S. Questions about the course? Just reply to this email - I personally respond
         
         return emails
     
-    def generate_youtube_script(self, niche_key: str) -> dict:
-        """Generate a complete YouTube video script"""
-        niche = self.niches[niche_key]
+    def generate_youtube_script(self, niche_key: str, title_index: int = None, keyword: int = 0) -> dict:
+        """Generate a complete YouTube video script (random title unless title_index is given)"""
+        niche = self.get_niche(niche_key, keyword)
         
         titles = [
             f"How I Make $5,000/Month with {niche['keywords'][0].title()} (Step by Step)",
@@ -431,7 +462,7 @@ P.S. Questions about the course? Just reply to this email - I personally respond
             f"I Tried {niche['keywords'][0].title()} for 30 Days - Here's What Happened"
         ]
         
-        title = random.choice(titles)
+        title = titles[title_index] if title_index is not None else random.choice(titles)
         
         script = f"""
 # YouTube Video Script: {title}
@@ -601,6 +632,13 @@ def main():
     for post in social_posts[:3]:  # Show first 3
         print(f"Day {post['day']} ({post['type']}): {post['content'][:60]}...")
     print(f"... and {len(social_posts)-3} more posts")
+    scheduler_url = os.environ.get("SOCIAL_SCHEDULER_URL")
+    if scheduler_url:
+        try:
+            scheduled = automator.schedule_social_media_content(social_posts, scheduler_url)
+            print(f"Scheduled {scheduled.get('scheduled', 0)} posts on {scheduler_url}")
+        except Exception as e:
+            print(f"Scheduling failed: {e}")
     print()
     
     # Generate email sequence
@@ -649,7 +687,7 @@ def main():
     print("🎯 IMMEDIATE ACTION STEPS")
     print("-" * 30)
     print("1. Copy blog_post.md to your WordPress site")
-    print("2. Schedule social media posts using Buffer/Hootsuite")
+    print("2. Schedule social media posts (set SOCIAL_SCHEDULER_URL to queue them automatically)")
     print("3. Set up email sequence in ConvertKit/Mailchimp")
     print("4. Record YouTube video using the script")
     print("5. Start promoting and watch the income roll in!")
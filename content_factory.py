@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+ANIPE Content Factory
+Generates content packages in bulk across every ContentAutomator niche and
+variant, in worker processes, streamed to sharded JSONL and Markdown files.
+
+Every package is a distinct combination of niche, focus keyword, pain point,
+blog title, YouTube title and social template rotation, so no two packages
+repeat, in JSONL or Markdown. Packages are spread across niches and variants
+in a seeded order, so `--count` takes an even sample instead of the first
+niche only.
+
+Examples:
+    python content_factory.py                                   # every unique package
+    python content_factory.py --count 2000 --shard-size 250 --workers 8
+    python content_factory.py --niches PASSIVE_INCOME --seed 7 --out passive_income
+"""
+
+import os
+import sys
+import json
+import math
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from content_automation import ContentAutomator
+
+# Packages per shard (each worker task writes one JSONL + one Markdown shard)
+DEFAULT_SHARD_SIZE = 500
+
+VARIANT_FIELDS = ("keyword", "pain_point", "blog_title", "youtube_title", "social_rotation")
+
+
+def variant_space(automator: ContentAutomator, niches: list) -> list:
+    """[(niche_key, radix sizes per VARIANT_FIELDS)] for the selected niches"""
+    return [
+        (niche_key, (len(automator.niches[niche_key]["keywords"]),
+                     len(automator.niches[niche_key]["pain_points"]),
+                     automator.BLOG_TITLES,
+                     automator.YOUTUBE_TITLES,
+                     automator.SOCIAL_TEMPLATES))
+        for niche_key in niches
+    ]
+
+
+def space_size(space: list) -> int:
+    return sum(math.prod(sizes) for _, sizes in space)
+
+
+def decode_variant(space: list, index: int) -> tuple:
+    """Map a package index in [0, space_size) to (niche_key, {field: choice})"""
+    for niche_key, sizes in space:
+        count = math.prod(sizes)
+        if index < count:
+            choices = {}
+            for field, size in zip(reversed(VARIANT_FIELDS), reversed(sizes)):
+                index, choices[field] = divmod(index, size)
+            return niche_key, {field: choices[field] for field in VARIANT_FIELDS}
+        index -= count
+    raise IndexError("package index out of range")
+
+
+def permutation(total: int, seed: int) -> tuple:
+    """
+    Stride and offset of a full-cycle permutation of range(total):
+    position p maps to (p * stride + offset) % total. Needs O(1) memory,
+    unlike shuffling a list of every combination.
+    """
+    stride = max(1, int(total * 0.618)) + seed
+    while math.gcd(stride, total) != 1:
+        stride += 1
+    return stride, seed % total
+
+
+def package_id(niche_key: str, choices: dict) -> str:
+    key = niche_key + ":" + ",".join(str(choices[field]) for field in VARIANT_FIELDS)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def build_package(automator: ContentAutomator, niche_key: str, choices: dict) -> dict:
+    focus = {"keyword": choices["keyword"], "pain_point": choices["pain_point"]}
+    return {
+        "id": package_id(niche_key, choices),
+        "niche": niche_key,
+        "variant": choices,
+        "blog_post": automator.generate_blog_post(niche_key, choices["blog_title"], **focus),
+        "social_media": automator.generate_social_media_content(niche_key, 7, choices["social_rotation"], **focus),
+        "email_sequence": automator.generate_email_sequence(niche_key, **focus),
+        "youtube_script": automator.generate_youtube_script(niche_key, choices["youtube_title"], choices["keyword"]),
+        "generated_date": datetime.now().isoformat(),
+    }
+
+
+def package_markdown(package: dict) -> str:
+    """
+    A package as Markdown: its blog post, YouTube script and social week.
+    A blog post is shared by every package with the same niche, keyword, pain
+    point and blog title, so the post alone would repeat across packages.
+    """
+    social = "\n".join(f"- Day {post['day']} ({post['type']}): {post['content']} {post['hashtags']}"
+                       for post in package["social_media"])
+    return (f"<!-- package {package['id']} | {package['niche']} -->\n"
+            f"{package['blog_post']['content'].strip()}\n\n"
+            f"{package['youtube_script']['script'].strip()}\n\n"
+            f"## Social Media Week\n\n{social}\n\n---\n\n")
+
+
+def build_shard(out_dir: str, shard: int, start: int, end: int, space: list, stride: int, offset: int,
+                resume: bool = True) -> dict:
+    """
+    Generate packages for positions [start, end) and stream them to
+    shard-NNNNN.jsonl / .md. Files are written under a temporary name and
+    renamed when complete, so an interrupted run resumes (`resume`) by
+    skipping finished shards.
+    """
+    stem = os.path.join(out_dir, f"shard-{shard:05d}")
+    if resume and os.path.exists(stem + ".jsonl") and os.path.exists(stem + ".md"):
+        return {"shard": shard, "packages": end - start, "skipped": True}
+
+    automator = ContentAutomator()
+    total = space_size(space)
+    with open(stem + ".jsonl.tmp", "w", encoding="utf-8") as jsonl, \
+            open(stem + ".md.tmp", "w", encoding="utf-8") as markdown:
+        for position in range(start, end):
+            niche_key, choices = decode_variant(space, (position * stride + offset) % total)
+            package = build_package(automator, niche_key, choices)
+            jsonl.write(json.dumps(package, ensure_ascii=False, separators=(",", ":")) + "\n")
+            markdown.write(package_markdown(package))
+    os.replace(stem + ".md.tmp", stem + ".md")
+    os.replace(stem + ".jsonl.tmp", stem + ".jsonl")
+    return {"shard": shard, "packages": end - start, "skipped": False}
+
+
+def run_factory(out_dir: str, niches: list = None, count: int = None, shard_size: int = DEFAULT_SHARD_SIZE,
+                workers: int = None, seed: int = 0) -> dict:
+    """Generate up to `count` unique packages (default: all of them) and write a manifest"""
+    automator = ContentAutomator()
+    niches = niches or list(automator.niches)
+    space = variant_space(automator, niches)
+    total = space_size(space)
+    count = min(count or total, total)
+    stride, offset = permutation(total, seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Shards are only reused when the directory was started with the same settings;
+    # the manifest is written up front so an interrupted run can be checked too
+    settings = {"packages": count, "unique_combinations": total, "niches": niches,
+                "seed": seed, "shard_size": shard_size}
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+    except (FileNotFoundError, ValueError):
+        previous = None
+    if previous is not None:
+        changed = sorted(key for key, value in settings.items() if previous.get(key) != value)
+        if changed:
+            raise ValueError(f"{out_dir} was generated with different {', '.join(changed)}; "
+                             f"use a new --out or remove it")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(dict(settings, shards=[], complete=False), f, indent=2)
+
+    print(f"Generating {count} of {total} unique packages for {', '.join(niches)} into {out_dir}")
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(build_shard, out_dir, shard, start, min(start + shard_size, count), space, stride, offset,
+                            previous is not None)
+            for shard, start in enumerate(range(0, count, shard_size))
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            shards.append(result)
+            state = "already done" if result["skipped"] else "written"
+            print(f"Shard {result['shard']:05d}: {result['packages']} packages {state} ({len(shards)}/{len(futures)})")
+
+    manifest = dict(
+        settings,
+        shards=[f"shard-{result['shard']:05d}" for result in sorted(shards, key=lambda r: r["shard"])],
+        complete=True,
+        generated_date=datetime.now().isoformat(),
+    )
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate ContentAutomator packages in bulk")
+    parser.add_argument("--out", default="content_factory_output", help="Output directory for shards and manifest")
+    parser.add_argument("--niches", nargs="+", choices=sorted(ContentAutomator().niches), help="Default: all niches")
+    parser.add_argument("--count", type=int, help="Number of packages (default: every unique combination)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0, help="Changes which packages --count samples and their order")
+    args = parser.parse_args()
+
+    try:
+        manifest = run_factory(args.out, args.niches, args.count, args.shard_size, args.workers, args.seed)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Done: {manifest['packages']} packages in {len(manifest['shards'])} shards "
+          f"({os.path.join(args.out, 'manifest.json')})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
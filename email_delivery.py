@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+ANIPE Email Delivery
+Sends ContentAutomator welcome sequences and AIIncomeGenerator newsletters to
+subscriber lists through the pooled, throttled mailer, and runs a local SMTP
+sink for testing throughput without a real provider.
+
+Examples:
+    python email_delivery.py sink --port 2525
+    python email_delivery.py send --synthetic 100000 --host localhost --port 2525 --rate 0 --workers 16
+    python email_delivery.py send --subscribers subscribers.csv --niche PASSIVE_INCOME --step 2 --rate 14
+    python email_delivery.py send --subscribers subscribers.jsonl --newsletter "Remote Work" --step 1
+"""
+
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+
+from anipe_mailer import (DEFAULT_RATE, FROM_EMAIL, MAILER_LEDGER, SMTP_HOST, SMTP_PASSWORD, SMTP_PORT,
+                          SMTP_STARTTLS, SMTP_USER, DeliveryEngine, SendLedger, SMTPPool, Throttle,
+                          iter_subscribers, newsletter_templates, sequence_templates)
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal ESMTP server that accepts (pipelined) mail and discards it"""
+
+    def reply(self, line: bytes):
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reply(b"220 anipe-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.wfile.write(b"250-anipe-sink\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 SIZE 26214400\r\n")
+            elif command in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self.reply(b"250 OK")
+            elif command == b"DATA":
+                self.reply(b"354 End data with <CR><LF>.<CR><LF>")
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                self.server.count()
+                self.reply(b"250 OK queued")
+            elif command == b"QUIT":
+                self.reply(b"221 Bye")
+                return
+            else:
+                self.reply(b"502 Command not implemented")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, SinkHandler)
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def count(self):
+        with self.lock:
+            self.received += 1
+
+
+def run_sink(host: str, port: int):
+    server = SinkServer((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"SMTP sink listening on {host}:{port}")
+    last_count, last_time = 0, time.perf_counter()
+    try:
+        while True:
+            time.sleep(5)
+            now = time.perf_counter()
+            if server.received != last_count:
+                print(f"{server.received} messages received ({(server.received - last_count) / (now - last_time):.1f} msg/s)")
+            last_count, last_time = server.received, now
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def synthetic_subscribers(count: int):
+    for i in range(count):
+        yield {"email": f"subscriber{i}@example.com", "first_name": f"Reader{i}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver generated email sequences and newsletters")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sink = commands.add_parser("sink", help="Run a local SMTP sink that counts messages")
+    sink.add_argument("--host", default="127.0.0.1")
+    sink.add_argument("--port", type=int, default=2525)
+
+    send = commands.add_parser("send", help="Send one step of a sequence or newsletter to a subscriber list")
+    source = send.add_mutually_exclusive_group(required=True)
+    source.add_argument("--subscribers", help="CSV (email, first_name, ...) or JSON lines file")
+    source.add_argument("--synthetic", type=int, help="Generate this many test subscribers")
+    content = send.add_mutually_exclusive_group()
+    content.add_argument("--niche", default="PASSIVE_INCOME", help="ContentAutomator niche for the welcome sequence")
+    content.add_argument("--newsletter", metavar="TOPIC", help="Send AIIncomeGenerator newsletter issues for a topic")
+    send.add_argument("--step", type=int, default=1, help="Which email of the sequence (1-based)")
+    send.add_argument("--campaign", help="Ledger campaign name (default derived from the content)")
+    send.add_argument("--host", default=SMTP_HOST)
+    send.add_argument("--port", type=int, default=SMTP_PORT)
+    send.add_argument("--starttls", action=argparse.BooleanOptionalAction, default=SMTP_STARTTLS)
+    send.add_argument("--from-email", default=FROM_EMAIL)
+    send.add_argument("--pool-size", type=int, default=4, help="SMTP connections kept open")
+    send.add_argument("--workers", type=int, default=4, help="Sender threads")
+    send.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Messages per second (0 = unthrottled)")
+    send.add_argument("--ledger", default=MAILER_LEDGER)
+    args = parser.parse_args()
+
+    if args.command == "sink":
+        run_sink(args.host, args.port)
+        return 0
+
+    if args.newsletter:
+        from ai_income_generator import AIIncomeGenerator
+        templates = newsletter_templates(AIIncomeGenerator().create_email_newsletter_template(args.newsletter))
+        campaign = args.campaign or f"newsletter-{args.newsletter}"
+    else:
+        from content_automation import ContentAutomator
+        templates = sequence_templates(ContentAutomator().generate_email_sequence(args.niche))
+        campaign = args.campaign or f"welcome-{args.niche}"
+    if not 1 <= args.step <= len(templates):
+        parser.error(f"--step must be between 1 and {len(templates)}")
+
+    subscribers = iter_subscribers(args.subscribers) if args.subscribers else synthetic_subscribers(args.synthetic)
+    pool = SMTPPool(max(args.pool_size, 1), args.host, args.port, SMTP_USER, SMTP_PASSWORD, args.starttls)
+    engine = DeliveryEngine(pool, SendLedger(args.ledger), Throttle(args.rate), args.workers, args.from_email)
+    try:
+        stats = engine.send_campaign(campaign, args.step, templates[args.step - 1], subscribers)
+    finally:
+        pool.close()
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
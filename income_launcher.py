@@ -6,12 +6,44 @@ This script sets up everything you need to start generating income immediately.
 
 import json
 import os
+import re
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import revenue_simulator
+from launcher_build import BuildEngine, Target, atomic_write, source_hash
+
 class IncomeLauncher:
-    def __init__(self):
+    def __init__(self, niche: str = "Passive Income", output_dir: str = "."):
         self.setup_checklist = []
         self.revenue_projections = {}
+        self.niche = niche
+        self.output_dir = output_dir
+    
+    def write_output(self, filename: str, content: str) -> bool:
+        """Atomically write one kit file into output_dir (skipped if unchanged)"""
+        return atomic_write(os.path.join(self.output_dir, filename), content)
+    
+    def build_targets(self) -> list:
+        """Every kit file as a build target with the inputs its template uses"""
+        niche_inputs = {"niche": self.niche}
+        return [
+            Target("wordpress_setup.md", self.create_wordpress_setup_guide),
+            Target("affiliate_programs.json", self.create_affiliate_program_list),
+            Target("social_media_setup.md", self.create_social_media_automation_setup),
+            Target("email_marketing_setup.md", self.create_email_marketing_setup),
+            Target("youtube_setup.md", self.create_youtube_setup_guide),
+            Target("digital_products.json", self.create_digital_product_ideas, niche_inputs),
+            Target("master_action_plan.md", self.create_master_action_plan, niche_inputs),
+            Target("income_projections.json", self.save_income_projections, {
+                "simulator": source_hash(revenue_simulator),
+                "projection": source_hash(IncomeLauncher.calculate_90_day_income_projection),
+                "simulation": source_hash(IncomeLauncher.simulate_income_projection),
+                # Without NumPy the static table is written instead of the simulated one
+                "numpy": revenue_simulator.np is not None,
+            }),
+        ]
         
     def create_wordpress_setup_guide(self):
         """Generate WordPress setup instructions"""
@@ -49,8 +81,7 @@ class IncomeLauncher:
 ## Income Potential: $200-500/month from this blog
 """
         
-        with open('wordpress_setup.md', 'w') as f:
-            f.write(guide)
+        self.write_output('wordpress_setup.md', guide)
         
         return guide
     
@@ -114,8 +145,7 @@ class IncomeLauncher:
             ]
         }
         
-        with open('affiliate_programs.json', 'w') as f:
-            json.dump(programs, f, indent=2)
+        self.write_output('affiliate_programs.json', json.dumps(programs, indent=2))
         
         return programs
     
@@ -158,8 +188,7 @@ class IncomeLauncher:
 - Income: $300-800/month from affiliate sales
 """
         
-        with open('social_media_setup.md', 'w') as f:
-            f.write(guide)
+        self.write_output('social_media_setup.md', guide)
         
         return guide
     
@@ -208,8 +237,7 @@ class IncomeLauncher:
 - Track open rates and click rates
 """
         
-        with open('email_marketing_setup.md', 'w') as f:
-            f.write(guide)
+        self.write_output('email_marketing_setup.md', guide)
         
         return guide
     
@@ -267,8 +295,7 @@ class IncomeLauncher:
 - Month 12: $1,000-3,000/month
 """
         
-        with open('youtube_setup.md', 'w') as f:
-            f.write(guide)
+        self.write_output('youtube_setup.md', guide)
         
         return guide
     
@@ -277,7 +304,7 @@ class IncomeLauncher:
         products = {
             "Quick Wins (Create This Week)": [
                 {
-                    "product": "Passive Income Checklist",
+                    "product": f"{self.niche} Checklist",
                     "price": "$19",
                     "creation_time": "2 hours",
                     "tools_needed": "Canva + PDF",
@@ -293,7 +320,7 @@ class IncomeLauncher:
             ],
             "Medium Effort (Create This Month)": [
                 {
-                    "product": "Passive Income Email Course",
+                    "product": f"{self.niche} Email Course",
                     "price": "$97",
                     "creation_time": "10 hours",
                     "tools_needed": "ConvertKit + Canva",
@@ -309,7 +336,7 @@ class IncomeLauncher:
             ],
             "High Value (Create Next Quarter)": [
                 {
-                    "product": "Passive Income Mastery Course",
+                    "product": f"{self.niche} Mastery Course",
                     "price": "$297",
                     "creation_time": "40 hours",
                     "tools_needed": "Teachable + Video recording",
@@ -325,13 +352,39 @@ class IncomeLauncher:
             ]
         }
         
-        with open('digital_products.json', 'w') as f:
-            json.dump(products, f, indent=2)
+        self.write_output('digital_products.json', json.dumps(products, indent=2))
         
         return products
     
+    def simulate_income_projection(self):
+        """Median income per stream from the Monte Carlo revenue simulator, with the total's 10-90% range"""
+        focus = {
+            1: "Setup and content creation",
+            2: "Audience building and first sales",
+            3: "Optimization and scaling",
+            6: "Automation and new products",
+            12: "Scale and hire team",
+        }
+        stream_keys = {
+            "blog_income": "blog", "social_media": "social", "email_list": "email",
+            "youtube": "youtube", "digital_products": "digital_products", "anipe_products": "anipe_products",
+        }
+        projections = {}
+        for month, bands in revenue_simulator.monthly_projection(tuple(focus)).items():
+            row = {key: int(round(bands["streams"][stream])) for key, stream in stream_keys.items()}
+            row["total"] = sum(row.values())
+            row["range"] = f"${bands['total']['p10']:,.0f}-${bands['total']['p90']:,.0f}"
+            row["focus"] = focus[month]
+            projections[f"Month {month}"] = row
+        return projections
+    
     def calculate_90_day_income_projection(self):
-        """Calculate realistic income projections for first 90 days"""
+        """Calculate realistic income projections for first 90 days (simulated when NumPy is available)"""
+        try:
+            return self.simulate_income_projection()
+        except RuntimeError as e:
+            print(f"Using static income projections: {e}")
+        
         projections = {
             "Month 1": {
                 "blog_income": 0,
@@ -382,9 +435,15 @@ class IncomeLauncher:
         
         return projections
     
+    def save_income_projections(self):
+        """Save the income projections next to the other kit files"""
+        projections = self.calculate_90_day_income_projection()
+        self.write_output('income_projections.json', json.dumps(projections, indent=2))
+        return projections
+    
     def create_master_action_plan(self):
         """Create the complete action plan"""
-        plan = """
+        plan = f"""
 # 🚀 MASTER ACTION PLAN: From $0 to $5K/Month
 
 ## WEEK 1: Foundation Setup
@@ -402,7 +461,7 @@ class IncomeLauncher:
 
 ### Day 5-7: Email Marketing
 - [ ] Set up ConvertKit account
-- [ ] Create lead magnet (Passive Income Checklist)
+- [ ] Create lead magnet ({self.niche} Checklist)
 - [ ] Set up email sequence (use provided templates)
 - [ ] Add opt-in forms to blog
 
@@ -421,7 +480,7 @@ class IncomeLauncher:
 
 ## WEEK 3: Product Creation
 ### Day 15-17: First Digital Product
-- [ ] Create "Passive Income Checklist" PDF
+- [ ] Create "{self.niche} Checklist" PDF
 - [ ] Set up Gumroad account
 - [ ] Create sales page
 - [ ] Launch to email list
@@ -505,33 +564,56 @@ class IncomeLauncher:
 Remember: This is a marathon, not a sprint. Stay consistent, provide value, and the income will follow!
 """
         
-        with open('master_action_plan.md', 'w') as f:
-            f.write(plan)
+        self.write_output('master_action_plan.md', plan)
         
         return plan
 
+def kit_dirname(niche: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", niche.lower()).strip("-")
+
+def build_kits(niches: list, output_root: str, force: bool = False, workers: int = 8) -> dict:
+    """Build one launcher kit per niche under output_root/<niche>/, incrementally and in parallel"""
+    def build(niche):
+        launcher = IncomeLauncher(niche, os.path.join(output_root, kit_dirname(niche)))
+        return niche, BuildEngine(launcher.output_dir).build(launcher.build_targets(), force)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(build, niches))
+
 def main():
     """Launch the complete income generation system"""
-    launcher = IncomeLauncher()
+    parser = argparse.ArgumentParser(description="Create the income launcher kit (or one kit per niche)")
+    parser.add_argument("--niches", nargs="+", help="Build a kit per niche into --out/<niche>/")
+    parser.add_argument("--niches-file", help="File with one niche per line")
+    parser.add_argument("--out", default=".", help="Output directory")
+    parser.add_argument("--force", action="store_true", help="Rebuild every file even if nothing changed")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    
+    niches = list(args.niches or [])
+    if args.niches_file:
+        with open(args.niches_file) as f:
+            niches.extend(line.strip() for line in f if line.strip())
+    if niches:
+        results = build_kits(niches, args.out, args.force, args.workers)
+        outcomes = [outcome for kit in results.values() for outcome in kit.values()]
+        print(f"Built {len(results)} kits in {args.out}: {outcomes.count('built')} files written, "
+              f"{outcomes.count('fresh')} unchanged")
+        return
+    
+    launcher = IncomeLauncher(output_dir=args.out)
     
     print("🚀 INCOME LAUNCHER - DEPLOY YOUR AI CONTENT EMPIRE")
     print("=" * 60)
     print("Setting up your complete income generation system...")
     print()
     
-    # Create all setup guides
-    print("📝 Creating Setup Guides...")
-    launcher.create_wordpress_setup_guide()
-    launcher.create_social_media_automation_setup()
-    launcher.create_email_marketing_setup()
-    launcher.create_youtube_setup_guide()
-    
-    print("💰 Creating Monetization Resources...")
-    launcher.create_affiliate_program_list()
-    launcher.create_digital_product_ideas()
-    
-    print("📋 Creating Master Action Plan...")
-    launcher.create_master_action_plan()
+    # Create setup guides, monetization resources, action plan and projections
+    print("📝 Creating Setup Guides, Monetization Resources and Master Action Plan...")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = BuildEngine(args.out, executor).build(launcher.build_targets(), args.force)
+    rebuilt = [output for output, outcome in results.items() if outcome == "built"]
+    print(f"{len(rebuilt)} files written, {len(results) - len(rebuilt)} unchanged")
     
     # Calculate projections
     projections = launcher.calculate_90_day_income_projection()
@@ -589,10 +671,6 @@ def main():
     print("After that, you can maintain it with 1 hour daily.")
     print("The income will compound over time - stay consistent!")
     
-    # Save projections
-    with open('income_projections.json', 'w') as f:
-        json.dump(projections, f, indent=2)
-    
     print(f"\n📊 Income projections saved to 'income_projections.json'")
     print("\n🎉 Your AI-powered income empire is ready to launch!")
     print("Start with the master_action_plan.md and begin your journey to financial freedom!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Launcher Build Engine
+Small incremental build engine for IncomeLauncher kits: each output file is a
+target with declared inputs, skipped when neither its inputs nor its file
+changed, written atomically, and built in parallel with independent targets.
+"""
+
+import os
+import json
+import hashlib
+import inspect
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Per output directory: target -> hashes of its inputs and of the file it wrote
+STATE_FILE = ".launcher-build.json"
+
+_source_hashes = {}
+_source_lock = threading.Lock()
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str):
+    try:
+        with open(path, "rb") as f:
+            return content_hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def atomic_write(path: str, content: str) -> bool:
+    """
+    Write via a temporary file and rename, so readers never see a partial
+    file. Returns False (and leaves the file alone) when the content is unchanged.
+    """
+    data = content.encode("utf-8")
+    if file_hash(path) == content_hash(data):
+        return False
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def source_hash(function) -> str:
+    """Hash of a function's source code, cached per function"""
+    with _source_lock:
+        if function not in _source_hashes:
+            _source_hashes[function] = content_hash(inspect.getsource(function))
+        return _source_hashes[function]
+
+
+class Target:
+    """
+    One output file. `build` writes it (and returns its content); `inputs`
+    are the values it depends on, `deps` other targets that must build first.
+    The code of `build` is always an input, so editing a template rebuilds it.
+    """
+
+    def __init__(self, output: str, build, inputs: dict = None, deps: list = None):
+        self.output = output
+        self.build = build
+        self.inputs = inputs or {}
+        self.deps = deps or []
+
+    def input_hash(self) -> str:
+        code = source_hash(getattr(self.build, "__func__", self.build))
+        return content_hash(json.dumps({"code": code, "inputs": self.inputs}, sort_keys=True, default=str))
+
+
+class BuildEngine:
+    """Builds targets into one output directory, tracking hashes in STATE_FILE"""
+
+    def __init__(self, output_dir: str = ".", executor: ThreadPoolExecutor = None):
+        self.output_dir = output_dir
+        self.executor = executor
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+
+    def is_fresh(self, target: Target, input_hash: str) -> bool:
+        recorded = self.state.get(target.output)
+        if not recorded or recorded.get("inputs") != input_hash:
+            return False
+        # Catches outputs that were deleted or edited by hand since the last build
+        return file_hash(os.path.join(self.output_dir, target.output)) == recorded.get("output")
+
+    def _build_one(self, target: Target, force: bool) -> str:
+        input_hash = target.input_hash()
+        if not force and self.is_fresh(target, input_hash):
+            return "fresh"
+        target.build()
+        self.state[target.output] = {
+            "inputs": input_hash,
+            "output": file_hash(os.path.join(self.output_dir, target.output)),
+        }
+        return "built"
+
+    def build(self, targets: list, force: bool = False) -> dict:
+        """
+        Build targets in dependency waves; targets within a wave run in
+        parallel on the engine's executor. Returns {output: "built" | "fresh"}.
+        """
+        results = {}
+        pending = list(targets)
+        while pending:
+            ready = [target for target in pending if all(dep in results for dep in target.deps)]
+            if not ready:
+                raise ValueError(f"Dependency cycle or unknown dependency among {[t.output for t in pending]}")
+            if self.executor and len(ready) > 1:
+                outcomes = self.executor.map(lambda target: self._build_one(target, force), ready)
+            else:
+                outcomes = [self._build_one(target, force) for target in ready]
+            for target, outcome in zip(ready, outcomes):
+                results[target.output] = outcome
+            pending = [target for target in pending if target.output not in results]
+
+        if any(outcome == "built" for outcome in results.values()) or not os.path.exists(self.state_path):
+            atomic_write(self.state_path, json.dumps(self.state, indent=2, sort_keys=True))
+        return results
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+LLM Batch Job Runner
+Turns the ai_prompt templates of an AIIncomeGenerator content calendar into a
+JSONL job file and executes it through a rate-limited Gemini client.
+
+Results are appended to a JSONL file as each job completes; that file is
+also the checkpoint, so a killed run picks up where it stopped and never
+pays for a finished prompt twice.
+
+Examples:
+    python llm_batch_runner.py build --topics 10 --items 50 --jobs jobs.jsonl
+    python llm_batch_runner.py build --strategy ai_income_strategy.json --jobs jobs.jsonl
+    python llm_batch_runner.py run --jobs jobs.jsonl --out results.jsonl --workers 16 --rpm 300
+    python llm_batch_runner.py run --jobs jobs.jsonl --out results.jsonl --simulate
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from ai_income_generator import AIIncomeGenerator
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Only needed for real runs, not for build or --simulate
+    genai = None
+
+DEFAULT_MODEL = os.environ.get("BATCH_MODEL", "gemini-1.5-flash")
+DEFAULT_RPM = int(os.environ.get("BATCH_RPM", "300"))
+MAX_ATTEMPTS = 5
+
+# Calendar sections that carry ai_prompt templates, and the job kind for each
+PROMPT_SECTIONS = {"blog_posts": "blog_post", "youtube_videos": "youtube_script"}
+
+
+def job_id(kind: str, topic: str, title: str, prompt: str) -> str:
+    """Content hash, so the same prompt is one job however often it is listed"""
+    key = "\x1f".join((kind, topic, title, prompt))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def calendar_jobs(calendar: dict):
+    """Yield one job per ai_prompt in a content_calendar"""
+    for section, kind in PROMPT_SECTIONS.items():
+        for item in calendar.get(section, []):
+            prompt = item["ai_prompt"].strip()
+            yield {
+                "id": job_id(kind, item["topic"], item["title"], prompt),
+                "kind": kind,
+                "topic": item["topic"],
+                "title": item["title"],
+                "prompt": prompt,
+            }
+
+
+def write_jobs(calendar: dict, path: str) -> int:
+    """Write the calendar's prompts as a JSONL job file, dropping duplicates"""
+    seen = set()
+    with open(path, "w", encoding="utf-8") as f:
+        for job in calendar_jobs(calendar):
+            if job["id"] not in seen:
+                seen.add(job["id"])
+                f.write(json.dumps(job, ensure_ascii=False) + "\n")
+    return len(seen)
+
+
+def iter_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_checkpoint(path: str) -> set:
+    """
+    IDs already completed in a results file. A line cut short by a crash is
+    truncated away so the file stays valid JSONL.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good_length = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            good_length += len(line)
+    if good_length < os.path.getsize(path):
+        print(f"Truncating incomplete tail of {path} at byte {good_length}")
+        with open(path, "r+b") as f:
+            f.truncate(good_length)
+    return done
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads: at most `rpm` calls per minute, small bursts allowed"""
+
+    def __init__(self, rpm: int, burst: int = None):
+        self.rate = rpm / 60.0
+        self.capacity = burst or max(1, rpm // 30)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def penalize(self, seconds: float):
+        """Back off everyone after a 429: drain the bucket for `seconds`"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class GeminiBatchClient:
+    """Rate-limited, retrying Gemini client; `simulate` returns canned text without an API key"""
+
+    def __init__(self, model: str = DEFAULT_MODEL, rpm: int = DEFAULT_RPM, simulate: bool = False):
+        self.limiter = RateLimiter(rpm)
+        self.simulate = simulate
+        if not simulate:
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if genai is None or not api_key:
+                raise RuntimeError("GEMINI_API_KEY and google-generativeai are required (or pass --simulate)")
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(model)
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        text = str(error)
+        return code in (429, 500, 502, 503, 504) or any(marker in text for marker in ("429", "503", "Resource has been exhausted", "deadline"))
+
+    def generate(self, prompt: str) -> dict:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.limiter.acquire()
+            try:
+                if self.simulate:
+                    time.sleep(random.uniform(0.01, 0.05))
+                    text = f"[simulated response, {len(prompt.split())} prompt words]"
+                    return {"text": text, "prompt_tokens": None, "response_tokens": None}
+                response = self.model.generate_content(prompt)
+                usage = getattr(response, "usage_metadata", None)
+                return {
+                    "text": response.text,
+                    "prompt_tokens": getattr(usage, "prompt_token_count", None),
+                    "response_tokens": getattr(usage, "candidates_token_count", None),
+                }
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS or not self._retryable(e):
+                    raise
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                if "429" in str(e) or getattr(e, "code", None) == 429:
+                    self.limiter.penalize(delay)
+                print(f"Retry {attempt}/{MAX_ATTEMPTS - 1} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+
+def run_jobs(jobs_path: str, out_path: str, client: GeminiBatchClient, workers: int = 16) -> dict:
+    """
+    Execute every job not yet in out_path. Jobs are read lazily and at most
+    2 x workers are in flight, so memory does not grow with the job count.
+    Failures go to <out>.errors.jsonl and are retried by the next run.
+    """
+    done = load_checkpoint(out_path)
+    errors_path = out_path + ".errors.jsonl"
+    write_lock = threading.Lock()
+    stats = {"skipped": 0, "completed": 0, "failed": 0}
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, open(errors_path, "a", encoding="utf-8") as errors:
+
+        def execute(job):
+            job_started = time.perf_counter()
+            try:
+                result = client.generate(job["prompt"])
+            except Exception as e:
+                record = {"id": job["id"], "error": f"{type(e).__name__}: {e}", "failed_at": time.time()}
+                with write_lock:
+                    errors.write(json.dumps(record) + "\n")
+                    errors.flush()
+                    stats["failed"] += 1
+                return
+            record = {
+                "id": job["id"],
+                "kind": job["kind"],
+                "topic": job["topic"],
+                "title": job["title"],
+                "output": result["text"],
+                "prompt_tokens": result["prompt_tokens"],
+                "response_tokens": result["response_tokens"],
+                "seconds": round(time.perf_counter() - job_started, 2),
+            }
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with write_lock:
+                out.write(line)
+                out.flush()
+                stats["completed"] += 1
+                if stats["completed"] % 50 == 0:
+                    os.fsync(out.fileno())
+                    elapsed = time.perf_counter() - started
+                    print(f"{stats['completed']} jobs done ({stats['completed'] / elapsed:.1f}/s)")
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for job in iter_jsonl(jobs_path):
+                if job["id"] in done:
+                    stats["skipped"] += 1
+                    continue
+                done.add(job["id"])
+                if len(in_flight) >= workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(executor.submit(execute, job))
+            wait(in_flight)
+        os.fsync(out.fileno())
+
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and run batch LLM jobs from AIIncomeGenerator prompts")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Write a JSONL job file from a content calendar")
+    build.add_argument("--jobs", default="jobs.jsonl")
+    build.add_argument("--strategy", help="Strategy JSON from ai_income_generator.py (uses its content_calendar)")
+    build.add_argument("--topics", type=int, default=10, help="Without --strategy: number of topics")
+    build.add_argument("--items", type=int, default=50, help="Without --strategy: prompts per topic")
+
+    run = commands.add_parser("run", help="Execute a job file, resuming from the results file")
+    run.add_argument("--jobs", default="jobs.jsonl")
+    run.add_argument("--out", default="results.jsonl")
+    run.add_argument("--workers", type=int, default=16)
+    run.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Requests per minute across all workers")
+    run.add_argument("--model", default=DEFAULT_MODEL)
+    run.add_argument("--simulate", action="store_true", help="Exercise the pipeline without calling Gemini")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.strategy:
+            with open(args.strategy, encoding="utf-8") as f:
+                calendar = json.load(f)["content_calendar"]
+        else:
+            generator = AIIncomeGenerator()
+            calendar = generator.generate_content_calendar(generator.content_topics[:args.topics], args.items)
+        print(f"Wrote {write_jobs(calendar, args.jobs)} jobs to {args.jobs}")
+        return 0
+
+    client = GeminiBatchClient(args.model, args.rpm, args.simulate)
+    stats = run_jobs(args.jobs, args.out, client, args.workers)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
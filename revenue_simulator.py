@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+ANIPE Revenue Simulator
+Vectorized Monte Carlo model of monthly income per stream, with percentile
+bands per month and products-per-day sizing for the ANIPE pipeline.
+
+Each content stream follows a logistic growth curve toward a per-path
+revenue ceiling (lognormal, with a chance the stream never takes off) plus
+month-to-month noise. ANIPE product sales scale with the live catalog
+(products per day x days, with fading attention for older products) times a
+per-path sales rate and the net price after Stripe fees.
+
+Examples:
+    python revenue_simulator.py                                  # 1M paths, 12 months
+    python revenue_simulator.py --products-per-day 5 --chunk-size 250000
+    python revenue_simulator.py --target 5000 --target-month 6 --target-percentile 25
+"""
+
+import sys
+import copy
+import json
+import time
+import argparse
+from functools import lru_cache
+from statistics import NormalDist
+
+try:
+    import numpy as np
+except ImportError:  # Only the simulator needs NumPy; callers fall back to static projections
+    np = None
+
+DEFAULT_PATHS = 1_000_000
+DEFAULT_MONTHS = 12
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+# Sigma of the monthly shock (traffic, algorithm and seasonality swings) that
+# hits all of a path's channels together
+MONTHLY_NOISE = 0.25
+
+# Per-stream bands come from this many paths; total bands use every path
+STREAM_SAMPLE = 100_000
+
+# Growth curves are tabulated at this many midpoints instead of evaluating exp per path and month
+CURVE_LEVELS = 512
+
+# The monthly shock is drawn from a table of this many lognormal quantiles
+# (random uint16 lookups are several times cheaper than normal draws)
+SHOCK_LEVELS = 4096
+
+# Chunk mode keeps fixed log-spaced histograms per month instead of every path
+HISTOGRAM_BINS = 4096
+HISTOGRAM_MAX = 1e7
+
+DEFAULT_STREAMS = {
+    "blog": {"cap_median": 900, "cap_sigma": 0.8, "fail_rate": 0.3,
+             "midpoint": 6.0, "midpoint_sd": 2.0, "steepness": 0.7},
+    "youtube": {"cap_median": 1000, "cap_sigma": 1.0, "fail_rate": 0.45,
+                "midpoint": 8.0, "midpoint_sd": 2.5, "steepness": 0.6},
+    "email": {"cap_median": 1500, "cap_sigma": 0.7, "fail_rate": 0.25,
+              "midpoint": 5.0, "midpoint_sd": 1.5, "steepness": 0.8},
+    "social": {"cap_median": 700, "cap_sigma": 0.8, "fail_rate": 0.3,
+               "midpoint": 5.0, "midpoint_sd": 2.0, "steepness": 0.7},
+    "digital_products": {"cap_median": 1800, "cap_sigma": 0.9, "fail_rate": 0.3,
+                         "midpoint": 6.0, "midpoint_sd": 2.0, "steepness": 0.8},
+    "anipe_products": {"kind": "catalog", "products_per_day": 1.0, "sales_per_product_month": 0.08,
+                       "sales_sigma": 0.8, "attention_decay": 0.1, "ramp_months": 3.0,
+                       "price": 47.0, "fee_rate": 0.029, "fee_fixed": 0.30},
+}
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("The revenue simulator needs NumPy installed")
+
+
+def _lognormal(rng, shape, sigma):
+    """Mean-one multiplicative noise"""
+    noise = rng.standard_normal(shape, dtype=np.float32)
+    noise *= sigma
+    noise -= sigma * sigma / 2
+    return np.exp(noise, out=noise)
+
+
+@lru_cache(maxsize=8)
+def _shock_table(sigma: float):
+    normal = NormalDist()
+    quantiles = [normal.inv_cdf((i + 0.5) / SHOCK_LEVELS) for i in range(SHOCK_LEVELS)]
+    table = np.exp(sigma * np.array(quantiles)).astype(np.float32)
+    return table / table.mean()
+
+
+def _shock(rng, shape, sigma):
+    """Mean-one lognormal monthly shock, sampled from a quantile table"""
+    return _shock_table(sigma)[rng.integers(0, SHOCK_LEVELS, shape, dtype=np.uint16)]
+
+
+def _growth_stream(rng, n: int, months: int, spec: dict):
+    """(months, n) revenue: cap / (1 + exp(-k (month - midpoint))) per path"""
+    cap = _lognormal(rng, n, spec["cap_sigma"]) * (spec["cap_median"] * np.exp(spec["cap_sigma"] ** 2 / 2))
+    cap *= rng.random(n, dtype=np.float32) >= spec["fail_rate"]
+
+    spread = 4 * max(spec["midpoint_sd"], 1e-3)
+    levels = np.linspace(spec["midpoint"] - spread, spec["midpoint"] + spread, CURVE_LEVELS, dtype=np.float32)
+    month_index = np.arange(1, months + 1, dtype=np.float32)
+    table = 1 / (1 + np.exp(-spec["steepness"] * (month_index[:, None] - levels[None, :])))
+
+    level = rng.standard_normal(n, dtype=np.float32)
+    level *= (CURVE_LEVELS - 1) * spec["midpoint_sd"] / (2 * spread)
+    level += (CURVE_LEVELS - 1) / 2
+    level = np.clip(np.rint(level), 0, CURVE_LEVELS - 1).astype(np.intp)
+
+    revenue = table[:, level]
+    revenue *= cap[None, :]
+    return revenue
+
+
+def catalog_weights(months: int, spec: dict):
+    """Attention-weighted number of live products in each month, per product made per day"""
+    weights = np.zeros(months, dtype=np.float32)
+    for month in range(months):
+        weights[month] = (weights[month - 1] if month else 0) * (1 - spec["attention_decay"]) + 30
+    ramp = np.minimum(1, np.arange(1, months + 1, dtype=np.float32) / spec["ramp_months"])
+    return weights * ramp
+
+
+def _catalog_stream(rng, n: int, months: int, spec: dict):
+    """(months, n) revenue: live catalog x per-path sales rate x net price after Stripe fees"""
+    net_price = spec["price"] * (1 - spec["fee_rate"]) - spec["fee_fixed"]
+    rate = np.exp(rng.standard_normal(n, dtype=np.float32) * spec["sales_sigma"]) * spec["sales_per_product_month"]
+    per_month = catalog_weights(months, spec) * (spec["products_per_day"] * net_price)
+    return per_month[:, None] * rate[None, :]
+
+
+def stream_revenue(rng, n: int, months: int, spec: dict):
+    """(months, n) revenue of one stream before the monthly shock"""
+    if spec.get("kind") == "catalog":
+        return _catalog_stream(rng, n, months, spec)
+    return _growth_stream(rng, n, months, spec)
+
+
+def simulate_chunk(rng, n: int, months: int, streams: dict, sample: int = None) -> tuple:
+    """
+    Simulate n paths. Returns the (months, n) total and, per stream, the
+    first `sample` paths (all of them if sample is None), shock applied.
+    """
+    shock = _shock(rng, (months, n), MONTHLY_NOISE)
+    total = np.zeros((months, n), dtype=np.float32)
+    per_stream = {}
+    for name, spec in streams.items():
+        revenue = stream_revenue(rng, n, months, spec)
+        total += revenue
+        kept = revenue[:, :sample] if sample is not None else revenue
+        per_stream[name] = kept * shock[:, :kept.shape[1]]
+    total *= shock
+    return total, per_stream
+
+
+def _bands(values, percentiles) -> dict:
+    """Exact (linearly interpolated) percentiles per month; NumPy's SIMD sort beats partitioning here"""
+    result = {f"p{q:g}": [] for q in percentiles}
+    last = values.shape[1] - 1
+    for row in values:
+        ordered = np.sort(row)
+        for q in percentiles:
+            position = q / 100 * last
+            low = int(position)
+            high = min(low + 1, last)
+            value = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+            result[f"p{q:g}"].append(round(float(value), 2))
+    result["mean"] = [round(float(v), 2) for v in values.mean(axis=1, dtype=np.float64)]
+    return result
+
+
+class _Histograms:
+    """Per-month log-spaced histograms, merged across chunks in O(bins x months) memory"""
+
+    def __init__(self, months: int):
+        self.months = months
+        self.counts = np.zeros(months * HISTOGRAM_BINS, dtype=np.int64)
+        self.sums = np.zeros(months, dtype=np.float64)
+        self.scale = (HISTOGRAM_BINS - 1) / np.log1p(HISTOGRAM_MAX)
+        self.total = 0
+
+    def add(self, values):
+        index = np.log1p(np.maximum(values, 0)) * self.scale
+        index = np.minimum(index, HISTOGRAM_BINS - 1).astype(np.int64)
+        index += (np.arange(self.months) * HISTOGRAM_BINS)[:, None]
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size)
+        self.sums += values.sum(axis=1, dtype=np.float64)
+        self.total += values.shape[1]
+
+    def bands(self, percentiles) -> dict:
+        cumulative = np.cumsum(self.counts.reshape(self.months, HISTOGRAM_BINS), axis=1)
+        result = {}
+        for q in percentiles:
+            bins = [int(np.searchsorted(row, q / 100 * self.total)) for row in cumulative]
+            result[f"p{q:g}"] = [round(float(np.expm1((b + 0.5) / self.scale)), 2) for b in bins]
+        result["mean"] = [round(float(v), 2) for v in self.sums / self.total]
+        return result
+
+
+def build_streams(streams: dict = None, products_per_day: float = None) -> dict:
+    streams = copy.deepcopy(streams or DEFAULT_STREAMS)
+    if products_per_day is not None:
+        streams["anipe_products"]["products_per_day"] = products_per_day
+    return streams
+
+
+def simulate(paths: int = DEFAULT_PATHS, months: int = DEFAULT_MONTHS, streams: dict = None,
+             products_per_day: float = None, percentiles=DEFAULT_PERCENTILES, seed: int = 0,
+             chunk_size: int = None) -> dict:
+    """
+    Simulate `paths` futures and return percentile bands (plus the mean) per
+    stream and for the total, one value per month. Without chunk_size all
+    paths are held at once: total bands are exact and stream bands use the
+    first STREAM_SAMPLE paths. With chunk_size, paths are generated chunk by
+    chunk into histograms (about 0.5% resolution), so memory stays bounded
+    whatever the path count.
+    """
+    _require_numpy()
+    started = time.perf_counter()
+    streams = build_streams(streams, products_per_day)
+    rng = np.random.default_rng(seed)
+    exact = not chunk_size or chunk_size >= paths
+
+    if exact:
+        total, per_stream = simulate_chunk(rng, paths, months, streams, min(paths, STREAM_SAMPLE))
+        bands = {name: _bands(values, percentiles) for name, values in per_stream.items()}
+        bands["total"] = _bands(total, percentiles)
+    else:
+        histograms = {name: _Histograms(months) for name in list(streams) + ["total"]}
+        for start in range(0, paths, chunk_size):
+            total, per_stream = simulate_chunk(rng, min(chunk_size, paths - start), months, streams)
+            for name, values in per_stream.items():
+                histograms[name].add(values)
+            histograms["total"].add(total)
+        bands = {name: histogram.bands(percentiles) for name, histogram in histograms.items()}
+
+    return {
+        "paths": paths,
+        "months": list(range(1, months + 1)),
+        "products_per_day": streams["anipe_products"]["products_per_day"],
+        "exact": exact,
+        "streams": {name: bands[name] for name in streams},
+        "total": bands["total"],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def monthly_projection(months=(1, 2, 3, 6, 12), paths: int = 100_000, seed: int = 0,
+                       products_per_day: float = None) -> dict:
+    """Median revenue per stream and the total's 10-90% band for selected months (1-based)"""
+    result = simulate(paths, max(months), products_per_day=products_per_day, seed=seed)
+    return {
+        month: {
+            "streams": {name: bands["p50"][month - 1] for name, bands in result["streams"].items()},
+            "total": {band: result["total"][band][month - 1] for band in ("p10", "p50", "p90")},
+        }
+        for month in months
+    }
+
+
+def products_per_day_needed(target: float, month: int = DEFAULT_MONTHS, percentile: float = 50,
+                            paths: int = 200_000, streams: dict = None, seed: int = 0,
+                            max_products: float = 10_000.0):
+    """
+    Smallest products/day at which total revenue in `month` reaches `target`
+    at the given percentile (e.g. 25 = reached in 75% of futures). ANIPE
+    revenue is linear in products/day, so the paths are simulated once at
+    1/day and the bisection only rescales them. Returns None if out of reach.
+    """
+    _require_numpy()
+    streams = build_streams(streams, 1.0)
+    rng = np.random.default_rng(seed)
+    shock = _shock(rng, paths, MONTHLY_NOISE)
+    others = np.zeros(paths, dtype=np.float32)
+    for name, spec in streams.items():
+        revenue = stream_revenue(rng, paths, month, spec)[month - 1] * shock
+        if name == "anipe_products":
+            per_product = revenue
+        else:
+            others += revenue
+
+    def reached(rate):
+        return np.percentile(others + rate * per_product, percentile) >= target
+
+    if reached(0):
+        return 0.0
+    if not reached(max_products):
+        return None
+    low, high = 0.0, max_products
+    while high - low > 0.01:
+        middle = (low + high) / 2
+        low, high = (low, middle) if reached(middle) else (middle, high)
+    return round(high, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo revenue simulation for ANIPE income streams")
+    parser.add_argument("--paths", type=int, default=DEFAULT_PATHS)
+    parser.add_argument("--months", type=int, default=DEFAULT_MONTHS)
+    parser.add_argument("--products-per-day", type=float, help="ANIPE products published per day (default 1)")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=list(DEFAULT_PERCENTILES))
+    parser.add_argument("--chunk-size", type=int, help="Stream paths in chunks of this size (bounded memory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", type=float, help="Monthly revenue target: report the products/day needed")
+    parser.add_argument("--target-month", type=int, default=DEFAULT_MONTHS)
+    parser.add_argument("--target-percentile", type=float, default=50)
+    args = parser.parse_args()
+
+    if args.target is not None:
+        needed = products_per_day_needed(args.target, args.target_month, args.target_percentile,
+                                         min(args.paths, 200_000), seed=args.seed)
+        print(json.dumps({"target": args.target, "month": args.target_month,
+                          "percentile": args.target_percentile, "products_per_day": needed}, indent=2))
+        return 0
+
+    result = simulate(args.paths, args.months, products_per_day=args.products_per_day,
+                      percentiles=tuple(args.percentiles), seed=args.seed, chunk_size=args.chunk_size)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Stripe Event Replayer
+Signs Stripe events with a webhook secret and replays them against a local
+fulfillment service, for testing idempotency and launch-day bursts.
+
+Examples:
+    python stripe_event_replayer.py --secret whsec_test events.json
+    python stripe_event_replayer.py --secret whsec_test --synthetic 500 \\
+        --payment-link plink_123 --duplicates 2 --concurrency 50
+"""
+
+import os
+import sys
+import json
+import hmac
+import time
+import uuid
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: int = None) -> str:
+    """Build a Stripe-Signature header the same way Stripe does"""
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    signature = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def load_events(paths: list) -> list:
+    """Read events from JSON files holding one event, a list of events, or JSON lines"""
+    events = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        if text.startswith("["):
+            events.extend(json.loads(text))
+        elif text.startswith("{") and "\n{" not in text:
+            events.append(json.loads(text))
+        else:
+            events.extend(json.loads(line) for line in text.splitlines() if line.strip())
+    return events
+
+
+def synthetic_event(payment_link: str, email: str, amount: int) -> dict:
+    """A checkout.session.completed event shaped like Stripe's"""
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "created": int(time.time()),
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "payment_link": payment_link,
+                "payment_status": "paid",
+                "amount_total": amount,
+                "currency": "usd",
+                "customer_details": {"email": email},
+            }
+        },
+    }
+
+
+def replay(url: str, secret: str, events: list, duplicates: int = 1, concurrency: int = 10) -> dict:
+    """Send every event `duplicates` times with up to `concurrency` requests in flight"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def send(event):
+        payload = json.dumps(event).encode("utf-8")
+        started = time.perf_counter()
+        try:
+            response = session.post(url, data=payload, timeout=30, headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": sign_payload(payload, secret),
+            })
+            try:
+                outcome = f"{response.status_code} {response.json().get('status', '')}".strip()
+            except ValueError:
+                outcome = str(response.status_code)
+        except Exception as e:
+            outcome = f"error {type(e).__name__}"
+        return outcome, time.perf_counter() - started
+
+    deliveries = [event for event in events for _ in range(duplicates)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, deliveries))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "sent": len(results),
+        "seconds": round(elapsed, 2),
+        "per_second": round(len(results) / elapsed, 1) if elapsed else None,
+        "outcomes": dict(Counter(outcome for outcome, _ in results)),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1 if len(latencies) > 1 else 0] * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay signed Stripe events against the fulfillment webhook")
+    parser.add_argument("files", nargs="*", help="Event JSON files (e.g. from `stripe events retrieve`)")
+    parser.add_argument("--url", default="http://localhost:8080/webhook")
+    parser.add_argument("--secret", default=os.environ.get("STRIPE_WEBHOOK_SECRET"))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many checkout.session.completed events")
+    parser.add_argument("--payment-link", default="plink_test", help="Payment link ID for synthetic events")
+    parser.add_argument("--email", default="buyer@example.com", help="Customer email for synthetic events")
+    parser.add_argument("--amount", type=int, default=4700, help="Amount in cents for synthetic events")
+    parser.add_argument("--duplicates", type=int, default=1, help="Deliver each event this many times")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error("--secret or STRIPE_WEBHOOK_SECRET is required")
+
+    events = load_events(args.files)
+    events.extend(synthetic_event(args.payment_link, args.email, args.amount) for _ in range(args.synthetic))
+    if not events:
+        parser.error("no events: pass event files or --synthetic N")
+
+    print(f"Replaying {len(events)} events x{args.duplicates} to {args.url}")
+    print(json.dumps(replay(args.url, args.secret, events, args.duplicates, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())